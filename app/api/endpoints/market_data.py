@@ -1,29 +1,28 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-import json
 
+from app.api.responses import ORJSONResponse
+from app.api.streaming import CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, market_data_csv_stream, market_data_ndjson_stream, open_market_data_stream
 from app.schemas.market_data import MarketDataResponse
-from app.services.market_data import MarketDataService
+from app.services.market_data import PartialMarketDataError, market_service
+from app.services.upstream import UpstreamError
 from app.core.logging_config import logger
 from app.core.config import settings
 
 router = APIRouter()
 
-# Создаем экземпляр сервиса
-market_service = MarketDataService()
-
-# Кастомный JSON энкодер для обработки datetime объектов
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-def serialize_to_json(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Преобразует объект в JSON-совместимый формат, правильно обрабатывая datetime."""
-    return json.loads(json.dumps(data, cls=CustomJSONEncoder))
+# Messages of the test data fallback by the reason of the upstream failure (UpstreamError.reason)
+FALLBACK_MESSAGES = {
+    "auth_token_error": "Error receiving an authorization token. Test data is used.",
+    "api_not_found": "API is not available at the specified URL. Test data is used.",
+    "api_auth_error": "Authentication error when accessing the API. Test data is used.",
+    "api_timeout": "The time to wait for a response from the API has been exceeded. Test data is used.",
+    "api_connect_error": "Failed to connect to API. Test data is being used.",
+    "circuit_open": "API is temporarily unavailable after repeated errors. Test data is used.",
+    "api_error": "Error when accessing the API. Test data is used."
+}
 
 @router.get("/", response_model=MarketDataResponse, summary="Get market data for the period")
 async def get_market_data(
@@ -48,13 +47,11 @@ async def get_market_data(
             logger.info("Use test data instead of real data (at the user's request)")
             market_data = await market_service.generate_test_data(start_date, end_date)
             
-            response_data = serialize_to_json({
-                "data": market_data,
+            response = ORJSONResponse(content={
+                "data": market_data.to_records(),
                 "is_test_data": True,
                 "message": "Test data is used, as requested by the user"
             })
-            
-            response = JSONResponse(content=response_data)
             response.headers["X-Test-Data"] = "true"
             response.headers["X-Test-Reason"] = "user_request"
             return response
@@ -69,62 +66,54 @@ async def get_market_data(
                 
                 market_data = await market_service.generate_test_data(start_date, end_date)
                 
-                response_data = serialize_to_json({
-                    "data": market_data,
+                response = ORJSONResponse(content={
+                    "data": market_data.to_records(),
                     "is_test_data": True,
                     "message": message
                 })
-                
-                response = JSONResponse(content=response_data)
                 response.headers["X-Test-Data"] = "true"
                 response.headers["X-Test-Reason"] = reason
                 return response
             
-            response_data = serialize_to_json({
-                "data": market_data,
+            response = ORJSONResponse(content={
+                "data": market_data.to_records(),
                 "is_test_data": False,
                 "message": "Data received from the Netztransparenz API"
             })
-            
-            response = JSONResponse(content=response_data)
             response.headers["X-Test-Data"] = "false"
             response.headers["X-Data-Source"] = "netztransparenz_api"
             return response
             
+        except PartialMarketDataError as partial:
+            # The cached days keep their published prices, only the missing days are generated
+            logger.warning(f"{str(partial)}. Using test data for {len(partial.missing_days)} missing days.")
+            market_data = await market_service.complete_with_test_data(partial.data, partial.missing_days)
+            
+            response = ORJSONResponse(content={
+                "data": market_data.to_records(),
+                "is_test_data": True,
+                "message": f"API is temporarily unavailable. Cached data is returned, test data is used for {len(partial.missing_days)} missing days.",
+                "error": str(partial)
+            })
+            response.headers["X-Test-Data"] = "true"
+            response.headers["X-Test-Reason"] = partial.reason
+            return response
+            
         except Exception as api_error:
             error_msg = str(api_error)
-            reason = "api_error"
-            
-            if "Failed to obtain authorization token" in error_msg:
-                reason = "auth_token_error"
-                message = "Error receiving an authorization token. Test data is used."
-            elif "404" in error_msg:
-                reason = "api_not_found"
-                message = "API is not available at the specified URL. Test data is used."
-            elif "401" in error_msg or "403" in error_msg:
-                reason = "api_auth_error"
-                message = "Authentication error when accessing the API. Test data is used."
-            elif "timeout" in error_msg.lower():
-                reason = "api_timeout"
-                message = "The time to wait for a response from the API has been exceeded. Test data is used."
-            elif "connect" in error_msg.lower():
-                reason = "api_connect_error"
-                message = "Failed to connect to API. Test data is being used."
-            else:
-                message = f"Error when accessing the API. Test data is used."
+            reason = api_error.reason if isinstance(api_error, UpstreamError) else "api_error"
+            message = FALLBACK_MESSAGES.get(reason, FALLBACK_MESSAGES["api_error"])
             
             logger.error(f"API Error ({reason}): {error_msg}")
             
             market_data = await market_service.generate_test_data(start_date, end_date)
             
-            response_data = serialize_to_json({
-                "data": market_data,
+            response = ORJSONResponse(content={
+                "data": market_data.to_records(),
                 "is_test_data": True,
                 "message": message,
                 "error": error_msg
             })
-            
-            response = JSONResponse(content=response_data)
             response.headers["X-Test-Data"] = "true"
             response.headers["X-Test-Reason"] = reason
             return response
@@ -132,3 +121,45 @@ async def get_market_data(
     except Exception as e:
         logger.error(f"Unhandled error when receiving market data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/stream", summary="Stream market data for the period")
+async def stream_market_data(
+    start_date: Optional[datetime] = Query(None, description="Start Date (Format: YYYY-MM-DD)"),
+    end_date: Optional[datetime] = Query(None, description="End Date (Format: YYYY-MM-DD)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson (one record per line) or csv"),
+    use_test_data: bool = Query(None, description="Use test data instead of the actual API")
+):
+    """
+    Streams market data day by day while it is read, as NDJSON or as CSV
+    in the upload format (separator ";", decimal separator ",").
+    """
+    try:
+        if not start_date:
+            end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start_date = end_date - timedelta(days=7)
+        elif not end_date:
+            end_date = start_date + timedelta(days=7)
+        
+        logger.info(f"Streaming market data from {start_date.isoformat()} to {end_date.isoformat()}, format: {format}")
+        
+        chunks, is_test_data = await open_market_data_stream(start_date, end_date, use_test_data)
+        
+        if format == "csv":
+            response = StreamingResponse(market_data_csv_stream(chunks), media_type=CSV_MEDIA_TYPE)
+            response.headers["Content-Disposition"] = f"attachment; filename=market_data_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.csv"
+        else:
+            response = StreamingResponse(market_data_ndjson_stream(chunks), media_type=NDJSON_MEDIA_TYPE)
+        response.headers["X-Test-Data"] = str(is_test_data).lower()
+        return response
+    except Exception as e:
+        logger.error(f"Unhandled error when streaming market data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/fetch-stats", summary="Upstream fetch counters")
+async def get_fetch_stats():
+    """
+    Returns the number of upstream fetches started, of fetches that concurrent
+    requests joined instead of sending the same upstream request again, and the
+    state of the upstream circuit breaker.
+    """
+    return ORJSONResponse(content={**market_service.fetch_stats, "circuit": market_service.breaker.status()})
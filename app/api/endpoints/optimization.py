@@ -1,62 +1,224 @@
 from fastapi import APIRouter, HTTPException, Query, File, UploadFile, Form, Depends, BackgroundTasks
-from fastapi.responses import PlainTextResponse, JSONResponse
-from typing import List, Optional, Dict, Any
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
+import asyncio
 import io
 import traceback
-import json
 
-from app.schemas.optimization import OptimizationResponse, OptimizationCycle
-from app.services.market_data import MarketDataService
+from app.api.responses import ORJSONResponse, cycle_to_dict
+from app.api.streaming import CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, cycles_csv_stream, ndjson_stream, open_market_data_stream
+from app.schemas.market_frame import MarketData
+from app.schemas.optimization import OptimizationResponse, OptimizationCycle, BatteryParameters, DispatchResponse, ThresholdSweepResponse
+from app.services.cycle_index import CycleIndex
+from app.services.dispatch import DispatchService
+from app.services.market_data import PartialMarketDataError, UploadTooLargeError, market_service
 from app.services.optimizer import OptimizerService
+from app.services.result_cache import result_cache
+from app.services.rolling import rolling_optimizer
+from app.services.upstream import UpstreamError
+from app.services.workers import WorkerPoolBusyError, worker_pool
+from app.core.config import settings
 from app.core.logging_config import logger
 
 router = APIRouter()
 
-# Create service instances
-market_service = MarketDataService()
+# Create service instances (the market data service is shared across the application)
 optimizer_service = OptimizerService()
+dispatch_service = DispatchService()
 
-# Custom JSON encoder for handling datetime objects
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        elif isinstance(obj, OptimizationCycle):
-            # Convert OptimizationCycle to a dictionary for serialization
-            # Извлекаем часы из строк charge_start и discharge_start (формат "HH:00")
-            charge_hour = int(obj.charge_start.split(':')[0]) if obj.charge_start else None
-            discharge_hour = int(obj.discharge_start.split(':')[0]) if obj.discharge_start else None
-            
-            # Рассчитываем прибыль с учетом потерь при зарядке/разрядке (эффективность 85%)
-            efficiency = 0.85
-            profit_after_losses = obj.profit * efficiency if obj.profit else 0.0
-            
-            return {
-                "cycle": obj.cycle,
-                "date": obj.date,
-                "charge_hour": charge_hour,  # Добавляем числовое значение часа зарядки
-                "discharge_hour": discharge_hour,  # Добавляем числовое значение часа разрядки
-                "charge_start": obj.charge_start,
-                "charge_end": obj.charge_end,
-                "discharge_start": obj.discharge_start,
-                "discharge_end": obj.discharge_end,
-                "charge_price": obj.charge_price,
-                "discharge_price": obj.discharge_price,
-                "profit": obj.profit,
-                "profit_after_losses": profit_after_losses
-            }
-        return super().default(obj)
+# Cached optimization results are dropped when the prices of their days change
+if market_service.cache is not None:
+    market_service.cache.add_listener(result_cache.invalidate_days)
 
-def serialize_to_json(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert object to JSON-compatible format, correctly handling datetime."""
-    return json.loads(json.dumps(data, cls=CustomJSONEncoder))
+def resolve_date_range(start_date: Optional[datetime], end_date: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Applies the default period when the dates are not specified."""
+    # If dates are not specified, use the previous month
+    if not start_date:
+        current_date = datetime.now()
+        # Получаем последний день предыдущего месяца (конец периода по умолчанию)
+        end_date = current_date.replace(day=1) - timedelta(days=1)
+        # Получаем первый день предыдущего месяца (начало периода по умолчанию)
+        start_date = end_date.replace(day=1)
+        logger.info(f"Using default date range: {start_date} to {end_date}")
+    elif not end_date:
+        # Если указана только начальная дата, берем 30 дней начиная с нее
+        end_date = start_date + timedelta(days=30)
+    return start_date, end_date
+
+async def load_market_data(start_date: datetime, end_date: datetime, use_test_data: Optional[bool]) -> Tuple[MarketData, bool, str]:
+    """
+    Loads market data for the period, falling back to test data when the API fails.
+    
+    Returns:
+        Tuple of (market data, is test data, data source message)
+    """
+    # Determine whether to use test data
+    if use_test_data is None:
+        use_test_data = settings.USE_TEST_DATA_BY_DEFAULT
+    
+    if use_test_data:
+        logger.info("Using test data (user requested)")
+        market_data = await market_service.generate_test_data(start_date, end_date)
+        return market_data, True, "Using test data as requested by user"
+    
+    try:
+        # Try to get data through the API
+        logger.info("Requesting real data from Netztransparenz API")
+        market_data = await market_service.get_market_data(start_date, end_date)
+        
+        # Check if data was received
+        if market_data and len(market_data) > 0:
+            logger.info(f"Successfully received {len(market_data)} records from API")
+            return market_data, False, "Data retrieved from Netztransparenz API"
+        
+        # If no data, use test data
+        logger.warning("API returned no data, using test data")
+        market_data = await market_service.generate_test_data(start_date, end_date)
+        return market_data, True, "API returned no data. Using test data."
+    except PartialMarketDataError as partial:
+        # The cached days keep their published prices, only the missing days are generated
+        logger.warning(f"{str(partial)}. Using test data for {len(partial.missing_days)} missing days.")
+        market_data = await market_service.complete_with_test_data(partial.data, partial.missing_days)
+        return market_data, True, f"API is temporarily unavailable. Cached data with test data for {len(partial.missing_days)} missing days."
+    except Exception as api_error:
+        # If it failed, use test data
+        reason = api_error.reason if isinstance(api_error, UpstreamError) else "api_error"
+        logger.warning(f"Error when accessing the API ({reason}): {str(api_error)}. Using test data.")
+        market_data = await market_service.generate_test_data(start_date, end_date)
+        return market_data, True, "API Error. Using test data."
+
+async def run_in_worker(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs CPU-bound work in the worker pool, so it does not block the event loop.
+    
+    Raises:
+        HTTPException: 429 if the worker pool is saturated
+    """
+    try:
+        return await worker_pool.run(func, *args, **kwargs)
+    except WorkerPoolBusyError as e:
+        logger.warning(f"Rejecting request, worker pool is saturated: {str(e)}")
+        raise HTTPException(status_code=429, detail="The server is busy, please retry later", headers={"Retry-After": "1"})
+
+async def load_cycle_index(
+    start_date: datetime,
+    end_date: datetime,
+    max_cycles_per_day: int,
+    use_test_data: Optional[bool]
+) -> Tuple[CycleIndex, bool, str, bool]:
+    """
+    Optimizes the cycles of a period without a threshold, reusing the cached index
+    of an earlier request for the same period and parameters (with any threshold).
+    
+    Only results of API data that covers every day of the period are cached:
+    generated test data differs on every request, fallback test data must not hide
+    a recovered API, and days that are not published yet would stay missing.
+    
+    Returns:
+        Tuple of (cycle index, is test data, data source message, served from the result cache)
+        
+    Raises:
+        HTTPException: 404 if there is no market data for the period
+    """
+    if use_test_data is None:
+        use_test_data = settings.USE_TEST_DATA_BY_DEFAULT
+    
+    key = None if use_test_data else result_cache.make_key(start_date.date(), end_date.date(), max_cycles_per_day)
+    cached = result_cache.get(key) if key is not None else None
+    if cached is not None:
+        logger.info(f"Optimization result served from the cache ({len(cached.index)} cycles)")
+        return cached.index, False, cached.message, True
+    
+    market_data, is_test_data, data_source_message = await load_market_data(start_date, end_date, use_test_data)
+    generation = result_cache.generation
+    
+    # Check if there is data
+    if not market_data or len(market_data) == 0:
+        raise HTTPException(status_code=404, detail="No market data found for the specified period")
+    
+    # Optimize cycles
+    index = await run_in_worker(optimizer_service.build_cycle_index, market_data, max_cycles_per_day=max_cycles_per_day)
+    
+    complete = market_data.n_days == (end_date.date() - start_date.date()).days + 1
+    if key is not None and not is_test_data and complete:
+        result_cache.put(key, start_date.date(), end_date.date(), index, data_source_message, generation)
+    return index, is_test_data, data_source_message, False
+
+def rolling_window_range() -> Tuple[datetime, datetime]:
+    """Days of the rolling window, up to tomorrow (the latest day-ahead auction)"""
+    end_date = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    return end_date - timedelta(days=rolling_optimizer.window_days - 1), end_date
+
+async def prefetch_day_ahead() -> None:
+    """
+    Loads the prices of the latest day-ahead auction and warms the caches, so user
+    requests after the auction are served without waiting for the upstream API:
+    the market data cache (only missing days are fetched), the rolling window and
+    the cycle indexes of the rolling window and of the default period.
+    
+    Raises:
+        Exception: If the upstream API fails or tomorrow's prices are not published yet
+    """
+    start_date, end_date = rolling_window_range()
+    market_data = await market_service.get_market_data(start_date, end_date)
+    if not (market_data.day == end_date.date().toordinal()).any():
+        raise Exception(f"Prices of {end_date.date()} are not published yet")
+    await rolling_optimizer.update_async(market_data, run_in_worker)
+    
+    for period_start, period_end in ((start_date, end_date), resolve_date_range(None, None)):
+        await load_cycle_index(period_start, period_end, 1, False)
+
+async def day_ahead_cached() -> bool:
+    """True if the prices of tomorrow (the latest day-ahead auction) are in the market data cache"""
+    if market_service.cache is None:
+        return False
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    return bool(await asyncio.to_thread(market_service.cache.cached_days, tomorrow, tomorrow))
+
+def cache_status(cache_hit: bool) -> str:
+    """Value of the X-Cache response header"""
+    return "HIT" if cache_hit else "MISS"
+
+async def optimize_upload(file: UploadFile, threshold: float, max_cycles_per_day: int) -> List[Dict[str, Any]]:
+    """
+    Optimizes the cycles of an uploaded CSV file without reading it into memory at once.
+    
+    Raises:
+        HTTPException: 413 if the file exceeds the upload limits, 400 if it contains no market data
+    """
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"The uploaded file exceeds the limit of {settings.MAX_UPLOAD_BYTES} bytes")
+    
+    parsed_records = 0
+    
+    async def chunks():
+        nonlocal parsed_records
+        async for chunk in market_service.iter_csv_upload(file, executor=run_in_worker):
+            parsed_records += len(chunk)
+            yield chunk
+    
+    try:
+        cycles = [
+            cycle async for cycle in optimizer_service.process_stream(
+                chunks(), threshold, max_cycles_per_day, executor=run_in_worker
+            )
+        ]
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    if parsed_records == 0:
+        raise HTTPException(status_code=400, detail="Could not extract market data from CSV file")
+    
+    logger.info(f"Found {len(cycles)} optimal cycles in {parsed_records} uploaded records")
+    return cycles
 
 @router.post("/optimize", response_model=OptimizationResponse, summary="Optimize charge/discharge cycles")
 async def optimize_cycles(
     start_date: Optional[datetime] = Query(None, description="Start date (format: YYYY-MM-DD)"),
     end_date: Optional[datetime] = Query(None, description="End date (format: YYYY-MM-DD)"),
     threshold: float = Query(0.0, description="Profit threshold (EUR)"),
+    max_cycles_per_day: int = Query(1, ge=1, le=settings.MAX_CYCLES_PER_DAY_LIMIT, description="Maximum number of charge/discharge cycles per day"),
     use_test_data: bool = Query(None, description="Use test data instead of real API")
 ):
     """
@@ -65,80 +227,32 @@ async def optimize_cycles(
     - **start_date**: Start date in YYYY-MM-DD format
     - **end_date**: End date in YYYY-MM-DD format
     - **threshold**: Minimum profit threshold in EUR to display a cycle (default 0.0)
+    - **max_cycles_per_day**: Maximum number of non-overlapping cycles per day (default 1)
     - **use_test_data**: Use test data instead of real API (for debugging)
     
     Returns a list of optimal charge/discharge cycles in JSON format.
     """
     try:
-        # If dates are not specified, use the last 30 days
-        if not start_date:
-            current_date = datetime.now()
-            # Получаем последний день предыдущего месяца (конец периода по умолчанию)
-            end_date = current_date.replace(day=1) - timedelta(days=1)
-            # Получаем первый день предыдущего месяца (начало периода по умолчанию)
-            start_date = end_date.replace(day=1)
-            logger.info(f"Using default date range: {start_date} to {end_date}")
-        elif not end_date:
-            # Если указана только начальная дата, берем 30 дней начиная с нее
-            end_date = start_date + timedelta(days=30)
-        
-        logger.info(f"Optimization request from {start_date} to {end_date}, threshold: {threshold}")
-        
-        # Determine whether to use test data
-        from app.core.config import settings
-        if use_test_data is None:
-            use_test_data = settings.USE_TEST_DATA_BY_DEFAULT
+        start_date, end_date = resolve_date_range(start_date, end_date)
         
-        is_test_data = use_test_data
-        data_source_message = ""
+        logger.info(f"Optimization request from {start_date} to {end_date}, threshold: {threshold}, max cycles per day: {max_cycles_per_day}")
         
-        if use_test_data:
-            logger.info("Using test data for optimization (user requested)")
-            market_data = await market_service.generate_test_data(start_date, end_date)
-            data_source_message = "Using test data as requested by user"
-        else:
-            try:
-                # Try to get data through the API
-                logger.info("Requesting real data from Netztransparenz API")
-                market_data = await market_service.get_market_data(start_date, end_date)
-                
-                # Check if data was received
-                if market_data and len(market_data) > 0:
-                    is_test_data = False
-                    data_source_message = "Data retrieved from Netztransparenz API"
-                    logger.info(f"Successfully received {len(market_data)} records from API")
-                else:
-                    # If no data, use test data
-                    logger.warning("API returned no data, using test data")
-                    market_data = await market_service.generate_test_data(start_date, end_date)
-                    is_test_data = True
-                    data_source_message = "API returned no data. Using test data."
-            except Exception as api_error:
-                # If it failed, use test data
-                logger.warning(f"Error when accessing the API: {str(api_error)}. Using test data.")
-                market_data = await market_service.generate_test_data(start_date, end_date)
-                is_test_data = True
-                data_source_message = f"API Error. Using test data."
-            
-        # Check if there is data
-        if not market_data or len(market_data) == 0:
-            raise HTTPException(status_code=404, detail="No market data found for the specified period")
-        
-        # Optimize cycles
-        cycles = optimizer_service.process_data(market_data, threshold)
+        index, is_test_data, data_source_message, cache_hit = await load_cycle_index(
+            start_date, end_date, max_cycles_per_day, use_test_data
+        )
+        cycles = index.cycles(threshold)
         
         # Convert to response format
         response_cycles = optimizer_service.to_optimization_response(cycles)
         
         # Create response with additional header
-        response_data = serialize_to_json({
+        response = ORJSONResponse(content={
             "cycles": response_cycles,
             "is_test_data": is_test_data,
             "message": data_source_message
         })
-        
-        response = JSONResponse(content=response_data)
         response.headers["X-Test-Data"] = str(is_test_data).lower()
+        response.headers["X-Cache"] = cache_status(cache_hit)
         
         return response
     except HTTPException:
@@ -153,6 +267,7 @@ async def optimize_cycles_csv(
     start_date: Optional[datetime] = Query(None, description="Start date (format: YYYY-MM-DD)"),
     end_date: Optional[datetime] = Query(None, description="End date (format: YYYY-MM-DD)"),
     threshold: float = Query(0.0, description="Profit threshold (EUR)"),
+    max_cycles_per_day: int = Query(1, ge=1, le=settings.MAX_CYCLES_PER_DAY_LIMIT, description="Maximum number of charge/discharge cycles per day"),
     use_test_data: bool = Query(None, description="Use test data instead of real API")
 ):
     """
@@ -161,62 +276,20 @@ async def optimize_cycles_csv(
     - **start_date**: Start date in YYYY-MM-DD format
     - **end_date**: End date in YYYY-MM-DD format
     - **threshold**: Minimum profit threshold in EUR to display a cycle (default 0.0)
+    - **max_cycles_per_day**: Maximum number of non-overlapping cycles per day (default 1)
     - **use_test_data**: Use test data instead of real API (for debugging)
     
     Returns a CSV file with optimal cycles.
     """
     try:
-        # If dates are not specified, use the last 30 days
-        if not start_date:
-            current_date = datetime.now()
-            # Получаем последний день предыдущего месяца (конец периода по умолчанию)
-            end_date = current_date.replace(day=1) - timedelta(days=1)
-            # Получаем первый день предыдущего месяца (начало периода по умолчанию)
-            start_date = end_date.replace(day=1)
-            logger.info(f"Using default date range: {start_date} to {end_date}")
-        elif not end_date:
-            # Если указана только начальная дата, берем 30 дней начиная с нее
-            end_date = start_date + timedelta(days=30)
+        start_date, end_date = resolve_date_range(start_date, end_date)
         
         logger.info(f"CSV optimization request from {start_date} to {end_date}, threshold: {threshold}")
         
-        # Determine whether to use test data
-        from app.core.config import settings
-        if use_test_data is None:
-            use_test_data = settings.USE_TEST_DATA_BY_DEFAULT
-        
-        is_test_data = use_test_data
-            
-        if use_test_data:
-            logger.info("Using test data for CSV optimization (user requested)")
-            market_data = await market_service.generate_test_data(start_date, end_date)
-        else:
-            try:
-                # Try to get data through the API
-                logger.info("Requesting real data from Netztransparenz API for CSV")
-                market_data = await market_service.get_market_data(start_date, end_date)
-                
-                # Check if data was received
-                if market_data and len(market_data) > 0:
-                    is_test_data = False
-                    logger.info(f"Successfully received {len(market_data)} records from API for CSV")
-                else:
-                    # If no data, use test data
-                    logger.warning("API returned no data for CSV, using test data")
-                    market_data = await market_service.generate_test_data(start_date, end_date)
-                    is_test_data = True
-            except Exception as api_error:
-                # If it failed, use test data
-                logger.warning(f"Error when accessing API for CSV: {str(api_error)}. Using test data.")
-                market_data = await market_service.generate_test_data(start_date, end_date)
-                is_test_data = True
-            
-        # Check if there is data
-        if not market_data or len(market_data) == 0:
-            raise HTTPException(status_code=404, detail="No market data found for the specified period")
-        
-        # Optimize cycles
-        cycles = optimizer_service.process_data(market_data, threshold)
+        index, is_test_data, _, cache_hit = await load_cycle_index(
+            start_date, end_date, max_cycles_per_day, use_test_data
+        )
+        cycles = index.cycles(threshold)
         
         # Convert to CSV
         csv_content = optimizer_service.to_csv(cycles)
@@ -224,6 +297,7 @@ async def optimize_cycles_csv(
         # Create response with data source header
         response = PlainTextResponse(content=csv_content)
         response.headers["X-Test-Data"] = str(is_test_data).lower()
+        response.headers["X-Cache"] = cache_status(cache_hit)
         response.headers["Content-Disposition"] = f"attachment; filename=optimization_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.csv"
         
         return response
@@ -233,41 +307,207 @@ async def optimize_cycles_csv(
         logger.error(f"Unhandled error during CSV cycle optimization: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/threshold-sweep", response_model=ThresholdSweepResponse, summary="Cycle counts and total profit for several thresholds")
+async def threshold_sweep(
+    thresholds: List[float] = Query(..., description="Profit thresholds (EUR), the parameter can be repeated"),
+    start_date: Optional[datetime] = Query(None, description="Start date (format: YYYY-MM-DD)"),
+    end_date: Optional[datetime] = Query(None, description="End date (format: YYYY-MM-DD)"),
+    max_cycles_per_day: int = Query(1, ge=1, le=settings.MAX_CYCLES_PER_DAY_LIMIT, description="Maximum number of charge/discharge cycles per day"),
+    use_test_data: bool = Query(None, description="Use test data instead of real API")
+):
+    """
+    Compares profit thresholds on one period without listing the cycles.
+    
+    - **thresholds**: Profit thresholds in EUR (e.g. thresholds=0&thresholds=5&thresholds=10)
+    - **start_date**: Start date in YYYY-MM-DD format
+    - **end_date**: End date in YYYY-MM-DD format
+    - **max_cycles_per_day**: Maximum number of non-overlapping cycles per day (default 1)
+    - **use_test_data**: Use test data instead of real API (for debugging)
+    
+    The cycles are optimized once per period; every threshold is answered from
+    the cached cycle index. Returns the number of cycles with profit above every
+    threshold and their total profit.
+    """
+    try:
+        start_date, end_date = resolve_date_range(start_date, end_date)
+        
+        logger.info(f"Threshold sweep request from {start_date} to {end_date}, {len(thresholds)} thresholds")
+        
+        index, is_test_data, data_source_message, cache_hit = await load_cycle_index(
+            start_date, end_date, max_cycles_per_day, use_test_data
+        )
+        
+        response = ORJSONResponse(content={
+            "thresholds": index.summarize(thresholds),
+            "is_test_data": is_test_data,
+            "message": data_source_message
+        })
+        response.headers["X-Test-Data"] = str(is_test_data).lower()
+        response.headers["X-Cache"] = cache_status(cache_hit)
+        
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unhandled error during threshold sweep: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.post("/rolling/refresh", summary="Update the rolling optimization window with the latest prices")
+async def refresh_rolling_window(
+    use_test_data: bool = Query(None, description="Use test data instead of real API")
+):
+    """
+    Loads the prices of the rolling window up to tomorrow (the latest day-ahead
+    auction) and optimizes only the days that are new or changed; days older than
+    the window are evicted.
+    
+    - **use_test_data**: Not supported (400): the window is shared by all clients and holds published prices only
+    
+    Returns the new version of the window, the number of changed days and the window totals.
+    """
+    try:
+        if use_test_data is None:
+            use_test_data = settings.USE_TEST_DATA_BY_DEFAULT
+        
+        # Generated prices would be served to every client of /rolling/delta and /rolling/threshold-sweep
+        if use_test_data:
+            raise HTTPException(status_code=400, detail="The rolling window is updated from the API only, test data is not supported")
+        
+        start_date, end_date = rolling_window_range()
+        
+        market_data, is_test_data, data_source_message = await load_market_data(start_date, end_date, False)
+        
+        # Fallback test data must not replace real prices in the window
+        if is_test_data:
+            raise HTTPException(status_code=503, detail=f"Market data is not available: {data_source_message}")
+        
+        changed = await rolling_optimizer.update_async(market_data, run_in_worker)
+        
+        response = ORJSONResponse(content={
+            "version": rolling_optimizer.version,
+            "changed_days": len(changed),
+            "summary": rolling_optimizer.summary(),
+            "is_test_data": is_test_data,
+            "message": data_source_message
+        })
+        response.headers["X-Test-Data"] = str(is_test_data).lower()
+        
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unhandled error during rolling window refresh: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/rolling/delta", summary="Changes of the rolling optimization window since a version")
+async def rolling_window_delta(
+    since: int = Query(0, ge=0, description="Version the client already has (0 for the full window)")
+):
+    """
+    Returns the cycles of the days added or changed after version since, the days
+    removed from the window and the window totals.
+    
+    - **since**: Version from an earlier response (0 for the full window)
+    
+    If since is older than the kept history, the whole window is returned with full=true.
+    The cycles have the same format as in /optimize.
+    """
+    try:
+        delta = rolling_optimizer.delta(since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    for day in delta["days"]:
+        day["cycles"] = optimizer_service.to_optimization_response(day["cycles"])
+    return ORJSONResponse(content=delta)
+
+@router.get("/rolling/threshold-sweep", response_model=ThresholdSweepResponse, summary="Cycle counts and total profit of the rolling window for several thresholds")
+async def rolling_window_threshold_sweep(
+    thresholds: List[float] = Query(..., description="Profit thresholds (EUR), the parameter can be repeated")
+):
+    """
+    Compares profit thresholds on the current rolling window without optimizing it again.
+
+    - **thresholds**: Profit thresholds in EUR (e.g. thresholds=0&thresholds=5&thresholds=10)
+
+    Returns the number of cycles with profit above every threshold, their total
+    profit and the version of the window.
+    """
+    return ORJSONResponse(content={
+        "thresholds": rolling_optimizer.summarize(thresholds),
+        "version": rolling_optimizer.version
+    })
+
+@router.post("/optimize-stream", summary="Optimize cycles and stream the results")
+async def optimize_cycles_stream(
+    start_date: Optional[datetime] = Query(None, description="Start date (format: YYYY-MM-DD)"),
+    end_date: Optional[datetime] = Query(None, description="End date (format: YYYY-MM-DD)"),
+    threshold: float = Query(0.0, description="Profit threshold (EUR)"),
+    max_cycles_per_day: int = Query(1, ge=1, le=settings.MAX_CYCLES_PER_DAY_LIMIT, description="Maximum number of charge/discharge cycles per day"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format: ndjson (one cycle per line) or csv"),
+    use_test_data: bool = Query(None, description="Use test data instead of real API")
+):
+    """
+    Optimizes charge/discharge cycles and streams them while the market data is read.
+    
+    Every day is optimized as soon as it arrives, so the first cycles are sent
+    before the whole period is loaded and memory does not grow with the period.
+    
+    - **start_date**: Start date in YYYY-MM-DD format
+    - **end_date**: End date in YYYY-MM-DD format
+    - **threshold**: Minimum profit threshold in EUR to display a cycle (default 0.0)
+    - **max_cycles_per_day**: Maximum number of non-overlapping cycles per day (default 1)
+    - **format**: "ndjson" - one JSON cycle per line (as in /optimize), "csv" - as in /optimize-csv
+    - **use_test_data**: Use test data instead of real API (for debugging)
+    """
+    try:
+        start_date, end_date = resolve_date_range(start_date, end_date)
+        
+        logger.info(f"Streaming optimization request from {start_date} to {end_date}, threshold: {threshold}, format: {format}")
+        
+        chunks, is_test_data = await open_market_data_stream(start_date, end_date, use_test_data)
+        cycles = optimizer_service.process_stream(chunks, threshold, max_cycles_per_day, executor=run_in_worker)
+        
+        if format == "csv":
+            response = StreamingResponse(cycles_csv_stream(cycles), media_type=CSV_MEDIA_TYPE)
+            response.headers["Content-Disposition"] = f"attachment; filename=optimization_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.csv"
+        else:
+            response = StreamingResponse(
+                ndjson_stream(cycles, lambda cycle: cycle_to_dict(OptimizationCycle(**cycle))),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+        response.headers["X-Test-Data"] = str(is_test_data).lower()
+        
+        return response
+    except Exception as e:
+        logger.error(f"Unhandled error during streaming cycle optimization: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @router.post("/upload-csv", response_model=OptimizationResponse, summary="Upload CSV and optimize cycles")
 async def process_csv(
     file: UploadFile = File(..., description="CSV file with market data"),
-    threshold: float = Form(0.0, description="Profit threshold (EUR)")
+    threshold: float = Form(0.0, description="Profit threshold (EUR)"),
+    max_cycles_per_day: int = Form(1, ge=1, le=settings.MAX_CYCLES_PER_DAY_LIMIT, description="Maximum number of charge/discharge cycles per day")
 ):
     """
     Processes the uploaded CSV file and returns optimized cycles.
     
     - **file**: CSV file with market data (separator ";", decimal separator ",")
     - **threshold**: Minimum profit threshold in EUR to display a cycle (default 0.0)
+    - **max_cycles_per_day**: Maximum number of non-overlapping cycles per day (default 1)
     
     Returns a list of optimal charge/discharge cycles in JSON format.
     """
     try:
         logger.info(f"Upload and process CSV, threshold: {threshold}")
         
-        # Read file contents
-        contents = await file.read()
-        csv_content = contents.decode('utf-8')
-        
-        # Parse CSV
-        market_data = market_service.parse_csv_data(csv_content)
-        
-        if not market_data or len(market_data) == 0:
-            raise HTTPException(status_code=400, detail="Could not extract market data from CSV file")
-        
-        # Optimize cycles
-        cycles = optimizer_service.process_data(market_data, threshold)
+        # Parse the file chunk by chunk and optimize the days as they arrive
+        cycles = await optimize_upload(file, threshold, max_cycles_per_day)
         
         # Convert to response format
         response_cycles = optimizer_service.to_optimization_response(cycles)
         
-        # Serialize data to prevent errors with datetime and OptimizationCycle
-        response_data = serialize_to_json({"cycles": response_cycles, "is_test_data": False})
-        return JSONResponse(content=response_data)
+        return ORJSONResponse(content={"cycles": response_cycles, "is_test_data": False})
     except HTTPException:
         raise
     except Exception as e:
@@ -277,31 +517,23 @@ async def process_csv(
 @router.post("/upload-csv-download", response_class=PlainTextResponse, summary="Upload CSV and get results as CSV")
 async def process_csv_download(
     file: UploadFile = File(..., description="CSV file with market data"),
-    threshold: float = Form(0.0, description="Profit threshold (EUR)")
+    threshold: float = Form(0.0, description="Profit threshold (EUR)"),
+    max_cycles_per_day: int = Form(1, ge=1, le=settings.MAX_CYCLES_PER_DAY_LIMIT, description="Maximum number of charge/discharge cycles per day")
 ):
     """
     Processes the uploaded CSV file and returns optimized cycles in CSV format.
     
     - **file**: CSV file with market data (separator ";", decimal separator ",")
     - **threshold**: Minimum profit threshold in EUR to display a cycle (default 0.0)
+    - **max_cycles_per_day**: Maximum number of non-overlapping cycles per day (default 1)
     
     Returns a CSV file with optimal cycles.
     """
     try:
         logger.info(f"Upload and process CSV with CSV return, threshold: {threshold}")
         
-        # Read file contents
-        contents = await file.read()
-        csv_content = contents.decode('utf-8')
-        
-        # Parse CSV
-        market_data = market_service.parse_csv_data(csv_content)
-        
-        if not market_data or len(market_data) == 0:
-            raise HTTPException(status_code=400, detail="Could not extract market data from CSV file")
-        
-        # Optimize cycles
-        cycles = optimizer_service.process_data(market_data, threshold)
+        # Parse the file chunk by chunk and optimize the days as they arrive
+        cycles = await optimize_upload(file, threshold, max_cycles_per_day)
         
         # Convert to CSV
         result_csv = optimizer_service.to_csv(cycles)
@@ -312,3 +544,80 @@ async def process_csv_download(
     except Exception as e:
         logger.error(f"Error processing CSV and outputting to CSV: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+
+@router.post("/dispatch", response_model=DispatchResponse, summary="Optimize battery dispatch with state of charge")
+async def optimize_dispatch(
+    start_date: Optional[datetime] = Query(None, description="Start date (format: YYYY-MM-DD)"),
+    end_date: Optional[datetime] = Query(None, description="End date (format: YYYY-MM-DD)"),
+    capacity_kwh: Optional[float] = Query(None, gt=0, description="Usable battery capacity (kWh)"),
+    charge_power_kw: Optional[float] = Query(None, gt=0, description="Maximum charge power (kW)"),
+    discharge_power_kw: Optional[float] = Query(None, gt=0, description="Maximum discharge power (kW)"),
+    round_trip_efficiency: Optional[float] = Query(None, gt=0, le=1, description="Round-trip efficiency"),
+    degradation_cost_per_cycle: Optional[float] = Query(None, ge=0, description="Degradation cost of one full cycle (EUR)"),
+    mode: str = Query("daily", pattern="^(daily|continuous)$", description="daily or continuous (across day boundaries)"),
+    soc_levels: Optional[int] = Query(None, ge=1, le=settings.DISPATCH_MAX_SOC_LEVELS, description="Number of state of charge steps"),
+    include_schedule: bool = Query(False, description="Include the per-slot schedule"),
+    use_test_data: bool = Query(None, description="Use test data instead of real API")
+):
+    """
+    Computes the optimal battery schedule with capacity, power and efficiency limits.
+    
+    - **start_date**: Start date in YYYY-MM-DD format
+    - **end_date**: End date in YYYY-MM-DD format
+    - **capacity_kwh**, **charge_power_kw**, **discharge_power_kw**, **round_trip_efficiency**,
+      **degradation_cost_per_cycle**: Battery parameters (default from settings)
+    - **mode**: "daily" solves each day separately, "continuous" carries energy over day boundaries
+    - **soc_levels**: Number of state of charge discretization steps
+    - **include_schedule**: Include the per-slot charge/discharge schedule
+    - **use_test_data**: Use test data instead of real API (for debugging)
+    
+    Returns per-day charged/discharged energy, costs and profit.
+    """
+    try:
+        start_date, end_date = resolve_date_range(start_date, end_date)
+        
+        logger.info(f"Dispatch request from {start_date} to {end_date}, mode: {mode}")
+        
+        defaults = dispatch_service.default_battery()
+        battery = BatteryParameters(
+            capacity_kwh=capacity_kwh or defaults.capacity_kwh,
+            charge_power_kw=charge_power_kw or defaults.charge_power_kw,
+            discharge_power_kw=discharge_power_kw or defaults.discharge_power_kw,
+            round_trip_efficiency=round_trip_efficiency or defaults.round_trip_efficiency,
+            degradation_cost_per_cycle=(
+                degradation_cost_per_cycle if degradation_cost_per_cycle is not None
+                else defaults.degradation_cost_per_cycle
+            )
+        )
+        
+        market_data, is_test_data, data_source_message = await load_market_data(start_date, end_date, use_test_data)
+        
+        # Check if there is data
+        if not market_data or len(market_data) == 0:
+            raise HTTPException(status_code=404, detail="No market data found for the specified period")
+        
+        days = await run_in_worker(
+            dispatch_service.process_data,
+            market_data,
+            battery,
+            mode=mode,
+            soc_levels=soc_levels,
+            include_schedule=include_schedule
+        )
+        
+        response = ORJSONResponse(content={
+            "days": days,
+            "total_profit": sum(day["profit"] for day in days),
+            "mode": mode,
+            "is_test_data": is_test_data,
+            "message": data_source_message
+        })
+        response.headers["X-Test-Data"] = str(is_test_data).lower()
+        
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unhandled error during dispatch optimization: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
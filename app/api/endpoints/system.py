@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+
+from app.api.responses import ORJSONResponse
+from app.services.market_data import market_service
+from app.services.result_cache import result_cache
+from app.services.workers import loop_lag_monitor, worker_pool
+
+router = APIRouter()
+
+@router.get("/metrics", summary="Runtime metrics of the service")
+async def get_metrics():
+    """
+    Returns the event loop lag, the worker pool load, the result cache counters
+    and the upstream fetch counters with the circuit breaker state.
+    """
+    return ORJSONResponse(content={
+        "event_loop_lag": loop_lag_monitor.stats(),
+        "worker_pool": worker_pool.stats(),
+        "result_cache": result_cache.stats(),
+        "upstream": {**market_service.fetch_stats, "circuit": market_service.breaker.status()}
+    })
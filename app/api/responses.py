@@ -0,0 +1,62 @@
+from datetime import date, datetime
+from typing import Any, Dict
+
+import orjson
+from fastapi import responses
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.schemas.optimization import OptimizationCycle
+
+
+def cycle_to_dict(cycle: OptimizationCycle) -> Dict[str, Any]:
+    """Converts an OptimizationCycle to the dictionary returned by the API"""
+    # Извлекаем часы из строк charge_start и discharge_start (формат "HH:00")
+    charge_hour = int(cycle.charge_start.split(':')[0]) if cycle.charge_start else None
+    discharge_hour = int(cycle.discharge_start.split(':')[0]) if cycle.discharge_start else None
+
+    # Прибыль с учетом потерь уже рассчитана оптимизатором; иначе считаем по КПД из настроек
+    profit_after_losses = cycle.profit_after_losses
+    if profit_after_losses is None:
+        profit_after_losses = cycle.profit * settings.ROUND_TRIP_EFFICIENCY if cycle.profit else 0.0
+
+    return {
+        "cycle": cycle.cycle,
+        "date": cycle.date,
+        "charge_hour": charge_hour,  # Добавляем числовое значение часа зарядки
+        "discharge_hour": discharge_hour,  # Добавляем числовое значение часа разрядки
+        "charge_start": cycle.charge_start,
+        "charge_end": cycle.charge_end,
+        "discharge_start": cycle.discharge_start,
+        "discharge_end": cycle.discharge_end,
+        "charge_price": cycle.charge_price,
+        "discharge_price": cycle.discharge_price,
+        "profit": cycle.profit,
+        "profit_after_losses": profit_after_losses
+    }
+
+
+def encode_default(obj: Any) -> Any:
+    """Serializes the objects that JSON encoders do not support natively"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, OptimizationCycle):
+        return cycle_to_dict(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONResponse(responses.ORJSONResponse):
+    """
+    FastAPI's orjson response with encode_default as fallback encoder, so
+    OptimizationCycle and pydantic models are encoded without converting the
+    content to plain dictionaries first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=encode_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import market_data, optimization
+from app.api.endpoints import market_data, optimization, system
 
 # Создаем основной маршрутизатор API
 api_router = APIRouter()
@@ -7,3 +7,4 @@ api_router = APIRouter()
 # Подключаем маршрутизаторы конечных точек
 api_router.include_router(market_data.router, prefix="/market-data", tags=["market-data"])
 api_router.include_router(optimization.router, prefix="/optimization", tags=["optimization"])
+api_router.include_router(system.router, prefix="/system", tags=["system"])
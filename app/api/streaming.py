@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+import orjson
+
+from app.api.responses import encode_default
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.schemas.market_frame import MarketData
+from app.services.market_data import market_service
+from app.utils.csv_handler import (
+    CYCLES_CSV_HEADER,
+    CYCLES_CSV_HEADER_EMPTY,
+    MARKET_DATA_CSV_HEADER,
+    format_csv_row,
+    format_market_data_csv_rows,
+)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+async def open_market_data_stream(
+    start_date: datetime,
+    end_date: datetime,
+    use_test_data: Optional[bool]
+) -> Tuple[AsyncIterator[MarketData], bool]:
+    """
+    Opens a day-by-day market data stream, falling back to test data when the API fails.
+
+    The first day is read before returning, so API errors are detected while the
+    response status can still be chosen; errors after that abort the stream.
+
+    Returns:
+        Tuple of (async iterator of one-day MarketData chunks, is test data)
+    """
+    if use_test_data is None:
+        use_test_data = settings.USE_TEST_DATA_BY_DEFAULT
+
+    if use_test_data:
+        logger.info("Streaming test data (user requested)")
+        return market_service.stream_test_data(start_date, end_date), True
+
+    stream = market_service.stream_market_data(start_date, end_date)
+    try:
+        first_day = await stream.__anext__()
+    except StopAsyncIteration:
+        logger.warning("API returned no data, streaming test data")
+        return market_service.stream_test_data(start_date, end_date), True
+    except Exception as api_error:
+        logger.warning(f"Error when accessing the API: {str(api_error)}. Streaming test data.")
+        await stream.aclose()
+        return market_service.stream_test_data(start_date, end_date), True
+
+    async def resumed() -> AsyncIterator[MarketData]:
+        yield first_day
+        async for day_data in stream:
+            yield day_data
+
+    return resumed(), False
+
+
+async def ndjson_stream(
+    items: AsyncIterator[Any],
+    convert: Callable[[Any], Any] = lambda item: item
+) -> AsyncIterator[bytes]:
+    """Encodes every item as one JSON line"""
+    try:
+        async for item in items:
+            yield orjson.dumps(convert(item), default=encode_default, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+    except Exception as e:
+        logger.error(f"Error while streaming NDJSON: {str(e)}")
+        raise
+
+
+async def market_data_ndjson_stream(chunks: AsyncIterator[MarketData]) -> AsyncIterator[bytes]:
+    """Encodes market data as NDJSON, one chunk of lines per day"""
+    try:
+        async for chunk in chunks:
+            yield b"".join(
+                orjson.dumps(record) + b"\n" for record in chunk.to_records()
+            )
+    except Exception as e:
+        logger.error(f"Error while streaming market data: {str(e)}")
+        raise
+
+
+async def market_data_csv_stream(chunks: AsyncIterator[MarketData]) -> AsyncIterator[str]:
+    """Formats market data as CSV, one chunk of rows per day"""
+    yield MARKET_DATA_CSV_HEADER
+    try:
+        async for chunk in chunks:
+            yield format_market_data_csv_rows(chunk)
+    except Exception as e:
+        logger.error(f"Error while streaming market data: {str(e)}")
+        raise
+
+
+async def cycles_csv_stream(cycles: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Formats optimization cycles as CSV, identical to format_to_csv"""
+    has_cycles = False
+    try:
+        async for cycle in cycles:
+            if not has_cycles:
+                # The header depends on whether there are cycles, so it is written with the first one
+                has_cycles = True
+                yield CYCLES_CSV_HEADER
+            yield format_csv_row(cycle)
+    except Exception as e:
+        logger.error(f"Error while streaming optimization results: {str(e)}")
+        raise
+
+    if not has_cycles:
+        yield CYCLES_CSV_HEADER_EMPTY
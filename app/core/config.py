@@ -32,10 +32,104 @@ class Settings(BaseSettings):
     # Время жизни токена (в секундах) - используется для кеширования
     TOKEN_LIFETIME: int = 3500  # Обычно токены живут около часа, берем чуть меньше для запаса
     
+    # Фоновое обновление токена (только при заданных учетных данных и без тестовых данных по умолчанию):
+    # за сколько секунд до истечения обновлять, начальная и максимальная пауза между попытками после ошибки
+    TOKEN_BACKGROUND_REFRESH: bool = os.getenv("TOKEN_BACKGROUND_REFRESH", "true").lower() == "true"
+    TOKEN_REFRESH_MARGIN: int = 300
+    TOKEN_REFRESH_RETRY_DELAY: int = 30
+    TOKEN_REFRESH_MAX_RETRY_DELAY: int = 600
+    
+    # Пул HTTP-соединений к внешнему API: общий лимит соединений, лимит на хост,
+    # время жизни keep-alive соединения и кеш DNS (в секундах)
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+    HTTP_DNS_CACHE_TTL: int = 300
+    
+    # Таймауты HTTP-запросов (в секундах): общий, на установку соединения и на чтение
+    HTTP_TOTAL_TIMEOUT: float = float(os.getenv("HTTP_TOTAL_TIMEOUT", "120"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    
+    # Локальный кеш цен по дням (SQLite): исторические цены не меняются,
+    # поэтому из внешнего API запрашиваются только отсутствующие дни
+    MARKET_CACHE_ENABLED: bool = os.getenv("MARKET_CACHE_ENABLED", "true").lower() == "true"
+    MARKET_CACHE_PATH: str = os.getenv("MARKET_CACHE_PATH", "data/market_cache.sqlite3")
+    
+    # Загрузка длинных периодов частями: размер окна в днях (0 - одним запросом),
+    # число одновременных запросов, число повторов и начальная пауза между ними (в секундах)
+    MARKET_FETCH_CHUNK_DAYS: int = int(os.getenv("MARKET_FETCH_CHUNK_DAYS", "31"))
+    MARKET_FETCH_CONCURRENCY: int = int(os.getenv("MARKET_FETCH_CONCURRENCY", "4"))
+    MARKET_FETCH_RETRIES: int = int(os.getenv("MARKET_FETCH_RETRIES", "2"))
+    MARKET_FETCH_RETRY_DELAY: float = 1.0
+    
+    # Устойчивость к сбоям внешнего API: ограничение времени одной попытки (в секундах);
+    # после UPSTREAM_BREAKER_FAILURES сбоев подряд API не вызывается UPSTREAM_BREAKER_RESET_TIMEOUT секунд
+    UPSTREAM_ATTEMPT_TIMEOUT: float = float(os.getenv("UPSTREAM_ATTEMPT_TIMEOUT", "20"))
+    UPSTREAM_BREAKER_FAILURES: int = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+    UPSTREAM_BREAKER_RESET_TIMEOUT: float = float(os.getenv("UPSTREAM_BREAKER_RESET_TIMEOUT", "60"))
+    
     # Флаг, указывающий использовать ли тестовые данные по умолчанию 
     # из-за отсутствия настоящего API
     USE_TEST_DATA_BY_DEFAULT: bool = False
     
+    # Движок оптимизатора: "numpy" (пакетный расчет по всем дням) или "python" (цикл по дням)
+    OPTIMIZER_ENGINE: str = os.getenv("OPTIMIZER_ENGINE", "numpy")
+    
+    # Параметры накопителя: емкость (кВтч), мощность заряда/разряда (кВт),
+    # КПД полного цикла заряд/разряд и стоимость деградации за один полный цикл (EUR)
+    BATTERY_CAPACITY_KWH: float = float(os.getenv("BATTERY_CAPACITY_KWH", "100"))
+    BATTERY_CHARGE_POWER_KW: float = float(os.getenv("BATTERY_CHARGE_POWER_KW", "100"))
+    BATTERY_DISCHARGE_POWER_KW: float = float(os.getenv("BATTERY_DISCHARGE_POWER_KW", "100"))
+    ROUND_TRIP_EFFICIENCY: float = float(os.getenv("ROUND_TRIP_EFFICIENCY", "0.85"))
+    DEGRADATION_COST_PER_CYCLE: float = float(os.getenv("DEGRADATION_COST_PER_CYCLE", "0"))
+    
+    # Диспетчеризация: число уровней дискретизации заряда (SoC) по умолчанию и максимум,
+    # а также ограничение размера блока дней (ячеек день x уровень x действие) для памяти
+    DISPATCH_SOC_LEVELS: int = 20
+    DISPATCH_MAX_SOC_LEVELS: int = 100
+    DISPATCH_BLOCK_CELLS: int = 2_000_000
+    
+    # Кеш результатов оптимизации в памяти: максимальное число результатов (0 - кеш выключен)
+    # и время жизни результата (в секундах); результат сбрасывается при изменении цен его дней
+    OPTIMIZATION_CACHE_SIZE: int = int(os.getenv("OPTIMIZATION_CACHE_SIZE", "128"))
+    OPTIMIZATION_CACHE_TTL: float = float(os.getenv("OPTIMIZATION_CACHE_TTL", "300"))
+    
+    # Скользящее окно последних дней для инкрементальной оптимизации: длина окна (в днях),
+    # число циклов в сутки и число хранимых версий для запросов изменений
+    ROLLING_WINDOW_DAYS: int = int(os.getenv("ROLLING_WINDOW_DAYS", "30"))
+    ROLLING_MAX_CYCLES_PER_DAY: int = int(os.getenv("ROLLING_MAX_CYCLES_PER_DAY", "1"))
+    ROLLING_HISTORY_SIZE: int = 100
+    
+    # Ежедневная фоновая загрузка цен после аукциона на сутки вперед (по умолчанию выключена): время запуска
+    # (ЧЧ:ММ, местное время), число повторов и начальная пауза между ними (в секундах)
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+    PREFETCH_TIME: str = os.getenv("PREFETCH_TIME", "13:30")
+    PREFETCH_RETRIES: int = int(os.getenv("PREFETCH_RETRIES", "5"))
+    PREFETCH_RETRY_DELAY: float = 60.0
+    
+    # Вычисления (разбор CSV, оптимизация) выполняются вне цикла событий в пуле "thread" или "process":
+    # число исполнителей и число ожидающих задач, сверх которого запросы получают ответ 429
+    WORKER_POOL_KIND: str = os.getenv("WORKER_POOL_KIND", "thread")
+    WORKER_POOL_SIZE: int = int(os.getenv("WORKER_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+    WORKER_QUEUE_SIZE: int = int(os.getenv("WORKER_QUEUE_SIZE", "32"))
+    
+    # Интервал измерения задержки цикла событий (в секундах)
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5
+    
+    # Верхняя граница параметра max_cycles_per_day (число циклов заряд/разряд в сутки)
+    MAX_CYCLES_PER_DAY_LIMIT: int = 6
+    
+    # Разбор CSV: "pandas" (C-парсер, колонки целиком) или "python" (csv.reader, построчно);
+    # ответ API разбирается блоками по CSV_INGEST_CHUNK_BYTES
+    CSV_INGEST_ENGINE: str = os.getenv("CSV_INGEST_ENGINE", "pandas")
+    CSV_INGEST_CHUNK_BYTES: int = 256 * 1024
+    
+    # Загрузка CSV: файл читается и разбирается порциями, размер и число строк ограничены
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    MAX_UPLOAD_ROWS: int = int(os.getenv("MAX_UPLOAD_ROWS", "2000000"))
+    
     # CORS настройки
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
     
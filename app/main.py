@@ -6,12 +6,18 @@ import uvicorn
 from contextlib import asynccontextmanager
 import os
 from pathlib import Path
+from typing import Optional
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
 from app.api.router import api_router
 from app.core.config import settings
 from app.core.logging_config import logger
+from app.services.market_data import market_service
+from app.services.prefetch import PrefetchScheduler
+from app.services.workers import loop_lag_monitor, worker_pool
+from app.api.endpoints.optimization import day_ahead_cached, prefetch_day_ahead
+from app.utils.time_slots import parse_slot
 
 # Создаем middleware для добавления специальных заголовков безопасности
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
@@ -27,13 +33,39 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         response.headers["Content-Security-Policy"] = "frame-ancestors https: http: ws: wss: data: blob: file:"
         return response
 
+def create_prefetch_scheduler() -> Optional[PrefetchScheduler]:
+    """Daily prefetch of the day-ahead prices, None if it is disabled or misconfigured"""
+    if not settings.PREFETCH_ENABLED:
+        return None
+    run_at_minute = parse_slot(settings.PREFETCH_TIME)
+    if run_at_minute is None:
+        logger.error(f"Invalid PREFETCH_TIME {settings.PREFETCH_TIME!r}, the prefetch is disabled")
+        return None
+    return PrefetchScheduler(
+        prefetch_day_ahead,
+        run_at_minute,
+        settings.PREFETCH_RETRIES,
+        settings.PREFETCH_RETRY_DELAY,
+        is_current=day_ahead_cached
+    )
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code executed when the application starts
     logger.info("Starting API service optimization of the energy market")
+    await market_service.start()
+    loop_lag_monitor.start()
+    prefetch_scheduler = create_prefetch_scheduler()
+    if prefetch_scheduler is not None:
+        prefetch_scheduler.start()
     yield
     # Code executed when the application stops
     logger.info("Stopping API service")
+    if prefetch_scheduler is not None:
+        await prefetch_scheduler.stop()
+    await loop_lag_monitor.stop()
+    worker_pool.shutdown()
+    await market_service.close()
 
 # Create an instance of FastAPI
 app = FastAPI(
@@ -56,7 +88,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Test-Data"],  # Allow access to the X-Test-Data header
+    expose_headers=["X-Test-Data", "X-Cache"],  # Allow access to the X-Test-Data and X-Cache headers
 )
 
 # Connect API routes
@@ -9,6 +9,7 @@ class MarketDataRequest(BaseModel):
 class MarketDataItem(BaseModel):
     date: datetime = Field(..., description="Дата")
     hour: int = Field(..., description="Час (0-23)")
+    minute: int = Field(0, description="Минута начала интервала (0, 15, 30, 45 для 15-минутных цен)")
     price_ct_kwh: float = Field(..., description="Цена в центах за кВтч")
     price_eur: float = Field(..., description="Цена в евро за кВтч")
     
@@ -0,0 +1,202 @@
+from array import array
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.logging_config import logger
+from app.utils.dates import format_day_ordinal, to_day_ordinal
+from app.utils.time_slots import DEFAULT_SLOT_MINUTES, MINUTES_PER_DAY, MINUTES_PER_HOUR
+
+
+class MarketData:
+    """
+    Columnar container of market prices.
+
+    Instead of one dictionary per price slot the data is kept in four arrays:
+    the day as a date ordinal (int32), the hour (int8) and minute (int8) at which
+    the slot starts and the price in ct/kWh (float64). Hourly data has all
+    minutes at 0, quarter-hourly data has 96 slots per day. Records are
+    converted to dictionaries only at the JSON edge.
+    """
+
+    __slots__ = ("day", "hour", "minute", "price_ct_kwh")
+
+    def __init__(self, day: np.ndarray, hour: np.ndarray, price_ct_kwh: np.ndarray, minute: Optional[np.ndarray] = None):
+        self.day = np.asarray(day, dtype=np.int32)
+        self.hour = np.asarray(hour, dtype=np.int8)
+        self.price_ct_kwh = np.asarray(price_ct_kwh, dtype=np.float64)
+        self.minute = np.zeros(len(self.day), dtype=np.int8) if minute is None else np.asarray(minute, dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def __repr__(self) -> str:
+        return f"MarketData({len(self)} records, {self.n_days} days)"
+
+    @property
+    def price_eur(self) -> np.ndarray:
+        """Prices in EUR/kWh"""
+        return self.price_ct_kwh / 100.0
+
+    @property
+    def n_days(self) -> int:
+        return len(np.unique(self.day))
+
+    @property
+    def slot(self) -> np.ndarray:
+        """Start of every record's slot as minute of the day"""
+        return self.hour.astype(np.int64) * MINUTES_PER_HOUR + self.minute
+
+    @property
+    def is_hourly(self) -> bool:
+        """True if every slot starts at a full hour"""
+        return not self.minute.any()
+
+    def day_slot_minutes(self) -> Dict[int, int]:
+        """Slot length in minutes of every day (see slot_minutes)"""
+        days, _, lengths = self._slot_lengths()
+        return dict(zip(days.tolist(), lengths.tolist()))
+
+    def slot_minutes(self) -> np.ndarray:
+        """
+        Slot length in minutes of every record: the smallest step between the slots
+        of its day (60 for hourly, 15 for quarter-hourly prices), DEFAULT_SLOT_MINUTES
+        for a day with a single slot.
+        """
+        _, codes, lengths = self._slot_lengths()
+        return lengths[codes]
+
+    def _slot_lengths(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (days, day index of every record, slot length of every day)"""
+        days, codes = np.unique(self.day, return_inverse=True)
+        lengths = np.full(len(days), MINUTES_PER_DAY, dtype=np.int64)
+        if len(self) > 1:
+            slots = self.slot
+            order = np.lexsort((slots, codes))
+            steps = np.diff(slots[order])
+            sorted_codes = codes[order]
+            step_days = (sorted_codes[1:] == sorted_codes[:-1]) & (steps > 0)
+            np.minimum.at(lengths, sorted_codes[1:][step_days], steps[step_days])
+        lengths[lengths == MINUTES_PER_DAY] = DEFAULT_SLOT_MINUTES
+        return days, codes, lengths
+
+    @classmethod
+    def empty(cls) -> "MarketData":
+        return cls(np.empty(0), np.empty(0), np.empty(0), np.empty(0))
+
+    @classmethod
+    def concat(cls, parts: Iterable["MarketData"]) -> "MarketData":
+        """Joins several containers one after another"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(
+            np.concatenate([part.day for part in parts]),
+            np.concatenate([part.hour for part in parts]),
+            np.concatenate([part.price_ct_kwh for part in parts]),
+            np.concatenate([part.minute for part in parts])
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "MarketData":
+        """
+        Builds the container from dictionaries with date, hour, optional minute and
+        price_ct_kwh (or price_eur) keys. Records with an unrecognized date are skipped.
+        """
+        builder = MarketDataBuilder()
+        for record in records:
+            ordinal = to_day_ordinal(record["date"])
+            if ordinal is None:
+                logger.warning(f"Skipping market data record with unrecognized date: {record}")
+                continue
+
+            price_ct_kwh = record.get("price_ct_kwh")
+            if price_ct_kwh is None:
+                price_ct_kwh = record["price_eur"] * 100.0
+            builder.append(ordinal, record["hour"], price_ct_kwh, record.get("minute", 0))
+        return builder.build()
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        Converts the data to dictionaries with date (DD.MM.YYYY), hour, price_ct_kwh and price_eur;
+        sub-hourly data also gets the minute of every slot
+        """
+        if not self.is_hourly:
+            return [
+                {
+                    "date": format_day_ordinal(ordinal),
+                    "hour": hour,
+                    "minute": minute,
+                    "price_ct_kwh": price_ct_kwh,
+                    "price_eur": price_ct_kwh / 100.0
+                }
+                for ordinal, hour, minute, price_ct_kwh in zip(
+                    self.day.tolist(), self.hour.tolist(), self.minute.tolist(), self.price_ct_kwh.tolist()
+                )
+            ]
+        return [
+            {
+                "date": format_day_ordinal(ordinal),
+                "hour": hour,
+                "price_ct_kwh": price_ct_kwh,
+                "price_eur": price_ct_kwh / 100.0
+            }
+            for ordinal, hour, price_ct_kwh in zip(self.day.tolist(), self.hour.tolist(), self.price_ct_kwh.tolist())
+        ]
+
+    def take(self, index: Any) -> "MarketData":
+        """Returns the records selected by a slice, mask or index array"""
+        return MarketData(self.day[index], self.hour[index], self.price_ct_kwh[index], self.minute[index])
+
+    def select_days(self, first_day: date, last_day: date) -> "MarketData":
+        """Returns the records of the days in [first_day, last_day]"""
+        mask = (self.day >= first_day.toordinal()) & (self.day <= last_day.toordinal())
+        if mask.all():
+            return self
+        return self.take(mask)
+
+    def sort_by_day(self) -> "MarketData":
+        """Orders the records by day, keeping the order of records within a day"""
+        if len(self) < 2 or np.all(self.day[1:] >= self.day[:-1]):
+            return self
+        return self.take(np.argsort(self.day, kind="stable"))
+
+    def iter_days(self) -> Iterator[Tuple[int, "MarketData"]]:
+        """Yields (day ordinal, records of the day) for every run of consecutive records of one day"""
+        if not len(self):
+            return
+        boundaries = np.flatnonzero(self.day[1:] != self.day[:-1]) + 1
+        starts = [0] + boundaries.tolist()
+        stops = boundaries.tolist() + [len(self)]
+        for start, stop in zip(starts, stops):
+            yield int(self.day[start]), self.take(slice(start, stop))
+
+
+class MarketDataBuilder:
+    """Collects market data row by row into compact typed arrays"""
+
+    def __init__(self):
+        self._day = array("i")
+        self._hour = array("b")
+        self._minute = array("b")
+        self._price = array("d")
+
+    def __len__(self) -> int:
+        return len(self._day)
+
+    def append(self, day_ordinal: int, hour: int, price_ct_kwh: float, minute: int = 0) -> None:
+        self._day.append(day_ordinal)
+        self._hour.append(hour)
+        self._minute.append(minute)
+        self._price.append(price_ct_kwh)
+
+    def build(self) -> MarketData:
+        return MarketData(
+            np.frombuffer(self._day, dtype=np.int32) if len(self._day) else np.empty(0),
+            np.frombuffer(self._hour, dtype=np.int8) if len(self._hour) else np.empty(0),
+            np.frombuffer(self._price, dtype=np.float64) if len(self._price) else np.empty(0),
+            np.frombuffer(self._minute, dtype=np.int8) if len(self._minute) else np.empty(0)
+        )
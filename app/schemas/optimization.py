@@ -6,14 +6,15 @@ class OptimizationRequest(BaseModel):
     start_date: datetime = Field(..., description="Start date (format: YYYY-MM-DD)")
     end_date: datetime = Field(..., description="End date (format: YYYY-MM-DD)")
     threshold: float = Field(0.0, description="Minimum profit threshold in EUR")
+    max_cycles_per_day: int = Field(1, ge=1, description="Maximum number of non-overlapping cycles per day")
 
 class OptimizationCycle(BaseModel):
     cycle: int = Field(..., description="Cycle number")
     date: str = Field(..., description="Date (format: DD.MM.YYYY or YYYY-MM-DD)")
-    charge_start: str = Field(..., description="Charge start time (format: HH:00)")
-    charge_end: str = Field(..., description="Charge end time (format: HH:00)")
-    discharge_start: str = Field(..., description="Discharge start time (format: HH:00)")
-    discharge_end: str = Field(..., description="Discharge end time (format: HH:00)")
+    charge_start: str = Field(..., description="Charge start time (format: H:MM)")
+    charge_end: str = Field(..., description="Charge end time (format: H:MM, 24:00 for the end of the day)")
+    discharge_start: str = Field(..., description="Discharge start time (format: H:MM)")
+    discharge_end: str = Field(..., description="Discharge end time (format: H:MM, 24:00 for the end of the day)")
     charge_price: float = Field(..., description="Charge price (EUR/kWh)")
     discharge_price: float = Field(..., description="Discharge price (EUR/kWh)")
     profit: float = Field(..., description="Profit for 100 kWh (EUR)")
@@ -21,3 +22,42 @@ class OptimizationCycle(BaseModel):
 
 class OptimizationResponse(BaseModel):
     cycles: List[OptimizationCycle]
+
+class ThresholdSummary(BaseModel):
+    threshold: float = Field(..., description="Profit threshold (EUR)")
+    cycles: int = Field(..., description="Number of cycles with profit above the threshold")
+    total_profit: float = Field(..., description="Total profit of these cycles (EUR)")
+    total_profit_after_losses: float = Field(..., description="Total profit after efficiency losses (EUR)")
+
+class ThresholdSweepResponse(BaseModel):
+    thresholds: List[ThresholdSummary]
+
+class BatteryParameters(BaseModel):
+    capacity_kwh: float = Field(..., gt=0, description="Usable battery capacity (kWh)")
+    charge_power_kw: float = Field(..., gt=0, description="Maximum charge power (kW)")
+    discharge_power_kw: float = Field(..., gt=0, description="Maximum discharge power (kW)")
+    round_trip_efficiency: float = Field(..., gt=0, le=1, description="Round-trip efficiency of a charge/discharge cycle")
+    degradation_cost_per_cycle: float = Field(0.0, ge=0, description="Degradation cost of one full cycle (EUR)")
+
+class DispatchSlot(BaseModel):
+    hour: int = Field(..., description="Hour of the slot")
+    minute: int = Field(0, description="Minute at which the slot starts (0 for hourly prices)")
+    price: float = Field(..., description="Price (EUR/kWh)")
+    grid_kwh: float = Field(..., description="Energy exchanged with the grid (kWh), positive when charging")
+    soc_kwh: float = Field(..., description="Stored energy at the end of the slot (kWh)")
+
+class DispatchDay(BaseModel):
+    date: str = Field(..., description="Date (format: DD.MM.YYYY)")
+    charged_kwh: float = Field(..., description="Energy bought from the grid (kWh)")
+    discharged_kwh: float = Field(..., description="Energy sold to the grid (kWh)")
+    charge_cost: float = Field(..., description="Cost of charging (EUR)")
+    discharge_revenue: float = Field(..., description="Revenue from discharging (EUR)")
+    degradation_cost: float = Field(..., description="Battery degradation cost (EUR)")
+    profit: float = Field(..., description="Profit of the day (EUR)")
+    equivalent_cycles: float = Field(..., description="Discharged energy in full battery cycles")
+    schedule: Optional[List[DispatchSlot]] = Field(None, description="Per-slot schedule")
+
+class DispatchResponse(BaseModel):
+    days: List[DispatchDay]
+    total_profit: float = Field(..., description="Total profit of the period (EUR)")
+    mode: str = Field(..., description="Dispatch mode: daily or continuous")
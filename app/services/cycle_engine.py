@@ -0,0 +1,220 @@
+"""
+Vectorized (NumPy) engine for charge/discharge cycle computation.
+
+All prices of the processed period are loaded into one (days x slots) matrix,
+so the per-day statistics are computed in a single batch pass instead of a
+Python loop over every day.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class DailyPriceMatrix:
+    """
+    Prices of several days laid out as a (days x slots) matrix.
+
+    Rows follow the order in which the days first appear in the input data,
+    columns are the day's entries sorted by slot start (stable, so entries with
+    the same slot keep their input order). Days with fewer entries than the widest
+    day are padded: prices with NaN, slots with -1.
+    """
+
+    def __init__(self, day_keys: List[Any], prices: np.ndarray, slots: np.ndarray, counts: np.ndarray):
+        self.day_keys = day_keys
+        self.prices = prices
+        self.slots = slots
+        self.counts = counts
+
+    @property
+    def n_days(self) -> int:
+        return self.prices.shape[0]
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Boolean mask of real (non-padded) entries"""
+        return np.arange(self.prices.shape[1]) < self.counts[:, None]
+
+
+def build_daily_matrix(days: np.ndarray, slots: np.ndarray, prices: np.ndarray) -> DailyPriceMatrix:
+    """
+    Groups flat price columns into a (days x slots) matrix.
+
+    Args:
+        days: Day key of every record (date ordinals)
+        slots: Slot start of every record (minute of the day)
+        prices: Price of every record
+
+    Returns:
+        DailyPriceMatrix with one row per day
+    """
+    codes, uniques = pd.factorize(np.asarray(days), sort=False)
+    day_keys = uniques.tolist()
+
+    n_days = len(day_keys)
+    counts = np.bincount(codes, minlength=n_days)
+    width = int(counts.max()) if n_days else 0
+
+    # Sort by day, then by slot; lexsort is stable so equal slots keep input order
+    order = np.lexsort((slots, codes))
+    sorted_codes = codes[order]
+    starts = np.cumsum(counts) - counts
+    columns = np.arange(len(order)) - starts[sorted_codes]
+
+    matrix_prices = np.full((n_days, width), np.nan, dtype=np.float64)
+    matrix_slots = np.full((n_days, width), -1, dtype=np.int64)
+    matrix_prices[sorted_codes, columns] = prices[order]
+    matrix_slots[sorted_codes, columns] = slots[order]
+
+    return DailyPriceMatrix(day_keys, matrix_prices, matrix_slots, counts)
+
+
+def batch_max_spread_cycles(
+    matrix: DailyPriceMatrix,
+    threshold: float = 0.0,
+    energy_kwh: float = 100.0,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Computes the max-spread charge/discharge cycle of every day in one batch pass.
+
+    Vectorized form of OptimizerService.compute_daily_min_max_cycle: for every
+    entry the running minimum of the earlier entries of the same day is the best
+    charge price, the entry with the largest spread to it is the discharge slot.
+    The cycle is kept when the profit for energy_kwh exceeds the threshold.
+
+    Args:
+        matrix: Prices grouped by day
+        threshold: Minimum profitability threshold in EUR
+        energy_kwh: Energy moved by one cycle, used to compute the profit
+
+    Returns:
+        List with one entry per matrix row: the cycle dictionary or None
+    """
+    result: List[Optional[Dict[str, Any]]] = [None] * matrix.n_days
+    if matrix.n_days == 0 or matrix.prices.shape[1] < 2:
+        return result
+
+    valid = matrix.valid
+    low = np.where(valid, matrix.prices, np.inf)
+    high = np.where(valid, matrix.prices, -np.inf)
+
+    # Running minimum of the strictly earlier entries of every day
+    earlier_min = np.empty_like(low)
+    earlier_min[:, 0] = np.inf
+    np.minimum.accumulate(low[:, :-1], axis=1, out=earlier_min[:, 1:])
+
+    with np.errstate(invalid="ignore"):
+        spread = high - earlier_min
+    spread[np.isnan(spread)] = -np.inf
+
+    rows = np.arange(matrix.n_days)
+    columns = np.arange(low.shape[1])
+    discharge_idx = np.argmax(spread, axis=1)
+    best_spread = spread[rows, discharge_idx]
+
+    # First occurrence of the minimum before the discharge slot
+    charge_idx = np.argmin(np.where(columns < discharge_idx[:, None], low, np.inf), axis=1)
+
+    charge_price = matrix.prices[rows, charge_idx]
+    discharge_price = matrix.prices[rows, discharge_idx]
+    profit = (discharge_price - charge_price) * energy_kwh
+
+    selected = np.flatnonzero(np.isfinite(best_spread) & (profit > threshold))
+    charge_slot = matrix.slots[rows, charge_idx]
+    discharge_slot = matrix.slots[rows, discharge_idx]
+    for row in selected.tolist():
+        result[row] = {
+            "charge_start": int(charge_slot[row]),
+            "discharge_start": int(discharge_slot[row]),
+            "charge_price": float(charge_price[row]),
+            "discharge_price": float(discharge_price[row]),
+            "profit": float(profit[row]),
+        }
+    return result
+
+
+def batch_k_cycles(
+    matrix: DailyPriceMatrix,
+    max_cycles: int,
+    threshold: float = 0.0,
+    energy_kwh: float = 100.0,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Finds up to max_cycles non-overlapping charge/discharge cycles of every day.
+
+    Batched form of OptimizerService.compute_daily_cycles: the O(k*n)
+    k-transaction dynamic program runs column by column with all days of the
+    matrix updated at once, then the chosen cycles are recovered by a batched
+    backtracking pass. Each slot is used for at most one action, so a cycle
+    can start charging right after the previous one finished discharging.
+
+    Args:
+        matrix: Prices grouped by day
+        max_cycles: Maximum number of cycles per day
+        threshold: Minimum profitability threshold in EUR for each cycle
+        energy_kwh: Energy moved by one cycle, used to compute the profit
+
+    Returns:
+        List with one entry per matrix row: the day's cycles in chronological order
+    """
+    result: List[List[Dict[str, Any]]] = [[] for _ in range(matrix.n_days)]
+    n_days, width = matrix.prices.shape
+    if n_days == 0 or width < 2:
+        return result
+
+    k = max_cycles
+    valid = matrix.valid
+    # free[t]: best value with t finished cycles, hold[t]: best value while charged in cycle t
+    free = np.zeros((k + 1, n_days))
+    hold = np.full((k + 1, n_days), -np.inf)
+    bought = np.zeros((width, k + 1, n_days), dtype=bool)
+    sold = np.zeros((width, k + 1, n_days), dtype=bool)
+
+    for j in range(width):
+        price = matrix.prices[:, j]
+        active = valid[:, j]
+        prev_free = free.copy()
+        prev_hold = hold.copy()
+        for t in range(1, k + 1):
+            buy_value = prev_free[t - 1] - price
+            buy = active & (buy_value > prev_hold[t])
+            hold[t] = np.where(buy, buy_value, prev_hold[t])
+            bought[j, t] = buy
+
+            sell_value = prev_hold[t] + price
+            sell = active & (sell_value > prev_free[t])
+            free[t] = np.where(sell, sell_value, prev_free[t])
+            sold[j, t] = sell
+
+    # Walk back from "k cycles, not charged" at the last column
+    rows = np.arange(n_days)
+    state = np.full(n_days, k)
+    holding = np.zeros(n_days, dtype=bool)
+    charge_idx = np.full((n_days, k + 1), -1)
+    discharge_idx = np.full((n_days, k + 1), -1)
+
+    for j in range(width - 1, -1, -1):
+        do_buy = holding & bought[j, state, rows]
+        do_sell = ~holding & (state > 0) & sold[j, state, rows]
+
+        charge_idx[rows[do_buy], state[do_buy]] = j
+        discharge_idx[rows[do_sell], state[do_sell]] = j
+        holding = (holding & ~do_buy) | do_sell
+        state = state - do_buy
+
+    for row, t in zip(*np.nonzero(discharge_idx[:, 1:] >= 0)):
+        charge_col = charge_idx[row, t + 1]
+        discharge_col = discharge_idx[row, t + 1]
+        charge_price = matrix.prices[row, charge_col]
+        discharge_price = matrix.prices[row, discharge_col]
+        profit = (discharge_price - charge_price) * energy_kwh
+        if profit > threshold:
+            result[row].append({
+                "charge_start": int(matrix.slots[row, charge_col]),
+                "discharge_start": int(matrix.slots[row, discharge_col]),
+                "charge_price": float(charge_price),
+                "discharge_price": float(discharge_price),
+                "profit": float(profit),
+            })
+    return result
@@ -0,0 +1,108 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+class CycleIndex:
+    """
+    Threshold-independent optimization result of a period.
+
+    The threshold only filters the cycles found for every day (a cycle is kept
+    when its profit exceeds it), so the cycles are computed once without a
+    threshold and indexed by profit. Any threshold is then answered by a binary
+    search over the sorted profits instead of a new optimization run.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        """
+        Args:
+            records: Cycle records of OptimizerService.process_data computed
+                without a threshold, in chronological order
+        """
+        self._records = records
+        profits = np.array([record["profit"] for record in records], dtype=np.float64)
+        profits_after_losses = np.array([record["profit_after_losses"] for record in records], dtype=np.float64)
+
+        # Positions of the records ordered by profit; equal profits keep chronological order
+        self._order = np.argsort(profits, kind="stable")
+        self._sorted_profits = profits[self._order]
+
+        # Totals of the cycles from every position of the profit order to the end
+        self._profit_totals = _suffix_sums(self._sorted_profits)
+        self._profit_after_losses_totals = _suffix_sums(profits_after_losses[self._order])
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _positions(self, thresholds: np.ndarray) -> np.ndarray:
+        """Position of the first cycle with profit above every threshold in the profit order"""
+        return np.searchsorted(self._sorted_profits, thresholds, side="right")
+
+    def count(self, threshold: float) -> int:
+        """Number of cycles with profit above threshold"""
+        return len(self._records) - int(self._positions(np.float64(threshold)))
+
+    def cycles(self, threshold: float) -> List[Dict[str, Any]]:
+        """
+        Returns the cycles with profit above threshold, the same records (numbered
+        from 1) that process_data returns for this threshold.
+        """
+        position = int(self._positions(np.float64(threshold)))
+        selected = np.sort(self._order[position:])
+        return [
+            dict(self._records[index], cycle=number)
+            for number, index in enumerate(selected.tolist(), start=1)
+        ]
+
+    def totals(self, thresholds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the number of cycles, the total profit and the total profit after
+        losses of the cycles with profit above every threshold.
+        """
+        positions = self._positions(thresholds)
+        return (
+            len(self._records) - positions,
+            self._profit_totals[positions],
+            self._profit_after_losses_totals[positions]
+        )
+
+    def summarize(self, thresholds: Iterable[float]) -> List[Dict[str, Any]]:
+        """
+        Computes the number of cycles and the total profit for every threshold.
+
+        Args:
+            thresholds: Profit thresholds in EUR
+
+        Returns:
+            One dictionary per threshold with threshold, cycles, total_profit
+            and total_profit_after_losses
+        """
+        thresholds = np.asarray(list(thresholds), dtype=np.float64)
+        return threshold_summaries(thresholds, *self.totals(thresholds))
+
+
+def threshold_summaries(
+    thresholds: np.ndarray,
+    counts: np.ndarray,
+    profits: np.ndarray,
+    profits_after_losses: np.ndarray
+) -> List[Dict[str, Any]]:
+    """Formats the totals of CycleIndex.totals as one dictionary per threshold"""
+    return [
+        {
+            "threshold": threshold,
+            "cycles": count,
+            "total_profit": profit,
+            "total_profit_after_losses": profit_after_losses
+        }
+        for threshold, count, profit, profit_after_losses in zip(
+            thresholds.tolist(), counts.tolist(), profits.tolist(), profits_after_losses.tolist()
+        )
+    ]
+
+
+def _suffix_sums(values: np.ndarray) -> np.ndarray:
+    """Sums of values[i:] for every i from 0 to len(values) (the last one is 0)"""
+    totals = np.zeros(len(values) + 1, dtype=np.float64)
+    totals[:-1] = np.cumsum(values[::-1])[::-1]
+    return totals
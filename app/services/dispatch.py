@@ -0,0 +1,246 @@
+from typing import List, Dict, Any, Optional, Union
+import math
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.schemas.market_frame import MarketData
+from app.schemas.optimization import BatteryParameters
+from app.services.cycle_engine import DailyPriceMatrix, build_daily_matrix
+from app.utils.dates import format_day_ordinal
+from app.utils.time_slots import MINUTES_PER_HOUR
+
+DISPATCH_MODES = ("daily", "continuous")
+
+
+class DispatchService:
+    """
+    State-of-charge aware battery dispatch.
+
+    The battery state of charge (SoC) is discretized into a fixed number of levels
+    and every slot chooses how many levels to charge or discharge, limited by the
+    charge/discharge power. The best schedule is found with a backward dynamic
+    program over the SoC levels, vectorized over all days of a block.
+
+    Charging one level buys level_kwh / sqrt(efficiency) kWh from the grid,
+    discharging one level sells level_kwh * sqrt(efficiency) kWh, and every
+    discharged kWh of stored energy costs degradation_cost_per_cycle / capacity.
+    """
+
+    def default_battery(self) -> BatteryParameters:
+        """Battery parameters from the application settings"""
+        return BatteryParameters(
+            capacity_kwh=settings.BATTERY_CAPACITY_KWH,
+            charge_power_kw=settings.BATTERY_CHARGE_POWER_KW,
+            discharge_power_kw=settings.BATTERY_DISCHARGE_POWER_KW,
+            round_trip_efficiency=settings.ROUND_TRIP_EFFICIENCY,
+            degradation_cost_per_cycle=settings.DEGRADATION_COST_PER_CYCLE
+        )
+
+    def process_data(
+        self,
+        data: Union[MarketData, List[Dict[str, Any]]],
+        battery: Optional[BatteryParameters] = None,
+        mode: str = "daily",
+        soc_levels: Optional[int] = None,
+        slot_hours: Optional[float] = None,
+        include_schedule: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Computes the optimal battery schedule for market data.
+
+        Args:
+            data: Market data (MarketData or a list of dictionaries with market data)
+            battery: Battery parameters, defaults to the application settings
+            mode: "daily" solves every day separately starting and ending empty,
+                "continuous" solves the whole period as one horizon so energy can
+                be carried over day boundaries
+            soc_levels: Number of SoC discretization steps, defaults to settings.DISPATCH_SOC_LEVELS
+            slot_hours: Duration of one price slot in hours, defaults to the shortest
+                slot of the data (1.0 for hourly, 0.25 for quarter-hourly prices)
+            include_schedule: Add the per-slot schedule to every day
+
+        Returns:
+            List of per-day dispatch summaries
+        """
+        if mode not in DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode: {mode}")
+        if not isinstance(data, MarketData):
+            data = MarketData.from_records(data)
+
+        battery = battery or self.default_battery()
+        soc_levels = min(soc_levels or settings.DISPATCH_SOC_LEVELS, settings.DISPATCH_MAX_SOC_LEVELS)
+
+        logger.info(
+            f"Dispatching {len(data)} data records (mode: {mode}, capacity: {battery.capacity_kwh} kWh, "
+            f"SoC levels: {soc_levels})"
+        )
+
+        if not len(data):
+            return []
+
+        if slot_hours is None:
+            slot_hours = int(data.slot_minutes().min()) / MINUTES_PER_HOUR
+
+        if mode == "continuous":
+            # The horizon runs through the days in date order, whatever the order of the input
+            data = data.sort_by_day()
+
+        matrix = build_daily_matrix(data.day, data.slot, data.price_eur)
+
+        model = _DispatchModel(battery, soc_levels, slot_hours)
+
+        if mode == "daily":
+            levels = np.zeros(matrix.prices.shape, dtype=np.int64)
+            block = max(1, settings.DISPATCH_BLOCK_CELLS // model.cells_per_row)
+            for start in range(0, matrix.n_days, block):
+                stop = min(start + block, matrix.n_days)
+                levels[start:stop] = model.solve(matrix.prices[start:stop], matrix.valid[start:stop])
+        else:
+            # One horizon: all days one after another (rows are in date order)
+            valid = matrix.valid
+            levels = np.zeros(matrix.prices.shape, dtype=np.int64)
+            series = matrix.prices[valid][None, :]
+            levels[valid] = model.solve(series, np.ones(series.shape, dtype=bool))[0]
+
+        result = self._summarize(matrix, levels, model, mode, include_schedule)
+        logger.info(f"Dispatch profit: {sum(day['profit'] for day in result):.2f} EUR over {len(result)} days")
+        return result
+
+    def _summarize(
+        self,
+        matrix: DailyPriceMatrix,
+        levels: np.ndarray,
+        model: "_DispatchModel",
+        mode: str,
+        include_schedule: bool
+    ) -> List[Dict[str, Any]]:
+        """Aggregates the per-slot SoC changes to per-day results"""
+        prices = np.where(matrix.valid, matrix.prices, 0.0)
+        charged = np.maximum(levels, 0) * model.level_kwh
+        discharged = np.maximum(-levels, 0) * model.level_kwh
+
+        grid_in = charged / model.charge_efficiency
+        grid_out = discharged * model.discharge_efficiency
+        charge_cost = (grid_in * prices).sum(axis=1)
+        discharge_revenue = (grid_out * prices).sum(axis=1)
+        degradation_cost = discharged.sum(axis=1) * model.degradation_per_kwh
+        profit = discharge_revenue - charge_cost - degradation_cost
+        if mode == "daily":
+            soc = np.cumsum(levels, axis=1) * model.level_kwh
+        else:
+            # Padding slots hold zero changes, so the running sum carries over days
+            soc = np.cumsum(levels.ravel()).reshape(levels.shape) * model.level_kwh
+
+        result = []
+        for row, day_ordinal in enumerate(matrix.day_keys):
+            day = {
+                "date": format_day_ordinal(day_ordinal),
+                "charged_kwh": float(grid_in[row].sum()),
+                "discharged_kwh": float(grid_out[row].sum()),
+                "charge_cost": float(charge_cost[row]),
+                "discharge_revenue": float(discharge_revenue[row]),
+                "degradation_cost": float(degradation_cost[row]),
+                "profit": float(profit[row]),
+                "equivalent_cycles": float(discharged[row].sum() / model.capacity_kwh)
+            }
+            if include_schedule:
+                count = int(matrix.counts[row])
+                day["schedule"] = [
+                    {
+                        "hour": int(matrix.slots[row, col]) // MINUTES_PER_HOUR,
+                        "minute": int(matrix.slots[row, col]) % MINUTES_PER_HOUR,
+                        "price": float(matrix.prices[row, col]),
+                        "grid_kwh": float(grid_in[row, col] - grid_out[row, col]),
+                        "soc_kwh": float(soc[row, col])
+                    }
+                    for col in range(count)
+                ]
+            result.append(day)
+        return result
+
+
+class _DispatchModel:
+    """Discretized SoC dynamic program for one battery configuration"""
+
+    def __init__(self, battery: BatteryParameters, soc_levels: int, slot_hours: float):
+        self.capacity_kwh = battery.capacity_kwh
+        self.n_levels = soc_levels
+        self.level_kwh = battery.capacity_kwh / soc_levels
+        self.charge_efficiency = math.sqrt(battery.round_trip_efficiency)
+        self.discharge_efficiency = math.sqrt(battery.round_trip_efficiency)
+        self.degradation_per_kwh = battery.degradation_cost_per_cycle / battery.capacity_kwh
+
+        # Largest SoC change per slot allowed by the charge/discharge power
+        eps = 1e-9
+        max_up = int(battery.charge_power_kw * slot_hours * self.charge_efficiency / self.level_kwh + eps)
+        max_down = int(battery.discharge_power_kw * slot_hours / (self.discharge_efficiency * self.level_kwh) + eps)
+        max_up = min(max_up, soc_levels)
+        max_down = min(max_down, soc_levels)
+
+        # Idle first, so ties are resolved in favour of doing nothing
+        actions = [0]
+        for step in range(1, max(max_up, max_down) + 1):
+            if step <= max_up:
+                actions.append(step)
+            if step <= max_down:
+                actions.append(-step)
+        self.actions = np.array(actions, dtype=np.int64)
+
+        states = np.arange(soc_levels + 1)
+        target = states[:, None] + self.actions[None, :]
+        self.next_state = np.clip(target, 0, soc_levels)
+        # Added to the candidates so that actions leaving [0, capacity] are never chosen
+        self.penalty = np.where((target >= 0) & (target <= soc_levels), 0.0, -np.inf)
+
+        # Cash flow of an action in a slot: price * price_factor + fixed_cost
+        charge = np.maximum(self.actions, 0) * self.level_kwh
+        discharge = np.maximum(-self.actions, 0) * self.level_kwh
+        self.price_factor = discharge * self.discharge_efficiency - charge / self.charge_efficiency
+        self.fixed_cost = -discharge * self.degradation_per_kwh
+
+        # Padding slots allow only the idle action
+        self.idle_only = np.full(len(actions), -np.inf)
+        self.idle_only[0] = 0.0
+
+    @property
+    def cells_per_row(self) -> int:
+        return (self.n_levels + 1) * len(self.actions)
+
+    def solve(self, prices: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """
+        Finds the optimal SoC change of every slot for a block of independent rows.
+
+        Every row starts empty; energy left at the end of a row has no value.
+
+        Returns:
+            Array of SoC level changes with the shape of prices
+        """
+        n_rows, n_slots = prices.shape
+        prices = np.where(valid, prices, 0.0)
+        has_padding = ~valid.all(axis=0)
+
+        value = np.zeros((n_rows, self.n_levels + 1))
+        policy = np.empty((n_slots, n_rows, self.n_levels + 1), dtype=np.int16)
+
+        for t in range(n_slots - 1, -1, -1):
+            reward = prices[:, t, None] * self.price_factor + self.fixed_cost
+            if has_padding[t]:
+                reward[~valid[:, t]] = self.idle_only
+            candidates = value[:, self.next_state]
+            candidates += self.penalty
+            candidates += reward[:, None, :]
+            best = candidates.argmax(axis=2)
+            policy[t] = best
+            value = candidates.max(axis=2)
+
+        # Forward pass from an empty battery
+        rows = np.arange(n_rows)
+        state = np.zeros(n_rows, dtype=np.int64)
+        levels = np.empty((n_rows, n_slots), dtype=np.int64)
+        for t in range(n_slots):
+            step = self.actions[policy[t][rows, state]]
+            levels[:, t] = step
+            state += step
+
+        return levels
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.core.logging_config import logger
+from app.schemas.market_frame import MarketData
+
+# Version of the table layout, stored in PRAGMA user_version
+SCHEMA_VERSION = 3
+
+
+class MarketDataCache:
+    """
+    Persistent SQLite cache of parsed market prices, keyed by day.
+
+    Historical spot prices never change, so a day that was once received from the
+    upstream API is served from disk afterwards. Each day is stored completely or
+    not at all, which lets the caller fetch exactly the missing days.
+
+    Listeners registered with add_listener are called with the ordinals of the
+    stored days after every change (None after clear), so results derived from
+    the prices can be invalidated.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[List[int]]], None]] = []
+
+    def add_listener(self, listener: Callable[[Optional[List[int]]], None]) -> None:
+        """Registers a callback for changed days"""
+        self._listeners.append(listener)
+
+    def _notify(self, days: Optional[List[int]]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(days)
+            except Exception as e:
+                logger.error(f"Market data cache listener failed: {str(e)}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database on first use and creates the tables"""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                # The cache can always be refilled from the API, so an old layout is simply dropped
+                connection.executescript("DROP TABLE IF EXISTS prices; DROP TABLE IF EXISTS days;")
+            connection.executescript(
+                f"""
+                CREATE TABLE IF NOT EXISTS days (
+                    day INTEGER PRIMARY KEY,
+                    rows INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS prices (
+                    day INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    hour INTEGER NOT NULL,
+                    minute INTEGER NOT NULL,
+                    price_ct_kwh REAL NOT NULL,
+                    PRIMARY KEY (day, position)
+                );
+                PRAGMA user_version = {SCHEMA_VERSION};
+                """
+            )
+            self._connection = connection
+            logger.info(f"Market data cache opened: {self.path}")
+        return self._connection
+
+    def cached_days(self, first_day: date, last_day: date) -> List[date]:
+        """Returns the cached days in [first_day, last_day] in ascending order"""
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute(
+                "SELECT day FROM days WHERE day BETWEEN ? AND ? ORDER BY day",
+                (first_day.toordinal(), last_day.toordinal())
+            ).fetchall()
+        return [date.fromordinal(ordinal) for (ordinal,) in rows]
+
+    def get_days(self, first_day: date, last_day: date) -> MarketData:
+        """
+        Returns the cached market data of every cached day in [first_day, last_day].
+
+        Returns:
+            MarketData ordered by day, records of a day in their original order
+        """
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute(
+                "SELECT day, hour, price_ct_kwh, minute FROM prices "
+                "WHERE day BETWEEN ? AND ? ORDER BY day, position",
+                (first_day.toordinal(), last_day.toordinal())
+            ).fetchall()
+
+        if not rows:
+            return MarketData.empty()
+        columns = np.array(rows, dtype=np.float64)
+        return MarketData(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3])
+
+    def put_days(self, data: MarketData) -> None:
+        """Stores (or replaces) the complete days contained in data"""
+        if not len(data):
+            return
+
+        fetched_at = time.time()
+        stored_days = []
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for ordinal, day_data in data.sort_by_day().iter_days():
+                    connection.execute("DELETE FROM prices WHERE day = ?", (ordinal,))
+                    connection.executemany(
+                        "INSERT INTO prices (day, position, hour, minute, price_ct_kwh) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (ordinal, position, hour, minute, price_ct_kwh)
+                            for position, (hour, minute, price_ct_kwh) in enumerate(
+                                zip(day_data.hour.tolist(), day_data.minute.tolist(), day_data.price_ct_kwh.tolist())
+                            )
+                        ]
+                    )
+                    connection.execute(
+                        "INSERT OR REPLACE INTO days (day, rows, fetched_at) VALUES (?, ?, ?)",
+                        (ordinal, len(day_data), fetched_at)
+                    )
+                    stored_days.append(ordinal)
+        logger.info(f"Stored {len(stored_days)} days in the market data cache")
+        self._notify(stored_days)
+
+    def clear(self) -> None:
+        """Removes all cached days"""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM prices")
+                connection.execute("DELETE FROM days")
+        self._notify(None)
+
+    def close(self) -> None:
+        """Closes the database connection"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -1,34 +1,206 @@
-import httpx
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
-import pandas as pd
-import json
-import random
-import base64
+import asyncio
+import codecs
+import contextlib
+import itertools
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
 import aiohttp
-import csv
-import io
 import urllib.parse
+import random
 import time
-from io import StringIO
 
 from app.core.config import settings
 from app.core.logging_config import logger
-from app.schemas.market_data import MarketDataItem
-from app.utils.csv_handler import parse_csv
+from app.schemas.market_frame import MarketData
+from app.services.market_cache import MarketDataCache
+from app.services.upstream import (
+    CircuitBreaker,
+    CircuitOpenError,
+    UpstreamConnectionError,
+    UpstreamError,
+    UpstreamResponseError,
+    UpstreamStatusError,
+    UpstreamTimeoutError,
+    UpstreamTokenError
+)
+from app.utils.csv_ingest import DEFAULT_COLUMNS, CsvColumns, header_columns, parse_price_csv, parse_price_rows
+from app.utils.dates import merge_day_ranges, split_day_range
+
+
+class UploadTooLargeError(Exception):
+    """The uploaded file exceeds the configured size or row limit"""
+
+
+class PartialMarketDataError(CircuitOpenError):
+    """
+    The circuit breaker is open and only some days of the period are cached.
+
+    data holds the cached days, missing_days the days the upstream API could not
+    be asked for; callers can serve the cached days and fill in the missing ones.
+    """
+
+    def __init__(self, message: str, data: MarketData, missing_days: List[date]):
+        super().__init__(message)
+        self.data = data
+        self.missing_days = missing_days
+
 
 class MarketDataService:
     
-    def __init__(self):
+    def __init__(self, cache: Optional[MarketDataCache] = None):
+        if cache is None and settings.MARKET_CACHE_ENABLED:
+            cache = MarketDataCache(settings.MARKET_CACHE_PATH)
+        self.cache = cache
         self._token = None
         self._token_expiry = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._token_task: Optional[asyncio.Task] = None
+        self._token_refresher: Optional[asyncio.Task] = None
+        # Upstream fetches in flight by day, so concurrent requests for the same days share one fetch
+        self._inflight: Dict[date, asyncio.Task] = {}
+        self.fetch_stats = {"upstream_fetches": 0, "coalesced_fetches": 0, "coalesced_days": 0}
+        self.breaker = CircuitBreaker(settings.UPSTREAM_BREAKER_FAILURES, settings.UPSTREAM_BREAKER_RESET_TIMEOUT)
+    
+    async def start(self) -> None:
+        """
+        Opens the pooled HTTP session and starts the background token refresh
+        (called from the application lifespan)
+        """
+        await self._get_session()
+        if self._token_refresher is None and self._background_refresh_enabled():
+            self._token_refresher = asyncio.create_task(self._token_refresh_loop())
+    
+    @staticmethod
+    def _background_refresh_enabled() -> bool:
+        """The token is kept fresh only when the API is used: credentials are set and test data is not the default"""
+        if not settings.TOKEN_BACKGROUND_REFRESH:
+            return False
+        if not (settings.CLIENT_ID and settings.CLIENT_SECRET) or settings.USE_TEST_DATA_BY_DEFAULT:
+            logger.info("Background token refresh disabled: no API credentials or test data by default")
+            return False
+        return True
+    
+    async def close(self) -> None:
+        """Stops the background token refresh, closes the pooled HTTP session and the cache"""
+        for task in (self._token_refresher, self._token_task):
+            if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._token_refresher = None
+        self._token_task = None
+        
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP session to the Netztransparenz API closed")
+        self._session = None
+        self._session_loop = None
+        if self.cache is not None:
+            self.cache.close()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Returns the shared HTTP session, creating it on first use.
+        
+        The session keeps a pool of keep-alive connections, so requests to the
+        identity server and the data API reuse TCP/TLS connections.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._session_loop is loop:
+            return self._session
+        
+        if self._session is not None and self._session_loop is not loop:
+            # A session is bound to the event loop it was created in and cannot be reused in another one
+            logger.warning("HTTP session belongs to another event loop, creating a new one")
+        
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TOTAL_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            sock_read=settings.HTTP_READ_TIMEOUT
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self._session_loop = loop
+        logger.info(
+            f"Created HTTP session (pool limit: {settings.HTTP_POOL_LIMIT}, "
+            f"per host: {settings.HTTP_POOL_LIMIT_PER_HOST}, keep-alive: {settings.HTTP_KEEPALIVE_TIMEOUT}s)"
+        )
+        return self._session
     
     async def _get_token(self) -> str:
         current_time = time.time()
         if self._token and self._token_expiry > current_time:
+            if self._token_expiry - current_time < settings.TOKEN_REFRESH_MARGIN:
+                # Refresh ahead of expiry without making this request wait
+                self._start_token_refresh()
             logger.debug("Using an existing token")
             return self._token
         
+        # No valid token: wait for the single shared refresh
+        return await asyncio.shield(self._start_token_refresh())
+    
+    def _start_token_refresh(self) -> asyncio.Task:
+        """
+        Starts a token refresh unless one is already in flight.
+        
+        All concurrent callers get the same task, so an expired token causes
+        exactly one request to the identity server.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._token_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._refresh_token())
+            task.add_done_callback(self._on_token_refresh_done)
+            self._token_task = task
+        return task
+    
+    @staticmethod
+    def _on_token_refresh_done(task: asyncio.Task) -> None:
+        # Retrieve the exception so that refreshes nobody waited for are not reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Token refresh failed: {task.exception()}")
+    
+    async def _token_refresh_loop(self) -> None:
+        """
+        Keeps the token fresh in the background, so requests never wait for the identity server.
+        
+        Failed refreshes are retried with exponential backoff (up to
+        settings.TOKEN_REFRESH_MAX_RETRY_DELAY); the loop stops when the credentials
+        are rejected, requests then refresh the token on demand.
+        """
+        failures = 0
+        while True:
+            if self._token and not failures:
+                delay = self._token_expiry - settings.TOKEN_REFRESH_MARGIN - time.time()
+                await asyncio.sleep(max(delay, settings.TOKEN_REFRESH_RETRY_DELAY))
+            
+            try:
+                await asyncio.shield(self._start_token_refresh())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, UpstreamError) and not e.retryable:
+                    logger.error(f"Background token refresh stopped, the credentials were rejected: {str(e)}")
+                    return
+                failures += 1
+                delay = min(settings.TOKEN_REFRESH_RETRY_DELAY * 2 ** (failures - 1), settings.TOKEN_REFRESH_MAX_RETRY_DELAY)
+                logger.warning(f"Background token refresh failed ({failures} times), retrying in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+            else:
+                failures = 0
+    
+    async def _refresh_token(self) -> str:
+        """Requests a new Bearer token from the identity server"""
+        current_time = time.time()
         logger.info("Receiving a new Bearer-token for the Netztransparenz API")
         
         try:
@@ -38,32 +210,350 @@ class MarketDataService:
                 'grant_type': 'client_credentials'
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(settings.TOKEN_URL, data=data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"Error when receiving a token: {response.status}, {error_text}")
-                        raise Exception(f"Error when receiving a token: {response.status}")
-                    
-                    token_data = await response.json()
-                    
-                    if 'access_token' not in token_data:
-                        logger.error(f"The response does not contain a token: {token_data}")
-                        raise Exception("The response does not contain a token")
-                    
-                    self._token = token_data['access_token']
-                    expires_in = token_data.get('expires_in', settings.TOKEN_LIFETIME)
-                    self._token_expiry = current_time + expires_in
-                    
-                    logger.info(f"Received a new token, valid until {datetime.fromtimestamp(self._token_expiry)}")
-                    return self._token
+            session = await self._get_session()
+            async with session.post(settings.TOKEN_URL, data=data) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"Error when receiving a token: {response.status}, {error_text}")
+                    raise UpstreamTokenError(f"Error when receiving a token: {response.status}", response.status)
+                
+                token_data = await response.json()
+                
+                if 'access_token' not in token_data:
+                    logger.error(f"The response does not contain a token: {token_data}")
+                    raise UpstreamTokenError("The response does not contain a token", response.status)
+                
+                self._token = token_data['access_token']
+                expires_in = token_data.get('expires_in', settings.TOKEN_LIFETIME)
+                self._token_expiry = current_time + expires_in
+                
+                logger.info(f"Received a new token, valid until {datetime.fromtimestamp(self._token_expiry)}")
+                return self._token
+        except UpstreamTokenError:
+            raise
         except Exception as e:
             logger.error(f"Error when receiving a token: {str(e)}")
-            raise Exception(f"Failed to receive an authorization token: {str(e)}")
+            raise UpstreamTokenError(f"Failed to receive an authorization token: {str(e)}") from e
     
-    async def get_market_data(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+    async def get_market_data(self, start_date: datetime, end_date: datetime) -> MarketData:
+        """
+        Returns the market data of the period: cached days from the market data
+        cache, the other days from the upstream API.
+        
+        Raises:
+            PartialMarketDataError: If the circuit breaker is open and some days are cached
+            UpstreamError: If the upstream API fails (CircuitOpenError if no day is cached)
+        """
         logger.info(f"Getting market data from {start_date} to {end_date}")
         
+        first_day = start_date.date()
+        last_day = end_date.date()
+        # The SQLite cache is read and written in a thread, so it does not block the event loop
+        cached = await asyncio.to_thread(self.cache.get_days, first_day, last_day) if self.cache is not None else MarketData.empty()
+        cached_days = {date.fromordinal(ordinal) for ordinal in np.unique(cached.day).tolist()}
+        
+        # Fetch only the days that are not cached, merged into contiguous ranges
+        missing_days = [
+            day for day in (first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1))
+            if day not in cached_days
+        ]
+        # Days that another request is fetching right now are awaited instead of fetched again
+        shared = self._shared_fetches(missing_days)
+        shared_days = {day for days in shared.values() for day in days}
+        gaps = merge_day_ranges([day for day in missing_days if day not in shared_days])
+        if self.cache is not None:
+            logger.info(
+                f"Market data cache: {len(cached_days)} days cached, {len(missing_days)} days missing "
+                f"in {len(gaps)} ranges"
+            )
+        if shared:
+            logger.info(f"Joining {len(shared)} fetches in flight for {len(shared_days)} days")
+        
+        parts = [cached]
+        if gaps:
+            # While the upstream API is down, fail at once instead of waiting for timeouts
+            try:
+                self.breaker.reject_if_open()
+            except CircuitOpenError as e:
+                if not len(cached):
+                    raise
+                raise PartialMarketDataError(
+                    f"{str(e)}; {len(cached_days)} of {len(cached_days) + len(missing_days)} days are cached",
+                    cached,
+                    missing_days
+                ) from e
+        if gaps or shared:
+            parts.append(await self._fetch_days(gaps, shared))
+        
+        return MarketData.concat(parts).sort_by_day()
+    
+    async def stream_market_data(self, start_date: datetime, end_date: datetime) -> AsyncIterator[MarketData]:
+        """
+        Yields market data one day at a time, in day order, while it is read.
+        
+        Cached days are read from the cache one day at a time, missing days are
+        fetched from the upstream API window by window (with the retries, timeouts
+        and circuit breaker of the buffered path) and yielded as each day completes.
+        Peak memory is about one window of records.
+        """
+        logger.info(f"Streaming market data from {start_date} to {end_date}")
+        
+        first_day = start_date.date()
+        last_day = end_date.date()
+        cached = set(await asyncio.to_thread(self.cache.cached_days, first_day, last_day)) if self.cache is not None else set()
+        all_days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        
+        for is_cached, group in itertools.groupby(all_days, key=lambda day: day in cached):
+            days = list(group)
+            if is_cached:
+                for day in days:
+                    day_data = await asyncio.to_thread(self.cache.get_days, day, day)
+                    if len(day_data):
+                        yield day_data
+                continue
+            
+            for chunk_start, chunk_end in split_day_range(days[0], days[-1], settings.MARKET_FETCH_CHUNK_DAYS):
+                async for day_data in self._stream_window(chunk_start, chunk_end):
+                    yield day_data
+    
+    async def _stream_window(self, first_day: date, last_day: date) -> AsyncIterator[MarketData]:
+        """
+        Yields the days of one window as they complete.
+        
+        Days that another request is fetching are taken from its fetch; the other
+        days are fetched in tasks registered as in flight before the first await,
+        so concurrent requests join them instead of fetching them again.
+        """
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        shared = self._shared_fetches(days)
+        owners = {day: task for task, shared_days in shared.items() for day in shared_days}
+        if shared:
+            logger.info(f"Joining {len(shared)} fetches in flight for {len(owners)} days")
+        if len(owners) < len(days):
+            # While the upstream API is down, fail at once instead of waiting for timeouts
+            self.breaker.reject_if_open()
+        
+        runs = []
+        for owner, group in itertools.groupby(days, key=owners.get):
+            group = list(group)
+            if owner is not None:
+                runs.append((owner, group, None))
+                continue
+            queue: asyncio.Queue = asyncio.Queue()
+            task = self._start_fetch(group[0], group[-1], on_day=queue.put_nowait)
+            task.add_done_callback(lambda _, queue=queue: queue.put_nowait(None))
+            runs.append((task, group, queue))
+        
+        for task, group, queue in runs:
+            if queue is None:
+                # Shielded, so closing this stream does not cancel a fetch other requests wait for
+                data = await asyncio.shield(task)
+                for _, day_data in data.take(np.isin(data.day, [day.toordinal() for day in group])).iter_days():
+                    yield day_data
+                continue
+            while True:
+                day_data = await queue.get()
+                if day_data is None:
+                    break
+                yield day_data
+            # Raises the error of a failed fetch after its complete days
+            await asyncio.shield(task)
+    
+    async def _stream_days(self, first_day: date, last_day: date) -> AsyncIterator[MarketData]:
+        """Streams one window from the upstream API and yields it as complete days"""
+        pending = MarketData.empty()
+        
+        blocks = self._iter_range_blocks(
+            datetime.combine(first_day, datetime.min.time()),
+            datetime.combine(last_day, datetime.min.time())
+        )
+        async for block in blocks:
+            days = list(MarketData.concat([pending, self._select_days(block, first_day, last_day)]).iter_days())
+            if not days:
+                continue
+            # The last day of a block may continue in the next one
+            for _, day_data in days[:-1]:
+                yield day_data
+            pending = days[-1][1]
+        
+        if len(pending):
+            yield pending
+    
+    async def _fetch_days(
+        self,
+        ranges: List[Tuple[date, date]],
+        shared: Optional[Dict[asyncio.Task, List[date]]] = None
+    ) -> MarketData:
+        """
+        Fetches day ranges from the upstream API.
+        
+        Long ranges are split into windows of settings.MARKET_FETCH_CHUNK_DAYS days that are
+        fetched concurrently (at most settings.MARKET_FETCH_CONCURRENCY at a time), each
+        with its own retries. Every window is cached as soon as it arrives, so a failed
+        window does not discard the others. The days of every window are registered as
+        in flight before the first await, so concurrent requests join the window instead
+        of fetching it again.
+        
+        Args:
+            ranges: Day ranges to fetch
+            shared: Fetches in flight started by other requests, with the days to take from each
+        """
+        shared = shared or {}
+        chunks = [
+            chunk
+            for first_day, last_day in ranges
+            for chunk in split_day_range(first_day, last_day, settings.MARKET_FETCH_CHUNK_DAYS)
+        ]
+        semaphore = asyncio.Semaphore(settings.MARKET_FETCH_CONCURRENCY)
+        tasks = [self._start_fetch(first_day, last_day, semaphore) for first_day, last_day in chunks]
+        
+        if len(chunks) > 1:
+            logger.info(f"Fetching {len(chunks)} chunks with concurrency {settings.MARKET_FETCH_CONCURRENCY}")
+        # Shielded, so a cancelled request does not cancel a fetch other requests wait for
+        results = await asyncio.gather(*(asyncio.shield(task) for task in [*tasks, *shared]), return_exceptions=True)
+        
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            logger.error(f"{len(errors)} of {len(results)} chunks could not be fetched")
+            raise errors[0]
+        
+        joined = [
+            data.take(np.isin(data.day, [day.toordinal() for day in days]))
+            for data, days in zip(results[len(tasks):], shared.values())
+        ]
+        return MarketData.concat(results[:len(tasks)] + joined)
+    
+    def _start_fetch(
+        self,
+        first_day: date,
+        last_day: date,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        on_day: Optional[Callable[[MarketData], None]] = None
+    ) -> asyncio.Task:
+        """Starts fetching one window (see _fetch_window) and registers its days as in flight"""
+        task = asyncio.ensure_future(self._fetch_window(first_day, last_day, semaphore, on_day))
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        for day in days:
+            self._inflight[day] = task
+        task.add_done_callback(lambda done: self._on_fetch_done(done, days))
+        self.fetch_stats["upstream_fetches"] += 1
+        return task
+    
+    async def _fetch_window(
+        self,
+        first_day: date,
+        last_day: date,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        on_day: Optional[Callable[[MarketData], None]] = None
+    ) -> MarketData:
+        """
+        Fetches one window with retries and caches it.
+        
+        Args:
+            semaphore: Limits the number of windows fetched at the same time
+            on_day: Called with every complete day as soon as it is received
+        """
+        received: List[MarketData] = []
+        
+        def receive(day_data: MarketData) -> None:
+            received.append(day_data)
+            if on_day is not None:
+                on_day(day_data)
+        
+        try:
+            async with semaphore or contextlib.nullcontext():
+                await self._fetch_with_retries(first_day, last_day, receive)
+        finally:
+            # Complete days are cached even if the rest of the window failed
+            chunk_data = MarketData.concat(received)
+            if self.cache is not None and len(chunk_data):
+                await asyncio.to_thread(self.cache.put_days, chunk_data)
+        logger.info(f"Received {len(chunk_data)} records of {first_day} - {last_day} from the API")
+        return chunk_data
+    
+    def _on_fetch_done(self, task: asyncio.Task, days: List[date]) -> None:
+        for day in days:
+            if self._inflight.get(day) is task:
+                del self._inflight[day]
+        # Retrieve the exception so that fetches whose requests were cancelled are not reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Fetching {days[0]} - {days[-1]} failed: {task.exception()}")
+    
+    def _shared_fetches(self, days: List[date]) -> Dict[asyncio.Task, List[date]]:
+        """Groups the days that are being fetched by other requests by their fetch"""
+        loop = asyncio.get_running_loop()
+        shared: Dict[asyncio.Task, List[date]] = {}
+        for day in days:
+            task = self._inflight.get(day)
+            if task is not None and not task.done() and task.get_loop() is loop:
+                shared.setdefault(task, []).append(day)
+        
+        self.fetch_stats["coalesced_fetches"] += len(shared)
+        self.fetch_stats["coalesced_days"] += sum(len(shared_days) for shared_days in shared.values())
+        return shared
+    
+    async def _fetch_with_retries(
+        self,
+        first_day: date,
+        last_day: date,
+        on_day: Callable[[MarketData], None]
+    ) -> None:
+        """
+        Fetches one window through the circuit breaker, passing every complete day
+        to on_day as soon as it is received.
+        
+        Every attempt is limited to settings.UPSTREAM_ATTEMPT_TIMEOUT seconds. Failures
+        that another attempt can fix (timeouts, connection errors, server errors) are
+        retried with exponential backoff and jitter, other failures are raised at once.
+        A retry requests only the days after the last complete day.
+        """
+        next_day = first_day
+        
+        async def fetch_remaining() -> None:
+            nonlocal next_day
+            async for day_data in self._stream_days(next_day, last_day):
+                on_day(day_data)
+                next_day = date.fromordinal(int(day_data.day[0]) + 1)
+        
+        attempts = settings.MARKET_FETCH_RETRIES + 1
+        for attempt in range(1, attempts + 1):
+            self.breaker.check()
+            try:
+                await asyncio.wait_for(fetch_remaining(), settings.UPSTREAM_ATTEMPT_TIMEOUT)
+            except asyncio.TimeoutError:
+                error = UpstreamTimeoutError(
+                    f"Fetching {next_day} - {last_day} timed out after {settings.UPSTREAM_ATTEMPT_TIMEOUT:.0f}s"
+                )
+            except UpstreamError as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return
+            
+            self.breaker.record_failure(error)
+            if attempt == attempts or not error.retryable:
+                raise error
+            # Equal jitter: half of the backoff is fixed, the other half random
+            backoff = settings.MARKET_FETCH_RETRY_DELAY * 2 ** (attempt - 1)
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+            logger.warning(
+                f"Fetching {next_day} - {last_day} failed (attempt {attempt} of {attempts}), "
+                f"retrying in {delay:.1f}s: {str(error)}"
+            )
+            await asyncio.sleep(delay)
+    
+    def _select_days(self, data: MarketData, first_day: date, last_day: date) -> MarketData:
+        """Keeps only the records of the requested days"""
+        selected = data.select_days(first_day, last_day)
+        if len(selected) != len(data):
+            logger.warning(f"Skipping {len(data) - len(selected)} market data records outside of the requested days")
+        return selected
+    
+    async def _iter_range_blocks(self, start_date: datetime, end_date: datetime) -> AsyncIterator[MarketData]:
+        """
+        Requests the days from start_date to end_date (inclusive) and yields the parsed
+        records block by block while the response body is still being received.
+        """
         try:
             token = await self._get_token()
             
@@ -85,68 +575,71 @@ class MarketDataService:
             
             logger.debug(f"Using headers: {headers}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    status_code = response.status
-                    logger.debug(f"API response status code: {status_code}")
-                    
-                    if status_code != 200:
-                        error_text = await response.text()
-                        logger.error(f"API Error: {status_code}, {error_text}")
-                        raise Exception(f"API returned an error: {status_code}, text: {error_text}")
-                    
-                    csv_content = await response.text()
-                    content_length = len(csv_content)
-                    logger.debug(f"Received API response: length {content_length} bytes, first 200 characters: {csv_content[:200]}")
-                    
-                    if content_length < 10:  # Слишком маленький ответ, вероятно пустой
-                        logger.warning(f"API returned very small response (length: {content_length}): {csv_content}")
-                        raise Exception("API returned empty or too small response")
-                    
-                    return self._parse_csv_response(csv_content)
+            session = await self._get_session()
+            async with session.get(url, headers=headers) as response:
+                status_code = response.status
+                logger.debug(f"API response status code: {status_code}")
+                
+                if status_code != 200:
+                    error_text = await response.text()
+                    logger.error(f"API Error: {status_code}, {error_text}")
+                    raise UpstreamStatusError(f"API returned an error: {status_code}, text: {error_text}", status_code)
+                
+                async for block in self._iter_response_blocks(response):
+                    yield block
+        except UpstreamError as e:
+            logger.error(f"Error when receiving market data: {str(e)}")
+            raise
+        except asyncio.TimeoutError as e:
+            logger.error("Error when receiving market data: timeout")
+            raise UpstreamTimeoutError("Error when receiving market data: timeout") from e
+        except aiohttp.ClientError as e:
+            logger.error(f"Error when receiving market data: {str(e)}")
+            raise UpstreamConnectionError(f"Error when receiving market data: {str(e)}") from e
         except Exception as e:
             logger.error(f"Error when receiving market data: {str(e)}")
-            raise Exception(f"Error when receiving market data: {str(e)}")
+            raise UpstreamResponseError(f"Error when receiving market data: {str(e)}") from e
     
-    def _parse_csv_response(self, csv_content: str) -> List[Dict[str, Any]]:
-        result = []
+    async def _iter_response_blocks(self, response: aiohttp.ClientResponse) -> AsyncIterator[MarketData]:
+        """
+        Parses the CSV response body in blocks of settings.CSV_INGEST_CHUNK_BYTES,
+        without buffering the whole body
+        """
+        encoding = response.charset or "utf-8"
+        
+        header_line = (await response.content.readline()).decode(encoding).lstrip("\ufeff").strip()
+        if len(header_line) < 10:  # Слишком маленький ответ, вероятно пустой
+            logger.warning(f"API returned very small response (length: {len(header_line)}): {header_line}")
+            raise UpstreamResponseError("API returned empty or too small response")
+        
+        logger.debug(f"CSV headers: {header_line}")
+        columns = header_columns(header_line)
         
+        decoder = codecs.getincrementaldecoder(encoding)()
+        pending = ""
+        async for chunk in response.content.iter_chunked(settings.CSV_INGEST_CHUNK_BYTES):
+            text = pending + decoder.decode(chunk)
+            # Only complete lines are parsed, the rest waits for the next chunk
+            cut = text.rfind("\n") + 1
+            pending = text[cut:]
+            if cut:
+                block = parse_price_rows(text[:cut], columns)
+                if len(block):
+                    yield block
+        
+        text = pending + decoder.decode(b"", final=True)
+        if text.strip():
+            block = parse_price_rows(text, columns)
+            if len(block):
+                yield block
+    
+    def _parse_csv_response(self, csv_content: str) -> MarketData:
         try:
-            csv_file = StringIO(csv_content)
-            
-            reader = csv.reader(csv_file, delimiter=';')
-            
-            headers = next(reader, None)
-            if not headers:
+            if not csv_content.partition("\n")[0].strip():
                 logger.warning("CSV does not contain a header")
-                return result
+                return MarketData.empty()
             
-            logger.debug(f"CSV headers: {headers}")
-            
-            for row in reader:
-                if len(row) < 6: 
-                    logger.warning(f"Not enough data in the CSV line: {row}")
-                    continue
-                
-                try:
-                    date_str = row[0].strip()  
-                    
-                    hour_str = row[1].strip()  
-                    hour = int(hour_str.split(':')[0])
-
-                    price_str = row[5].strip().replace(',', '.')  
-                    price_ct_kwh = float(price_str)
-                    price_eur = price_ct_kwh / 100.0
-                    
-                    result.append({
-                        "date": date_str,
-                        "hour": hour,
-                        "price_ct_kwh": price_ct_kwh,
-                        "price_eur": price_eur
-                    })
-                except Exception as e:
-                    logger.warning(f"Error when parsing a CSV line: {e}, line: {row}")
-                    continue
+            result = parse_price_csv(csv_content)
             
             logger.info(f"Successfully parsed {len(result)} records from the API response")
             return result
@@ -154,89 +647,132 @@ class MarketDataService:
             logger.error(f"Error when parsing a CSV response: {str(e)}")
             raise Exception(f"Error while parsing API response: {str(e)}")
     
-    async def generate_test_data(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+    async def generate_test_data(self, start_date: datetime, end_date: datetime) -> MarketData:
         logger.info("Generation of test data on market prices")
         
         days = (end_date - start_date).days + 1
         if days <= 0:
             days = 1
         
-        current_date = start_date
-        result = []
+        hours = np.arange(24)
+        base_prices = np.random.uniform(5.0, 15.0, size=(days, 1))
+        hour_factor = 1.0 + 0.5 * np.where(
+            hours < 12,
+            0.5 * (hours - 3) / 9.0,
+            0.5 - 0.5 * (hours - 12) / 12.0
+        )
+        noise = np.random.uniform(-0.5, 0.5, size=(days, 24))
+        prices = np.maximum(1.0, base_prices * hour_factor + noise)
         
-        for _ in range(days):
-            base_price = random.uniform(5.0, 15.0)  
-            
-            date_str = current_date.strftime("%d.%m.%Y")
-           
-            for hour in range(24):
-                hour_factor = 1.0 + 0.5 * (
-                    (0.5 * (hour - 3) / 9.0) if hour < 12 else 
-                    (0.5 - 0.5 * (hour - 12) / 12.0)
-                )
-                
-                noise = random.uniform(-0.5, 0.5)
-                
-                price_ct_kwh = max(1.0, base_price * hour_factor + noise)
-                
-                result.append({
-                    "date": date_str,
-                    "hour": hour,
-                    "price_ct_kwh": price_ct_kwh,
-                    "price_eur": price_ct_kwh / 100.0
-                })
-            
-            current_date += timedelta(days=1)
+        first_day = start_date.date().toordinal()
+        result = MarketData(
+            np.repeat(np.arange(first_day, first_day + days), 24),
+            np.tile(hours, days),
+            prices.ravel()
+        )
         
         logger.info(f"Generated {len(result)} test records of market data")
         return result
 
-    def parse_csv_data(self, csv_content: str) -> List[Dict[str, Any]]:
+    async def complete_with_test_data(self, data: MarketData, missing_days: List[date]) -> MarketData:
+        """Adds generated test data for the missing days (see PartialMarketDataError) to data"""
+        parts = [data]
+        for first_day, last_day in merge_day_ranges(sorted(missing_days)):
+            parts.append(await self.generate_test_data(
+                datetime.combine(first_day, datetime.min.time()),
+                datetime.combine(last_day, datetime.min.time())
+            ))
+        return MarketData.concat(parts).sort_by_day()
+
+    async def stream_test_data(self, start_date: datetime, end_date: datetime) -> AsyncIterator[MarketData]:
+        """Yields test data one day at a time, generated window by window"""
+        first_day = start_date.date()
+        last_day = max(end_date.date(), first_day)
+        for chunk_start, chunk_end in split_day_range(first_day, last_day, settings.MARKET_FETCH_CHUNK_DAYS):
+            window = await self.generate_test_data(
+                datetime.combine(chunk_start, datetime.min.time()),
+                datetime.combine(chunk_end, datetime.min.time())
+            )
+            for _, day_data in window.iter_days():
+                yield day_data
+
+    def parse_csv_data(self, csv_content: str) -> MarketData:
         logger.info("Parsing CSV data for analysis")
         
-        result = []
-        
-        csv_file = io.StringIO(csv_content)
-        
         try:
-            reader = csv.reader(csv_file, delimiter=';')
-            
-            headers = next(reader, None)
-            
-            for row in reader:
-                if len(row) < 6:  
-                    logger.warning(f"Not enough data in the CSV line: {row}")
-                    continue
-                
-                try:
-                    date_str = row[0].strip()
-                    
-                    if "-" in date_str and len(date_str) == 10:
-                        try:
-                            dt = datetime.fromisoformat(date_str)
-                            date_str = dt.strftime("%d.%m.%Y")
-                        except ValueError:
-                            logger.warning(f"Unable to convert the date: {date_str}")
-                    
-                    hour_str = row[1].strip().split(':')[0]  
-                    hour = int(hour_str)
-                    
-                    price_str = row[5].strip().replace(',', '.')
-                    price_ct_kwh = float(price_str)
-                    price_eur = price_ct_kwh / 100.0
-                    
-                    result.append({
-                        "date": date_str,
-                        "hour": hour,
-                        "price_ct_kwh": price_ct_kwh,
-                        "price_eur": price_eur
-                    })
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Error when parsing a CSV line: {e}, line: {row}")
-                    continue
+            result = parse_price_csv(csv_content)
             
             logger.info(f"Successfully parsed {len(result)} records from CSV")
             return result
         except Exception as e:
             logger.error(f"Error when parsing a CSV: {str(e)}")
             raise
+    
+    async def iter_csv_upload(
+        self,
+        upload: Any,
+        chunk_size: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        executor: Optional[Callable[..., Awaitable[Any]]] = None
+    ) -> AsyncIterator[MarketData]:
+        """
+        Parses an uploaded CSV file incrementally, one read chunk at a time.
+        
+        Args:
+            upload: Object with an async read(size) method (e.g. fastapi.UploadFile)
+            chunk_size: Bytes per read, defaults to settings.UPLOAD_CHUNK_BYTES
+            max_bytes: Maximum file size, defaults to settings.MAX_UPLOAD_BYTES
+            max_rows: Maximum number of data rows, defaults to settings.MAX_UPLOAD_ROWS
+            executor: Coroutine function that parses a chunk (e.g. WorkerPool.run),
+                by default it runs in the event loop
+            
+        Yields:
+            Market data of every chunk in file order (a day may span two chunks)
+            
+        Raises:
+            UploadTooLargeError: If the file exceeds max_bytes or max_rows
+        """
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_BYTES
+        max_bytes = max_bytes or settings.MAX_UPLOAD_BYTES
+        max_rows = max_rows or settings.MAX_UPLOAD_ROWS
+        
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        pending = ""
+        columns: Optional[CsvColumns] = None
+        total_bytes = 0
+        total_rows = 0
+        
+        while True:
+            chunk = await upload.read(chunk_size)
+            total_bytes += len(chunk)
+            if total_bytes > max_bytes:
+                raise UploadTooLargeError(f"The uploaded file exceeds the limit of {max_bytes} bytes")
+            
+            final = not chunk
+            lines = (pending + decoder.decode(chunk, final=final)).split("\n")
+            # The last line may continue in the next chunk
+            pending = "" if final else lines.pop()
+            
+            if columns is None and lines:
+                columns = header_columns(lines[0])
+                lines = lines[1:]
+            
+            total_rows += sum(1 for line in lines if line.strip())
+            if total_rows > max_rows:
+                raise UploadTooLargeError(f"The uploaded file exceeds the limit of {max_rows} rows")
+            
+            text = "\n".join(lines)
+            if executor is None:
+                block = parse_price_rows(text, columns or DEFAULT_COLUMNS)
+            else:
+                block = await executor(parse_price_rows, text, columns or DEFAULT_COLUMNS)
+            if len(block):
+                yield block
+            if final:
+                break
+        
+        logger.info(f"Parsed {total_rows} CSV rows ({total_bytes} bytes) from the upload")
+
+# Shared service instance: one pooled HTTP session and one token cache for the whole application
+market_service = MarketDataService()
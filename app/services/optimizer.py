@@ -1,12 +1,18 @@
 from datetime import datetime, time
-from typing import List, Dict, Any, Optional
-import pandas as pd
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
 from collections import defaultdict
 
+from app.core.config import settings
 from app.core.logging_config import logger
 from app.schemas.market_data import MarketDataItem
+from app.schemas.market_frame import MarketData
 from app.schemas.optimization import OptimizationCycle
+from app.services.cycle_engine import build_daily_matrix, batch_max_spread_cycles, batch_k_cycles
+from app.services.cycle_index import CycleIndex
 from app.utils.csv_handler import format_to_csv
+from app.utils.dates import format_date_label, format_day_ordinal
+from app.utils.time_slots import format_slot
 
 class OptimizerService:
     """Service for optimizing battery charge/discharge cycles"""
@@ -15,121 +21,359 @@ class OptimizerService:
         """
         Finds the optimal charge/discharge cycle for a given day.
         
-        Port of the computeDailyMinMaxCycle function from the original JavaScript code.
+        Single-pass max-spread solver: while walking through the day it keeps the
+        running minimum of the earlier prices, so it always finds the most profitable
+        pair where charging happens before discharging, even when the day's global
+        minimum comes after its global maximum.
         
         Args:
-            prices: List of prices for one day, each element contains hour and price
+            prices: List of prices for one day, each element contains slot (start minute of the day) and price
             threshold: Minimum profitability threshold in EUR
             
         Returns:
-            Dictionary with the optimal cycle or None if there is no profitable cycle
+            Dictionary with the optimal cycle (charge_start/discharge_start as slot starts)
+            or None if there is no profitable cycle
         """
-        if not prices:
+        if len(prices) < 2:
             return None
         
-        # Sort by hour
-        prices_sorted = sorted(prices, key=lambda x: x["hour"])
+        # Sort by slot
+        prices_sorted = sorted(prices, key=lambda x: x["slot"])
         
-        # Set initial values for minimum and maximum price
+        # Cheapest entry seen so far and the best charge/discharge pair
         min_entry = prices_sorted[0]
-        max_entry = prices_sorted[0]
+        best_pair = None
+        best_spread = 0.0
         
-        # Find minimum and maximum prices during the day
         for price in prices_sorted[1:]:
+            spread = price["price"] - min_entry["price"]
+            if best_pair is None or spread > best_spread:
+                best_pair = (min_entry, price)
+                best_spread = spread
             if price["price"] < min_entry["price"]:
                 min_entry = price
-            if price["price"] > max_entry["price"]:
-                max_entry = price
         
-        # Check that the minimum price (charging) is earlier than the maximum price (discharging)
-        if min_entry["hour"] < max_entry["hour"]:
-            # Calculate profit for 100 kWh
-            profit = (max_entry["price"] - min_entry["price"]) * 100
+        charge_entry, discharge_entry = best_pair
+        
+        # Calculate profit for one full battery charge
+        profit = (discharge_entry["price"] - charge_entry["price"]) * settings.BATTERY_CAPACITY_KWH
+        
+        # Check if profit exceeds the threshold
+        if profit > threshold:
+            return {
+                "charge_start": charge_entry["slot"],
+                "discharge_start": discharge_entry["slot"],
+                "charge_price": charge_entry["price"],
+                "discharge_price": discharge_entry["price"],
+                "profit": profit
+            }
+        
+        # If there is no suitable cycle, return None
+        return None
+    
+    def compute_daily_cycles(self, prices: List[Dict[str, Any]], max_cycles: int = 1, threshold: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Finds up to max_cycles non-overlapping charge/discharge cycles for a given day.
+        
+        Uses the O(k*n) k-transaction dynamic program: free[t] is the best result with
+        t finished cycles, hold[t] the best result while charged within cycle t. Each
+        slot is used for at most one action. For a single cycle the max-spread solver
+        compute_daily_min_max_cycle is used.
+        
+        Args:
+            prices: List of prices for one day, each element contains slot (start minute of the day) and price
+            max_cycles: Maximum number of cycles per day
+            threshold: Minimum profitability threshold in EUR for each cycle
+            
+        Returns:
+            List of cycles in chronological order
+        """
+        if max_cycles <= 1:
+            cycle = self.compute_daily_min_max_cycle(prices, threshold)
+            return [cycle] if cycle else []
+        
+        if len(prices) < 2:
+            return []
+        
+        # Sort by slot
+        prices_sorted = sorted(prices, key=lambda x: x["slot"])
+        
+        k = max_cycles
+        free = [0.0] * (k + 1)
+        hold = [float("-inf")] * (k + 1)
+        bought = []
+        sold = []
+        
+        for entry in prices_sorted:
+            price = entry["price"]
+            prev_free = list(free)
+            prev_hold = list(hold)
+            buy_flags = [False] * (k + 1)
+            sell_flags = [False] * (k + 1)
+            
+            for t in range(1, k + 1):
+                buy_value = prev_free[t - 1] - price
+                if buy_value > prev_hold[t]:
+                    hold[t] = buy_value
+                    buy_flags[t] = True
+                
+                sell_value = prev_hold[t] + price
+                if sell_value > prev_free[t]:
+                    free[t] = sell_value
+                    sell_flags[t] = True
+            
+            bought.append(buy_flags)
+            sold.append(sell_flags)
+        
+        # Walk back from "k cycles, not charged" at the last slot
+        t = k
+        holding = False
+        pairs = {}
+        for j in range(len(prices_sorted) - 1, -1, -1):
+            if t == 0:
+                break
+            if holding:
+                if bought[j][t]:
+                    pairs[t] = (j, pairs[t])
+                    holding = False
+                    t -= 1
+            elif sold[j][t]:
+                pairs[t] = j
+                holding = True
+        
+        result = []
+        for t in sorted(pairs):
+            charge_entry = prices_sorted[pairs[t][0]]
+            discharge_entry = prices_sorted[pairs[t][1]]
+            
+            # Calculate profit for one full battery charge
+            profit = (discharge_entry["price"] - charge_entry["price"]) * settings.BATTERY_CAPACITY_KWH
             
-            # Check if profit exceeds the threshold
             if profit > threshold:
-                return {
-                    "charge_start": min_entry["hour"],
-                    "discharge_start": max_entry["hour"],
-                    "charge_price": min_entry["price"],
-                    "discharge_price": max_entry["price"],
+                result.append({
+                    "charge_start": charge_entry["slot"],
+                    "discharge_start": discharge_entry["slot"],
+                    "charge_price": charge_entry["price"],
+                    "discharge_price": discharge_entry["price"],
                     "profit": profit
-                }
+                })
         
-        # If there is no suitable cycle, return None
-        return None
+        return result
     
-    def process_data(self, data: List[Dict[str, Any]], threshold: float = 0.0) -> List[Dict[str, Any]]:
+    def process_data(
+        self,
+        data: Union[MarketData, List[Dict[str, Any]]],
+        threshold: float = 0.0,
+        engine: Optional[str] = None,
+        max_cycles_per_day: int = 1
+    ) -> List[Dict[str, Any]]:
         """
         Processes market data and finds optimal charge/discharge cycles.
         
         Args:
-            data: List of dictionaries with market data
+            data: Market data (MarketData or a list of dictionaries with market data)
             threshold: Minimum profitability threshold in EUR
+            engine: Computation engine, "numpy" (batch) or "python" (per-day loop).
+                Defaults to settings.OPTIMIZER_ENGINE
+            max_cycles_per_day: Maximum number of non-overlapping cycles per day
             
         Returns:
             List of optimal charge/discharge cycles
         """
-        logger.info(f"Processing {len(data)} data records with threshold {threshold} EUR")
+        if not isinstance(data, MarketData):
+            data = MarketData.from_records(data)
         
-        # Group data by dates
-        days = defaultdict(list)
-        for item in data:
-            # Use the dictionary key "date" instead of object attribute
-            date_str = item["date"]
-            if isinstance(date_str, datetime):
-                # If datetime, convert to ISO string
-                date_str = date_str.strftime("%Y-%m-%d")
-                
-            days[date_str].append({
-                "hour": item["hour"],
-                "price": item["price_eur"]
-            })
+        engine = engine or settings.OPTIMIZER_ENGINE
+        logger.info(
+            f"Processing {len(data)} data records with threshold {threshold} EUR "
+            f"(engine: {engine}, max cycles per day: {max_cycles_per_day})"
+        )
         
-        # Find the optimal cycle for each day
+        # Number the cycles and convert them to output records
         result = []
         cycle_count = 1
+        slot_minutes = data.day_slot_minutes()
         
-        for date_str, prices in days.items():
-            # Sort prices by hour
-            prices.sort(key=lambda x: x["hour"])
+        for day, cycles in self._compute_cycles(data, threshold, engine, max_cycles_per_day):
+            for cycle in cycles:
+                result.append(self._build_cycle_record(cycle_count, day, cycle, slot_minutes[day]))
+                cycle_count += 1
+        
+        logger.info(f"Found {len(result)} optimal cycles")
+        return result
+    
+    def build_cycle_index(
+        self,
+        data: Union[MarketData, List[Dict[str, Any]]],
+        engine: Optional[str] = None,
+        max_cycles_per_day: int = 1
+    ) -> CycleIndex:
+        """
+        Finds the cycles of every day once, without a threshold, and indexes them by profit.
+        
+        index.cycles(threshold) returns the same cycles as process_data with that
+        threshold, index.summarize(thresholds) the counts and totals of a threshold sweep.
+        
+        Args:
+            data: Market data (MarketData or a list of dictionaries with market data)
+            engine: Computation engine, defaults to settings.OPTIMIZER_ENGINE
+            max_cycles_per_day: Maximum number of non-overlapping cycles per day
             
-            # Find the optimal cycle for the day
-            cycle = self.compute_daily_min_max_cycle(prices, threshold)
+        Returns:
+            CycleIndex of all cycles of the period
+        """
+        return CycleIndex(self.process_data(data, float("-inf"), engine, max_cycles_per_day))
+    
+    def cycles_by_day(
+        self,
+        data: MarketData,
+        threshold: float = 0.0,
+        engine: Optional[str] = None,
+        max_cycles_per_day: int = 1
+    ) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Finds the optimal cycles of every day of data, keeping them grouped by day.
+        
+        Args:
+            data: Market data
+            threshold: Minimum profitability threshold in EUR
+            engine: Computation engine, defaults to settings.OPTIMIZER_ENGINE
+            max_cycles_per_day: Maximum number of non-overlapping cycles per day
             
-            if cycle:
-                # Format the date
-                formatted_date = date_str
-                # Convert date to the correct DD.MM.YYYY format if needed
-                if "-" in date_str and len(date_str) == 10:  # YYYY-MM-DD
-                    try:
-                        dt = datetime.fromisoformat(date_str)
-                        formatted_date = dt.strftime("%d.%m.%Y")
-                    except ValueError:
-                        logger.warning(f"Could not convert date: {date_str}")
-                
-                # Рассчитываем прибыль с учетом потерь (эффективность 85%)
-                efficiency = 0.85
-                profit_after_losses = cycle["profit"] * efficiency
-                
-                result.append({
-                    "cycle": cycle_count,
-                    "date": formatted_date,
-                    "charge_start": f"{cycle['charge_start']}:00",
-                    "charge_end": f"{cycle['charge_start'] + 1}:00",
-                    "discharge_start": f"{cycle['discharge_start']}:00",
-                    "discharge_end": f"{cycle['discharge_start'] + 1}:00",
-                    "charge_price": cycle["charge_price"],
-                    "discharge_price": cycle["discharge_price"],
-                    "profit": cycle["profit"],
-                    "profit_after_losses": profit_after_losses
-                })
-                
+        Returns:
+            List of (day ordinal, cycle records of the day numbered from 1)
+        """
+        engine = engine or settings.OPTIMIZER_ENGINE
+        slot_minutes = data.day_slot_minutes()
+        return [
+            (day, [
+                self._build_cycle_record(number, day, cycle, slot_minutes[day])
+                for number, cycle in enumerate(cycles, start=1)
+            ])
+            for day, cycles in self._compute_cycles(data, threshold, engine, max_cycles_per_day)
+        ]
+    
+    async def process_stream(
+        self,
+        chunks: AsyncIterator[MarketData],
+        threshold: float = 0.0,
+        max_cycles_per_day: int = 1,
+        engine: Optional[str] = None,
+        executor: Optional[Callable[..., Awaitable[Any]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Finds optimal cycles while market data is still arriving.
+        
+        Chunks must come grouped by day (as MarketDataService.stream_market_data
+        yields them); a day may be split over consecutive chunks. All days of a
+        chunk that are complete are optimized together as soon as the chunk
+        arrives; only the last day is held back until the next chunk shows
+        whether it continues.
+        
+        Args:
+            chunks: Async iterator of market data chunks
+            threshold: Minimum profitability threshold in EUR
+            max_cycles_per_day: Maximum number of non-overlapping cycles per day
+            engine: Computation engine, defaults to settings.OPTIMIZER_ENGINE
+            executor: Coroutine function that runs the optimization of a chunk
+                (e.g. WorkerPool.run), by default it runs in the event loop
+            
+        Yields:
+            Optimal charge/discharge cycles
+        """
+        engine = engine or settings.OPTIMIZER_ENGINE
+        cycle_count = 1
+        pending = MarketData.empty()
+        
+        async def compute_cycles(data: MarketData) -> List[Tuple[int, List[Dict[str, Any]]]]:
+            if executor is None:
+                return self._compute_cycles(data, threshold, engine, max_cycles_per_day)
+            return await executor(self._compute_cycles, data, threshold, engine, max_cycles_per_day)
+        
+        async for chunk in chunks:
+            if not len(chunk):
+                continue
+            data = MarketData.concat([pending, chunk])
+            
+            # Records of the last day at the end of the chunk may continue in the next one
+            other_days = np.flatnonzero(data.day != data.day[-1])
+            boundary = int(other_days[-1]) + 1 if len(other_days) else 0
+            complete, pending = data.take(slice(0, boundary)), data.take(slice(boundary, None))
+            
+            slot_minutes = complete.day_slot_minutes()
+            for day, cycles in await compute_cycles(complete):
+                for cycle in cycles:
+                    yield self._build_cycle_record(cycle_count, day, cycle, slot_minutes[day])
+                    cycle_count += 1
+        
+        slot_minutes = pending.day_slot_minutes()
+        for day, cycles in await compute_cycles(pending):
+            for cycle in cycles:
+                yield self._build_cycle_record(cycle_count, day, cycle, slot_minutes[day])
                 cycle_count += 1
+    
+    def _compute_cycles(self, data: MarketData, threshold: float, engine: str, max_cycles: int) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """Finds the optimal cycles of every day with the selected engine"""
+        if engine == "numpy":
+            return self._compute_cycles_numpy(data, threshold, max_cycles)
+        if engine == "python":
+            return self._compute_cycles_python(data, threshold, max_cycles)
+        raise ValueError(f"Unknown optimizer engine: {engine}")
+    
+    def _compute_cycles_python(self, data: MarketData, threshold: float, max_cycles: int) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """Finds the optimal cycles of every day with a per-day Python loop"""
+        # Group data by dates
+        days = defaultdict(list)
+        for day, slot, price in zip(data.day.tolist(), data.slot.tolist(), data.price_eur.tolist()):
+            days[day].append({
+                "slot": slot,
+                "price": price
+            })
+        
+        result = []
+        for day, prices in days.items():
+            # Sort prices by slot
+            prices.sort(key=lambda x: x["slot"])
+            
+            # Find the optimal cycles for the day
+            result.append((day, self.compute_daily_cycles(prices, max_cycles, threshold)))
         
-        logger.info(f"Found {len(result)} optimal cycles")
         return result
     
+    def _compute_cycles_numpy(self, data: MarketData, threshold: float, max_cycles: int) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """Finds the optimal cycles of every day in a single vectorized pass"""
+        if not len(data):
+            return []
+        
+        matrix = build_daily_matrix(data.day, data.slot, data.price_eur)
+        if max_cycles <= 1:
+            cycles = [[cycle] if cycle else [] for cycle in batch_max_spread_cycles(matrix, threshold, settings.BATTERY_CAPACITY_KWH)]
+        else:
+            cycles = batch_k_cycles(matrix, max_cycles, threshold, settings.BATTERY_CAPACITY_KWH)
+        
+        return list(zip(matrix.day_keys, cycles))
+    
+    def _build_cycle_record(self, cycle_count: int, day: int, cycle: Dict[str, Any], slot_minutes: int) -> Dict[str, Any]:
+        """
+        Converts the cycle of one day (given as a date ordinal) to an output record;
+        each action lasts one slot of slot_minutes
+        """
+        # Рассчитываем прибыль с учетом потерь (КПД цикла заряд/разряд)
+        profit_after_losses = cycle["profit"] * settings.ROUND_TRIP_EFFICIENCY
+        
+        return {
+            "cycle": cycle_count,
+            "date": format_day_ordinal(day),
+            "charge_start": format_slot(cycle["charge_start"]),
+            "charge_end": format_slot(cycle["charge_start"] + slot_minutes),
+            "discharge_start": format_slot(cycle["discharge_start"]),
+            "discharge_end": format_slot(cycle["discharge_start"] + slot_minutes),
+            "charge_price": cycle["charge_price"],
+            "discharge_price": cycle["discharge_price"],
+            "profit": cycle["profit"],
+            "profit_after_losses": profit_after_losses
+        }
+    
     def to_csv(self, cycles: List[Dict[str, Any]]) -> str:
         """Converts optimization results to CSV format"""
         return format_to_csv(cycles)
@@ -142,20 +386,9 @@ class OptimizerService:
             # Copy data for modification
             cycle_dict = dict(cycle_data)
             
-            # Check date format and format to DD.MM.YYYY
-            date_value = cycle_dict.get("date")
-            if isinstance(date_value, datetime):
-                # If it's a datetime object, convert it to a string in DD.MM.YYYY format
-                cycle_dict["date"] = date_value.strftime("%d.%m.%Y")
-            elif isinstance(date_value, str):
-                # If it's a string, check its format
-                if "-" in date_value and len(date_value) == 10:  # YYYY-MM-DD format
-                    try:
-                        # Convert YYYY-MM-DD to DD.MM.YYYY
-                        dt = datetime.fromisoformat(date_value)
-                        cycle_dict["date"] = dt.strftime("%d.%m.%Y")
-                    except Exception as e:
-                        logger.warning(f"Error converting date {date_value}: {str(e)}")
+            # Dates are always returned in DD.MM.YYYY format
+            if "date" in cycle_dict:
+                cycle_dict["date"] = format_date_label(cycle_dict["date"])
             
             # Create a Pydantic model instance
             try:
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.logging_config import logger
+
+
+class PrefetchScheduler:
+    """
+    Runs a prefetch job once a day at a fixed local time.
+
+    The job (e.g. loading the prices of the latest day-ahead auction and warming
+    the caches) is retried with exponential backoff until it succeeds or the
+    retries are used up; the next run is scheduled for the same time on the
+    following day. If the scheduler starts after today's run time, the job runs
+    right away (unless is_current reports that its result is already there), so a
+    restarted service does not wait until the next day.
+    """
+
+    def __init__(
+        self,
+        job: Callable[[], Awaitable[Any]],
+        run_at_minute: int,
+        retries: int = 5,
+        retry_delay: float = 60.0,
+        is_current: Optional[Callable[[], Awaitable[bool]]] = None
+    ):
+        """
+        Args:
+            job: Coroutine function to run, it raises an exception on failure
+            run_at_minute: Run time as minute of the day (local time)
+            retries: Number of retries after a failed attempt
+            retry_delay: Delay before the first retry in seconds, doubled after every attempt
+            is_current: Coroutine function that returns True if the result of today's
+                run is present already (e.g. cached), then the catch-up run is skipped
+        """
+        self.job = job
+        self.run_at_minute = run_at_minute
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.is_current = is_current
+        self.runs = 0
+        self.failures = 0
+        self.last_success: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Starts the scheduler loop (called from the application lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Prefetch scheduled daily at {self.run_at_minute // 60:02d}:{self.run_at_minute % 60:02d}")
+
+    async def stop(self) -> None:
+        """Cancels the scheduler loop and a running job"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+    def next_run(self, now: datetime, catch_up: bool = False) -> datetime:
+        """
+        Returns the next run time after now; with catch_up a run time that passed
+        earlier today is returned as now.
+        """
+        run_time = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=self.run_at_minute)
+        if run_time <= now:
+            return now if catch_up else run_time + timedelta(days=1)
+        return run_time
+
+    async def _loop(self) -> None:
+        catch_up = await self._needs_catch_up()
+        while True:
+            now = datetime.now()
+            delay = (self.next_run(now, catch_up) - now).total_seconds()
+            catch_up = False
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.run()
+    
+    async def _needs_catch_up(self) -> bool:
+        """False if the result of a missed run is present already, so a restart does not repeat it"""
+        if self.is_current is None:
+            return True
+        try:
+            current = await self.is_current()
+        except Exception as e:
+            logger.warning(f"Could not check whether the prefetch is current: {str(e)}")
+            return True
+        if current:
+            logger.info("Prefetched data is current, skipping the catch-up run")
+        return not current
+
+    async def run(self) -> bool:
+        """
+        Runs the job, retrying with exponential backoff.
+
+        Returns:
+            True if the job succeeded
+        """
+        self.runs += 1
+        attempts = self.retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt == attempts:
+                    self.failures += 1
+                    logger.error(f"Prefetch failed after {attempts} attempts: {str(e)}")
+                    return False
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning(f"Prefetch failed (attempt {attempt} of {attempts}), retrying in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+            else:
+                self.last_success = datetime.now()
+                self.last_error = None
+                logger.info("Prefetch finished")
+                return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_success": self.last_success,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,166 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.services.cycle_index import CycleIndex
+
+
+class CachedResult(NamedTuple):
+    """Cycle index of one period together with the data it was computed from"""
+    first_day: int
+    last_day: int
+    index: CycleIndex
+    message: str
+    created_at: float
+
+
+class OptimizationResultCache:
+    """
+    In-process LRU cache of computed optimization results with a time to live.
+
+    Entries are keyed by the normalized request parameters (see make_key) and hold
+    the threshold-independent CycleIndex, so requests that differ only in the
+    threshold share one entry. The least recently used entry is evicted when
+    max_entries is exceeded, expired entries are dropped when they are read. Entries are invalidated when the
+    market data of one of their days changes (see invalidate_days); a result
+    computed while market data changed is not stored (see generation). Only results
+    of published API prices are stored: generated test data differs on every request.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(
+        first_day: date,
+        last_day: date,
+        max_cycles_per_day: int
+    ) -> Tuple[Hashable, ...]:
+        """
+        Normalizes the request parameters into a cache key.
+
+        The engine and the battery settings are part of the key, so changing them
+        at runtime never returns results computed with the old values.
+        """
+        return (
+            first_day.toordinal(),
+            last_day.toordinal(),
+            int(max_cycles_per_day),
+            settings.OPTIMIZER_ENGINE,
+            settings.BATTERY_CAPACITY_KWH,
+            settings.ROUND_TRIP_EFFICIENCY
+        )
+
+    @property
+    def generation(self) -> int:
+        """Number of market data changes seen so far; read it once the data of a result is loaded"""
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[CachedResult]:
+        """Returns the cached result for key (marking it as recently used) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        first_day: date,
+        last_day: date,
+        index: CycleIndex,
+        message: str,
+        generation: int
+    ) -> None:
+        """
+        Stores a result, evicting the least recently used entries above max_entries.
+        The result is dropped if market data changed since generation was read.
+        """
+        if self.max_entries <= 0:
+            return
+        entry = CachedResult(first_day.toordinal(), last_day.toordinal(), index, message, time.monotonic())
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_days(self, days: Optional[Iterable[int]] = None) -> int:
+        """
+        Removes the results that cover one of the given days (date ordinals).
+
+        Args:
+            days: Changed days, None removes all results
+
+        Returns:
+            Number of removed results
+        """
+        with self._lock:
+            self._generation += 1
+            if days is None:
+                stale = list(self._entries)
+            else:
+                days = sorted(days)
+                if not days:
+                    return 0
+                stale = [
+                    key for key, entry in self._entries.items()
+                    if _covers_any(entry.first_day, entry.last_day, days)
+                ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached optimization results")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _covers_any(first_day: int, last_day: int, sorted_days: List[int]) -> bool:
+    """True if one of sorted_days lies in [first_day, last_day]"""
+    position = bisect_left(sorted_days, first_day)
+    return position < len(sorted_days) and sorted_days[position] <= last_day
+
+
+# Shared result cache of the optimization endpoints
+result_cache = OptimizationResultCache(settings.OPTIMIZATION_CACHE_SIZE, settings.OPTIMIZATION_CACHE_TTL)
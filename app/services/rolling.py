@@ -0,0 +1,255 @@
+import math
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.schemas.market_frame import MarketData
+from app.services.cycle_index import CycleIndex, threshold_summaries
+from app.services.optimizer import OptimizerService
+from app.utils.dates import format_day_ordinal
+
+
+class DayCycles(NamedTuple):
+    """Optimized day of the rolling window with its cycle index and profit totals"""
+    prices: bytes
+    cycles: List[Dict[str, Any]]
+    index: CycleIndex
+    profit: float
+    profit_after_losses: float
+
+    @classmethod
+    def build(cls, prices: bytes, records: List[Dict[str, Any]], threshold: float) -> "DayCycles":
+        """
+        Args:
+            prices: Prices of the day (see _day_prices)
+            records: Cycles of the day computed without a threshold
+            threshold: Profit threshold of the cycles returned by delta() and summary()
+        """
+        index = CycleIndex(records)
+        cycles = index.cycles(threshold)
+        return cls(
+            prices,
+            cycles,
+            index,
+            math.fsum(cycle["profit"] for cycle in cycles),
+            math.fsum(cycle["profit_after_losses"] for cycle in cycles)
+        )
+
+
+class RollingOptimizer:
+    """
+    Incremental optimization state of a rolling window of days.
+
+    update() optimizes only the days that are new or whose prices changed and
+    evicts the days that fall out of the window, so the daily day-ahead update
+    costs O(new days) instead of a run over the whole window. Every day keeps its
+    own cycle index and profit totals, so no state of the whole window is rebuilt;
+    summary() and summarize() combine the days when they are read. The indexes are
+    built without a threshold (as OptimizerService.build_cycle_index), so summarize()
+    answers negative thresholds too; threshold only filters the cycles of delta()
+    and summary(). Every change
+    increments the version; delta() returns the days changed since an earlier version.
+    """
+
+    def __init__(
+        self,
+        window_days: int,
+        max_cycles_per_day: int = 1,
+        threshold: float = 0.0,
+        history_size: int = 100,
+        optimizer: Optional[OptimizerService] = None
+    ):
+        self.window_days = window_days
+        self.max_cycles_per_day = max_cycles_per_day
+        self.threshold = threshold
+        self.optimizer = optimizer or OptimizerService()
+        self.version = 0
+        self._days: Dict[int, DayCycles] = {}
+        # (version, days changed by it); older versions only allow full deltas
+        self._changes: Deque[Tuple[int, Set[int]]] = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def update(self, data: MarketData) -> Set[int]:
+        """
+        Adds the days of data that are new or changed and evicts the days older than
+        the window (counted back from the newest day).
+
+        Args:
+            data: Market data of one or more days
+
+        Returns:
+            Changed days (date ordinals), including the evicted ones
+        """
+        with self._lock:
+            changed_prices, first_day = self._changed_prices(data)
+            records = {}
+            if changed_prices:
+                records = dict(self.optimizer.cycles_by_day(
+                    _changed_data(changed_prices), float("-inf"), max_cycles_per_day=self.max_cycles_per_day
+                ))
+            return self._apply(changed_prices, first_day, records)
+
+    async def update_async(self, data: MarketData, executor: Callable[..., Awaitable[Any]]) -> Set[int]:
+        """
+        Same as update, but the new and changed days are optimized by executor (e.g.
+        WorkerPool.run), so the executor may also be a process pool. The results are
+        applied only if the window did not change meanwhile; otherwise the changed
+        days are determined and sent to the executor again.
+        """
+        while True:
+            with self._lock:
+                version = self.version
+                changed_prices, first_day = self._changed_prices(data)
+            records = {}
+            if changed_prices:
+                records = dict(await executor(
+                    self.optimizer.cycles_by_day,
+                    _changed_data(changed_prices),
+                    float("-inf"),
+                    max_cycles_per_day=self.max_cycles_per_day
+                ))
+            with self._lock:
+                if self.version == version:
+                    return self._apply(changed_prices, first_day, records)
+            logger.info(f"Rolling window changed to version {self.version} while optimizing, optimizing the changed days again")
+
+    def _apply(
+        self,
+        changed_prices: Dict[int, Tuple[bytes, MarketData]],
+        first_day: Optional[int],
+        records: Dict[int, List[Dict[str, Any]]]
+    ) -> Set[int]:
+        """Stores the optimized days and evicts the days before first_day; called with the lock held"""
+        changed = {day for day in self._days if first_day is not None and day < first_day}
+        for day in changed:
+            del self._days[day]
+
+        for day, (prices, _) in changed_prices.items():
+            self._days[day] = DayCycles.build(prices, records.get(day, []), self.threshold)
+        changed.update(changed_prices)
+
+        if changed:
+            self.version += 1
+            self._changes.append((self.version, changed))
+            logger.info(f"Rolling optimization updated to version {self.version}: {len(changed)} changed days, {len(self._days)} days in the window")
+        return changed
+
+    def _changed_prices(self, data: MarketData) -> Tuple[Dict[int, Tuple[bytes, MarketData]], Optional[int]]:
+        """
+        Returns the days of data within the window that are new or whose prices
+        changed (with their prices and records) and the first day of the window.
+        """
+        changed_prices = {}
+        for day, day_data in data.sort_by_day().iter_days():
+            prices = _day_prices(day_data)
+            entry = self._days.get(day)
+            if entry is None or entry.prices != prices:
+                changed_prices[day] = (prices, day_data)
+
+        newest = max([*self._days, *changed_prices], default=None)
+        if newest is None:
+            return {}, None
+        first_day = newest - self.window_days + 1
+        return {day: value for day, value in changed_prices.items() if day >= first_day}, first_day
+
+    def summarize(self, thresholds: Iterable[float]) -> List[Dict[str, Any]]:
+        """
+        Computes the number of cycles and the total profit of the window for every
+        threshold (see CycleIndex.summarize) from the indexes of its days.
+        """
+        thresholds = np.asarray(list(thresholds), dtype=np.float64)
+        counts = np.zeros(len(thresholds), dtype=np.int64)
+        profits = np.zeros(len(thresholds))
+        profits_after_losses = np.zeros(len(thresholds))
+        with self._lock:
+            for entry in self._days.values():
+                day_counts, day_profits, day_profits_after_losses = entry.index.totals(thresholds)
+                counts += day_counts
+                profits += day_profits
+                profits_after_losses += day_profits_after_losses
+        return threshold_summaries(thresholds, counts, profits, profits_after_losses)
+
+    def summary(self) -> Dict[str, Any]:
+        """Running totals of the window"""
+        with self._lock:
+            return self._summary()
+
+    def _summary(self) -> Dict[str, Any]:
+        return {
+            "days": len(self._days),
+            "first_day": format_day_ordinal(min(self._days)) if self._days else None,
+            "last_day": format_day_ordinal(max(self._days)) if self._days else None,
+            "cycles": sum(len(entry.cycles) for entry in self._days.values()),
+            # Summed from the day totals, so evicted days leave no rounding residue
+            "total_profit": math.fsum(entry.profit for entry in self._days.values()),
+            "total_profit_after_losses": math.fsum(entry.profit_after_losses for entry in self._days.values())
+        }
+
+    def delta(self, since: int) -> Dict[str, Any]:
+        """
+        Returns the changes of the window after version since.
+
+        When since is older than the kept history, all days of the window are
+        returned and full is set, so the consumer replaces its state.
+
+        Args:
+            since: Version the consumer has, 0 for the initial state
+
+        Returns:
+            Dictionary with version, since, full, days (date and cycles of every
+            added or changed day), removed_days and the summary of the window
+
+        Raises:
+            ValueError: If since is negative or newer than the current version
+        """
+        with self._lock:
+            if since < 0 or since > self.version:
+                raise ValueError(f"Unknown version {since}, the current version is {self.version}")
+
+            oldest = self._changes[0][0] - 1 if self._changes else self.version
+            full = since < oldest
+            if full:
+                changed = set(self._days)
+            else:
+                changed = set()
+                for version, days in self._changes:
+                    if version > since:
+                        changed.update(days)
+
+            return {
+                "version": self.version,
+                "since": since,
+                "full": full,
+                "days": [
+                    {"date": format_day_ordinal(day), "cycles": self._days[day].cycles}
+                    for day in sorted(changed) if day in self._days
+                ],
+                "removed_days": [format_day_ordinal(day) for day in sorted(changed) if day not in self._days],
+                "summary": self._summary()
+            }
+
+
+def _changed_data(changed_prices: Dict[int, Tuple[bytes, MarketData]]) -> MarketData:
+    """Records of the changed days returned by RollingOptimizer._changed_prices"""
+    return MarketData.concat(day_data for _, day_data in changed_prices.values())
+
+
+def _day_prices(day_data: MarketData) -> bytes:
+    """Prices of a day ordered by slot, used to detect changed days"""
+    order = np.argsort(day_data.slot, kind="stable")
+    return day_data.slot[order].tobytes() + day_data.price_ct_kwh[order].tobytes()
+
+
+# Shared rolling window of the latest day-ahead prices
+rolling_optimizer = RollingOptimizer(
+    settings.ROLLING_WINDOW_DAYS,
+    settings.ROLLING_MAX_CYCLES_PER_DAY,
+    history_size=settings.ROLLING_HISTORY_SIZE
+)
@@ -0,0 +1,134 @@
+import time
+from typing import Any, Dict, Optional
+
+from app.core.logging_config import logger
+
+
+class UpstreamError(Exception):
+    """
+    Failure of the upstream market data API.
+
+    reason is a stable identifier of the failure kind (reported to the clients as
+    X-Test-Reason), retryable tells whether another attempt can succeed.
+    """
+    reason = "api_error"
+    retryable = True
+
+
+class UpstreamTokenError(UpstreamError):
+    """The identity server did not issue a token"""
+    reason = "auth_token_error"
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        # Rejected credentials will be rejected again, server errors and outages are transient
+        self.retryable = status is None or status >= 500
+
+
+class UpstreamStatusError(UpstreamError):
+    """The data API answered with an error status"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+        if status == 404:
+            self.reason = "api_not_found"
+        elif status in (401, 403):
+            self.reason = "api_auth_error"
+        self.retryable = status >= 500 or status == 429
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """An attempt did not finish within its timeout"""
+    reason = "api_timeout"
+
+
+class UpstreamConnectionError(UpstreamError):
+    """The upstream host could not be reached or closed the connection"""
+    reason = "api_connect_error"
+
+
+class UpstreamResponseError(UpstreamError):
+    """The response is empty or cannot be parsed"""
+    retryable = False
+
+
+class CircuitOpenError(UpstreamError):
+    """The circuit breaker is open, the upstream API is not called"""
+    reason = "circuit_open"
+    retryable = False
+
+
+class CircuitBreaker:
+    """
+    Stops calling the upstream API after repeated failures.
+
+    After failure_threshold consecutive retryable failures the circuit opens and
+    every call fails immediately with CircuitOpenError. After reset_timeout
+    seconds one trial call is let through (half-open): its success closes the
+    circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        # Start of the trial call in the half-open state; a trial that never reports
+        # back (e.g. cancelled) is replaced by a new one after reset_timeout
+        self._trial_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        """
+        Raises CircuitOpenError if a call is not allowed now; in the half-open state
+        only one caller at a time is let through as the trial call.
+        """
+        state = self.state
+        if state == "closed":
+            return
+        now = time.monotonic()
+        if state == "half_open" and (self._trial_started is None or now - self._trial_started >= self.reset_timeout):
+            self._trial_started = now
+            return
+        self._reject()
+
+    def reject_if_open(self) -> None:
+        """Raises CircuitOpenError while the circuit is open, without using the trial call"""
+        if self.state == "open":
+            self._reject()
+
+    def _reject(self) -> None:
+        self.rejected += 1
+        retry_in = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+        raise CircuitOpenError(f"The upstream API is unavailable, the next attempt in {retry_in:.0f}s")
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Upstream API is available again, circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+
+    def record_failure(self, error: Exception) -> None:
+        """Counts a failed call; only retryable (availability) failures can open the circuit"""
+        trial = self._trial_started is not None
+        self._trial_started = None
+        if isinstance(error, UpstreamError) and not error.retryable:
+            return
+        self.failures += 1
+        if trial or self.failures >= self.failure_threshold:
+            logger.warning(f"Upstream API failed {self.failures} times, circuit opened for {self.reset_timeout:.0f}s")
+            self.opened_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
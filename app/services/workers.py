@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.logging_config import logger
+
+WORKER_POOL_KINDS = ("thread", "process")
+
+
+class WorkerPoolBusyError(Exception):
+    """All workers are busy and the queue of waiting jobs is full"""
+
+
+class WorkerPool:
+    """
+    Runs CPU-bound work (parsing, optimization) outside of the event loop.
+
+    Jobs go to a thread or process pool of max_workers workers; at most max_queued
+    jobs wait for a free worker. Further jobs are rejected with WorkerPoolBusyError
+    instead of queueing without limit, so a saturated service answers at once.
+    NumPy releases the GIL in its heavy loops, so threads are the default; a
+    process pool also isolates the pure Python parts but pickles the arguments.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int, kind: str = "thread"):
+        if kind not in WORKER_POOL_KINDS:
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.kind = kind
+        self.completed = 0
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    @property
+    def pending(self) -> int:
+        """Jobs running or waiting for a worker"""
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        # Created on first use, so importing the application does not start processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="worker")
+            logger.info(f"Started {self.kind} worker pool with {self.max_workers} workers, queue limit {self.max_queued}")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs func(*args, **kwargs) in the pool and returns its result.
+
+        Raises:
+            WorkerPoolBusyError: If max_workers jobs are running and max_queued are waiting
+        """
+        if self._pending >= self.max_workers + self.max_queued:
+            self.rejected += 1
+            raise WorkerPoolBusyError(f"All {self.max_workers} workers are busy and {self.max_queued} jobs are waiting")
+
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._get_executor().submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._job_done(None)
+            raise
+        # Counted down when the job itself finishes: a cancelled request does not stop a running job
+        future.add_done_callback(self._job_done)
+        return await asyncio.wrap_future(future)
+
+    def _job_done(self, future: Optional[Future]) -> None:
+        # Called from a worker (or the pool's management) thread
+        with self._lock:
+            self._pending -= 1
+            if future is not None and not future.cancelled():
+                self.completed += 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "queue_limit": self.max_queued,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a sleeping task.
+
+    A task sleeps for interval seconds in a loop; the time it wakes up later than
+    requested is the lag, i.e. how long other code blocked the loop. Reports the
+    last and the maximum lag and an exponential moving average.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.average_lag = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(time.perf_counter() - started - self.interval)
+
+    def record(self, lag: float) -> None:
+        lag = max(lag, 0.0)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.average_lag = lag if self.samples == 0 else 0.9 * self.average_lag + 0.1 * lag
+        self.samples += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_ms": self.last_lag * 1000,
+            "average_ms": self.average_lag * 1000,
+            "max_ms": self.max_lag * 1000,
+            "samples": self.samples
+        }
+
+
+# Shared pool for the CPU-bound work of the endpoints
+worker_pool = WorkerPool(settings.WORKER_POOL_SIZE, settings.WORKER_QUEUE_SIZE, settings.WORKER_POOL_KIND)
+
+# Event loop lag, started from the application lifespan
+loop_lag_monitor = EventLoopLagMonitor(settings.EVENT_LOOP_LAG_INTERVAL)
@@ -1,76 +1,24 @@
-import csv
 import io
-from typing import List, Dict, Any
-from app.schemas.market_data import MarketDataItem
+from typing import Iterable, List, Dict, Any, TextIO
+from app.schemas.market_frame import MarketData
+from app.utils.csv_ingest import parse_price_csv
+from app.utils.dates import format_day_ordinal
+from app.utils.time_slots import format_slot
 from datetime import datetime
 from app.core.logging_config import logger
 
-def parse_csv(csv_content: str) -> List[MarketDataItem]:
+def parse_csv(csv_content: str) -> MarketData:
     """
     Парсит CSV файл с данными рынка электроэнергии.
     Ожидаемый формат:
     Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh
-    с значениями, разделенными точкой с запятой, и с запятой в качестве десятичного разделителя
+    с значениями, разделенными точкой с запятой, и с запятой в качестве десятичного разделителя.
+    Колонки определяются по заголовку (порядок может быть разным), некорректные строки пропускаются.
     """
     try:
-        result = []
-        # Читаем CSV
-        reader = csv.reader(io.StringIO(csv_content), delimiter=';')
+        result = parse_price_csv(csv_content, strict=True)
         
-        # Получаем заголовки
-        headers = next(reader)
-        
-        # Проверяем заголовки
-        expected_headers = ["Datum", "von", "Zeitzone von", "bis", "Zeitzone bis", "Spotmarktpreis in ct/kWh"]
-        
-        # Проверяем, что все ожидаемые заголовки присутствуют (порядок может быть разным)
-        if not all(header in headers for header in expected_headers):
-            logger.error(f"Неверный формат CSV: ожидались заголовки {expected_headers}, получены {headers}")
-            raise ValueError(f"Неверный формат CSV. Ожидались колонки: {', '.join(expected_headers)}")
-        
-        # Индексы колонок
-        date_idx = headers.index("Datum")
-        hour_from_idx = headers.index("von")
-        price_idx = headers.index("Spotmarktpreis in ct/kWh")
-        
-        # Парсим строки
-        for row in reader:
-            if not row:
-                continue  # Пропускаем пустые строки
-            
-            try:
-                # Получаем данные из строки
-                date_str = row[date_idx].strip()
-                hour_str = row[hour_from_idx].strip()
-                price_str = row[price_idx].strip().replace(',', '.')
-                
-                # Парсим дату (ожидаем формат DD.MM.YYYY)
-                try:
-                    date = datetime.strptime(date_str, "%d.%m.%Y")
-                except ValueError:
-                    # Пробуем альтернативный формат YYYY-MM-DD
-                    date = datetime.strptime(date_str, "%Y-%m-%d")
-                
-                # Парсим час
-                hour = int(hour_str)
-                
-                # Парсим цену
-                price_ct_kwh = float(price_str)
-                
-                # Создаем объект MarketDataItem
-                item = MarketDataItem(
-                    date=date,
-                    hour=hour,
-                    price_ct_kwh=price_ct_kwh,
-                    price_eur=price_ct_kwh / 100.0  # конвертируем центы в евро
-                )
-                
-                result.append(item)
-            except Exception as e:
-                logger.warning(f"Ошибка при парсинге строки CSV {row}: {str(e)}")
-                # Не прерываем работу, просто пропускаем некорректную строку
-        
-        if not result:
+        if not len(result):
             logger.error("CSV успешно обработан, но данные не найдены")
             raise ValueError("В CSV файле не найдены данные в ожидаемом формате")
         
@@ -79,27 +27,84 @@ def parse_csv(csv_content: str) -> List[MarketDataItem]:
         logger.error(f"Ошибка при парсинге CSV: {str(e)}")
         raise
 
-def format_to_csv(cycles: List[Dict[str, Any]]) -> str:
+# Заголовки CSV с результатами оптимизации (для пустого результата - без единицы измерения прибыли)
+CYCLES_CSV_HEADER = "Cycle;Date;Charge_Start;Charge_End;Discharge_Start;Discharge_End;Charge_Price;Discharge_Price;Profit (EUR)\n"
+CYCLES_CSV_HEADER_EMPTY = "Cycle;Date;Charge_Start;Charge_End;Discharge_Start;Discharge_End;Charge_Price;Discharge_Price;Profit\n"
+
+# Заголовок CSV с рыночными данными (совместим с форматом загрузки)
+MARKET_DATA_CSV_HEADER = "Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh\n"
+
+def _format_decimal(value: float, digits: int) -> str:
     """
-    Форматирует результаты оптимизации в CSV.
+    Округляет число и записывает его с запятой в качестве десятичного разделителя,
+    так же как str(round(value, digits)).
+    """
+    if isinstance(value, float) and -1e10 < value < 1e10:
+        # До 15 значащих цифр округленная запись совпадает с repr(round(...)), а форматирование
+        # напрямую обходится без промежуточного float
+        text = f"{value:.{digits}f}".rstrip('0')
+        if text.endswith('.'):
+            text += '0'
+        return text.replace('.', ',')
+    return str(round(value, digits)).replace('.', ',')
+
+def format_csv_row(cycle: Dict[str, Any]) -> str:
+    """
+    Форматирует один цикл оптимизации как строку CSV.
     """
-    if not cycles:
-        return "Cycle;Date;Charge_Start;Charge_End;Discharge_Start;Discharge_End;Charge_Price;Discharge_Price;Profit\n"
+    date = cycle["date"]
+    if isinstance(date, datetime):
+        date = date.strftime("%d.%m.%Y")
     
-    csv_content = "Cycle;Date;Charge_Start;Charge_End;Discharge_Start;Discharge_End;Charge_Price;Discharge_Price;Profit (EUR)\n"
+    return (
+        f"{cycle['cycle']};{date};{cycle['charge_start']};{cycle['charge_end']};"
+        f"{cycle['discharge_start']};{cycle['discharge_end']};"
+        f"{_format_decimal(cycle['charge_price'], 4)};{_format_decimal(cycle['discharge_price'], 4)};"
+        f"{_format_decimal(cycle['profit'], 2)}\n"
+    )
+
+def write_cycles_csv(cycles: Iterable[Dict[str, Any]], out: TextIO) -> int:
+    """
+    Записывает результаты оптимизации в CSV в текстовый поток (файл, StringIO и т.п.).
+    Строки пишутся по мере перебора циклов, без сборки всего CSV в памяти.
     
-    for cycle in cycles:
-        date = cycle["date"].strftime("%d.%m.%Y") if isinstance(cycle["date"], datetime) else cycle["date"]
-        
-        # Форматируем цены с запятой в качестве десятичного разделителя
-        charge_price = str(round(cycle["charge_price"], 4)).replace('.', ',')
-        discharge_price = str(round(cycle["discharge_price"], 4)).replace('.', ',')
-        profit = str(round(cycle["profit"], 2)).replace('.', ',')
-        
-        row = f"{cycle['cycle']};{date};{cycle['charge_start']};{cycle['charge_end']};"
-        row += f"{cycle['discharge_start']};{cycle['discharge_end']};"
-        row += f"{charge_price};{discharge_price};{profit}\n"
-        
-        csv_content += row
+    Returns:
+        Количество записанных циклов
+    """
+    rows = map(format_csv_row, cycles)
+    first_row = next(rows, None)
+    if first_row is None:
+        out.write(CYCLES_CSV_HEADER_EMPTY)
+        return 0
     
-    return csv_content
+    out.write(CYCLES_CSV_HEADER)
+    out.write(first_row)
+    count = 1
+    for row in rows:
+        out.write(row)
+        count += 1
+    return count
+
+def format_to_csv(cycles: List[Dict[str, Any]]) -> str:
+    """
+    Форматирует результаты оптимизации в CSV.
+    """
+    buffer = io.StringIO()
+    write_cycles_csv(cycles, buffer)
+    return buffer.getvalue()
+
+def format_market_data_csv_rows(data: MarketData) -> str:
+    """
+    Форматирует рыночные данные как строки CSV (без заголовка).
+    Интервал записывается как начало и конец слота (01:00;02:00 или 01:15;01:30),
+    часовой пояс не хранится, поэтому колонки с ним остаются пустыми.
+    """
+    starts = data.slot
+    ends = starts + data.slot_minutes()
+    return "".join(
+        f"{format_day_ordinal(day)};{format_slot(start, True)};;{format_slot(end, True)};;"
+        f"{str(price_ct_kwh).replace('.', ',')}\n"
+        for day, start, end, price_ct_kwh in zip(
+            data.day.tolist(), starts.tolist(), ends.tolist(), data.price_ct_kwh.tolist()
+        )
+    )
@@ -0,0 +1,254 @@
+"""
+Parsing of market price CSV files into columnar MarketData.
+
+Files have the upstream layout "Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh"
+(date DD.MM.YYYY or YYYY-MM-DD, slot start as "H" or "HH:MM", price with a decimal comma).
+Hourly and quarter-hourly files are read alike, the slot start keeps the minutes.
+The date, time and price columns are looked up once in the header line; files
+without a recognizable header are read with the upstream column order.
+Two engines are available:
+
+- "python": csv.reader and per-cell conversion
+- "pandas": the pandas C parser with the price column converted by the parser itself;
+  dates and slot starts are converted once per distinct value
+
+Both engines skip and log invalid rows and produce identical results; the pandas
+engine falls back to the Python one for files the C parser rejects (e.g. rows with
+more columns than the first one).
+"""
+import csv
+import io
+import math
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.schemas.market_frame import MarketData, MarketDataBuilder
+from app.utils.dates import parse_day_ordinal
+from app.utils.time_slots import MINUTES_PER_DAY, MINUTES_PER_HOUR, parse_slot
+
+CSV_INGEST_ENGINES = ("python", "pandas")
+
+# One parsed CSV line: (day ordinal, hour, price in ct/kWh, minute), the argument order of MarketDataBuilder.append
+MarketRow = Tuple[int, int, float, int]
+
+# Column headers of the upstream CSV (the price header may carry a suffix, e.g. "(Börse)")
+DATE_HEADER = "Datum"
+HOUR_HEADER = "von"
+PRICE_HEADER_PREFIX = "Spotmarktpreis"
+
+
+class CsvColumns(NamedTuple):
+    """Positions of the date, hour and price columns in a CSV row"""
+    date: int
+    hour: int
+    price: int
+
+
+# Column order of the upstream API
+DEFAULT_COLUMNS = CsvColumns(date=0, hour=1, price=5)
+
+
+def resolve_columns(header_line: str) -> Optional[CsvColumns]:
+    """
+    Finds the date, hour and price columns in a CSV header line.
+
+    Returns:
+        Column positions, None if one of the columns is missing
+    """
+    headers = [header.strip() for header in next(csv.reader([header_line.lstrip("\ufeff")], delimiter=';'), [])]
+    try:
+        date_idx = headers.index(DATE_HEADER)
+        hour_idx = headers.index(HOUR_HEADER)
+    except ValueError:
+        return None
+    price_idx = next((idx for idx, header in enumerate(headers) if header.startswith(PRICE_HEADER_PREFIX)), None)
+    if price_idx is None:
+        return None
+    return CsvColumns(date=date_idx, hour=hour_idx, price=price_idx)
+
+
+def parse_price_csv(csv_content: str, engine: Optional[str] = None, strict: bool = False) -> MarketData:
+    """
+    Parses a CSV file with a header line into MarketData.
+
+    Args:
+        csv_content: CSV text, the first line is the header
+        engine: "python" or "pandas", defaults to settings.CSV_INGEST_ENGINE
+        strict: Raise ValueError if the header lacks the expected columns
+            instead of reading the upstream column order
+
+    Returns:
+        MarketData of all valid rows in file order
+    """
+    header_line, _, rows = csv_content.partition("\n")
+    return parse_price_rows(rows, header_columns(header_line, strict), engine)
+
+
+def header_columns(header_line: str, strict: bool = False) -> CsvColumns:
+    """Resolves the columns of a header line, falling back to DEFAULT_COLUMNS unless strict"""
+    columns = resolve_columns(header_line)
+    if columns is not None:
+        return columns
+
+    expected = f"{DATE_HEADER}, {HOUR_HEADER}, {PRICE_HEADER_PREFIX}..."
+    if strict:
+        logger.error(f"Invalid CSV format: expected the columns {expected}, got {header_line.strip()!r}")
+        raise ValueError(f"Invalid CSV format. Expected the columns: {expected}")
+    logger.warning(f"CSV header {header_line.strip()!r} lacks the columns {expected}, using the default column order")
+    return DEFAULT_COLUMNS
+
+
+def parse_price_rows(text: str, columns: CsvColumns = DEFAULT_COLUMNS, engine: Optional[str] = None) -> MarketData:
+    """
+    Parses CSV data rows (without the header line) into MarketData.
+
+    Args:
+        text: CSV rows separated by new lines
+        columns: Positions of the date, hour and price columns
+        engine: "python" or "pandas", defaults to settings.CSV_INGEST_ENGINE
+
+    Returns:
+        MarketData of all valid rows in file order
+    """
+    engine = engine or settings.CSV_INGEST_ENGINE
+    if engine == "pandas":
+        return _parse_with_pandas(text, columns)
+    if engine == "python":
+        return _parse_with_python(text, columns)
+    raise ValueError(f"Unknown CSV ingest engine: {engine}")
+
+
+def compile_row_parser(columns: CsvColumns) -> Callable[[List[str]], Optional[MarketRow]]:
+    """
+    Builds a parser of one CSV row into (day ordinal, hour, price_ct_kwh, minute) for the
+    given columns; it returns None for invalid rows.
+    """
+    cells = itemgetter(columns.date, columns.hour, columns.price)
+    min_length = max(columns) + 1
+    parse_date = parse_day_ordinal
+    parse_time = _parse_time
+    isnan = math.isnan
+
+    def parse_row(row: List[str]) -> Optional[MarketRow]:
+        if len(row) < min_length:
+            logger.warning(f"Not enough data in the CSV line: {row}")
+            return None
+
+        date_str, hour_str, price_str = cells(row)
+        try:
+            day = parse_date(date_str)
+            if day is None:
+                raise ValueError(f"unrecognized date {date_str!r}")
+
+            time = parse_time(hour_str)
+            if time is None:
+                raise ValueError(f"invalid time {hour_str!r}")
+            price_ct_kwh = float(price_str.strip().replace(',', '.'))
+            if isnan(price_ct_kwh):
+                raise ValueError("price is not a number")
+
+            return day, time[0], price_ct_kwh, time[1]
+        except Exception as e:
+            logger.warning(f"Error when parsing a CSV line: {e}, line: {row}")
+            return None
+
+    return parse_row
+
+
+def _parse_with_python(text: str, columns: CsvColumns) -> MarketData:
+    builder = MarketDataBuilder()
+    append = builder.append
+    parse_row = compile_row_parser(columns)
+    for row in csv.reader(io.StringIO(text), delimiter=';'):
+        if not row:
+            continue
+        parsed = parse_row(row)
+        if parsed is not None:
+            append(*parsed)
+    return builder.build()
+
+
+def _parse_with_pandas(text: str, columns: CsvColumns) -> MarketData:
+    if not text.strip():
+        return MarketData.empty()
+
+    try:
+        frame = pd.read_csv(
+            io.StringIO(text),
+            sep=';',
+            header=None,
+            usecols=list(columns),
+            dtype={columns.date: str, columns.hour: str},
+            decimal=',',
+            float_precision="round_trip",
+            keep_default_na=False,
+            skip_blank_lines=True,
+            engine="c"
+        )
+    except (ValueError, pd.errors.ParserError) as e:
+        # Ragged files: the C parser requires consistent column counts
+        logger.debug(f"C parser rejected the CSV data ({str(e)}), using the Python parser")
+        return _parse_with_python(text, columns)
+
+    if frame.empty:
+        return MarketData.empty()
+
+    days = _convert_distinct(frame[columns.date], parse_day_ordinal)
+    slots = _convert_distinct(frame[columns.hour], parse_slot)
+    prices = _convert_prices(frame[columns.price])
+
+    valid = ~(np.isnan(days) | np.isnan(slots) | np.isnan(prices))
+    if not valid.all():
+        for position in np.flatnonzero(~valid).tolist():
+            row = frame.iloc[position]
+            logger.warning(
+                f"Error when parsing a CSV line: invalid value, "
+                f"line: {[row[columns.date], row[columns.hour], row[columns.price]]}"
+            )
+
+    hours, minutes = np.divmod(slots[valid].astype(np.int64), MINUTES_PER_HOUR)
+    return MarketData(days[valid], hours, prices[valid], minutes)
+
+
+@lru_cache(maxsize=4 * MINUTES_PER_DAY)
+def _parse_time(value: str) -> Optional[Tuple[int, int]]:
+    """Parses a slot start into (hour, minute), None if it is not a valid time"""
+    slot = parse_slot(value)
+    return divmod(slot, MINUTES_PER_HOUR) if slot is not None else None
+
+
+def _convert_distinct(column: pd.Series, convert) -> np.ndarray:
+    """Converts a column of strings calling convert once per distinct value; invalid values become NaN"""
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    converted = np.full(len(uniques), np.nan)
+    for position, value in enumerate(uniques):
+        result = convert(value) if isinstance(value, str) else None
+        if result is not None:
+            converted[position] = result
+    values = np.full(len(codes), np.nan)
+    known = codes >= 0
+    values[known] = converted[codes[known]]
+    return values
+
+
+def _convert_prices(column: pd.Series) -> np.ndarray:
+    """Returns the prices as float64; values the C parser could not convert are parsed one by one"""
+    if column.dtype == np.float64:
+        return column.to_numpy()
+
+    prices = np.full(len(column), np.nan)
+    for position, value in enumerate(column.tolist()):
+        if isinstance(value, float):
+            prices[position] = value
+            continue
+        try:
+            prices[position] = float(str(value).strip().replace(',', '.'))
+        except ValueError:
+            pass
+    return prices
@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+# Number of distinct date strings (and ordinals) kept by the memoized converters;
+# 4096 days cover more than ten years of market data
+DATE_CACHE_SIZE = 4096
+
+OUTPUT_DATE_FORMAT = "%d.%m.%Y"
+
+
+def to_day_ordinal(date_value: Any) -> Optional[int]:
+    """Returns the date ordinal of a market data date (datetime, date or string), None if it is not a date"""
+    if isinstance(date_value, datetime):
+        return date_value.date().toordinal()
+    if isinstance(date_value, date):
+        return date_value.toordinal()
+    return parse_day_ordinal(date_value if isinstance(date_value, str) else str(date_value))
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_day_ordinal(date_str: str) -> Optional[int]:
+    """
+    Converts a date string (DD.MM.YYYY or YYYY-MM-DD) to a date ordinal, None if it is not a date.
+    Every distinct string is parsed once; market data repeats each date for all slots of the day.
+    """
+    day = parse_day(date_str)
+    return day.toordinal() if day is not None else None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_day_ordinal(ordinal: int) -> str:
+    """Formats a date ordinal in the DD.MM.YYYY output format"""
+    return date.fromordinal(ordinal).strftime(OUTPUT_DATE_FORMAT)
+
+
+def format_date_label(date_value: Any) -> Any:
+    """
+    Formats a date (datetime, date or date string) in the DD.MM.YYYY output format.
+    Values that are not recognized as a date are returned unchanged.
+    """
+    ordinal = to_day_ordinal(date_value) if isinstance(date_value, (str, date)) else None
+    return format_day_ordinal(ordinal) if ordinal is not None else date_value
+
+
+def parse_day(date_str: str) -> Optional[date]:
+    """Parses a market data date (DD.MM.YYYY or YYYY-MM-DD), returns None if it is not a date"""
+    date_str = date_str.strip()
+    for date_format in (OUTPUT_DATE_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def merge_day_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Merges sorted days into as few contiguous (first, last) ranges as possible"""
+    ranges: List[Tuple[date, date]] = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def split_day_range(first_day: date, last_day: date, chunk_days: int) -> List[Tuple[date, date]]:
+    """Splits [first_day, last_day] into consecutive windows of at most chunk_days days (0 - no split)"""
+    if chunk_days <= 0:
+        return [(first_day, last_day)]
+
+    chunks: List[Tuple[date, date]] = []
+    chunk_start = first_day
+    while chunk_start <= last_day:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), last_day)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
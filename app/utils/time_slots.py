@@ -0,0 +1,33 @@
+from functools import lru_cache
+from typing import Optional
+
+# Time slots are identified by their start as minute of the day (0 - 00:00, 1439 - 23:59);
+# the end of the last slot of a day is 1440 (24:00)
+MINUTES_PER_HOUR = 60
+MINUTES_PER_DAY = 24 * MINUTES_PER_HOUR
+
+# Slot length of days with a single price
+DEFAULT_SLOT_MINUTES = MINUTES_PER_HOUR
+
+
+def parse_slot(value: str) -> Optional[int]:
+    """
+    Parses a slot start ("H", "HH:MM" or "HH:MM:SS") into the minute of the day,
+    returns None if it is not a valid time. "24:00" ends a day and is not a slot start.
+    """
+    parts = value.strip().split(':')
+    try:
+        hour = int(parts[0])
+        minute = int(parts[1]) if len(parts) > 1 else 0
+    except ValueError:
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < MINUTES_PER_HOUR):
+        return None
+    return hour * MINUTES_PER_HOUR + minute
+
+
+@lru_cache(maxsize=2 * (MINUTES_PER_DAY + 1))
+def format_slot(minutes: int, zero_pad: bool = False) -> str:
+    """Formats a minute of the day as "H:MM" (or "HH:MM" with zero_pad); 1440 is "24:00" """
+    hour, minute = divmod(minutes, MINUTES_PER_HOUR)
+    return f"{hour:02d}:{minute:02d}" if zero_pad else f"{hour}:{minute:02d}"
@@ -0,0 +1,114 @@
+"""
+Benchmark: parsing an upstream CSV file into market data.
+
+Compares the former csv_handler.parse_csv (a validated MarketDataItem per row)
+with the shared header-aware parser behind parse_csv, parse_csv_data and
+_parse_csv_response, using the "python" engine (compiled per-row converters)
+and the "pandas" engine (C parser with columnar conversion).
+
+Usage:
+    python -m benchmarks.bench_csv_ingest [--days 365] [--repeat 5]
+"""
+import argparse
+import csv
+import io
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, List
+
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.schemas.market_data import MarketDataItem
+from app.schemas.market_frame import MarketData
+from app.utils.csv_handler import parse_csv
+from app.utils.csv_ingest import CSV_INGEST_ENGINES
+
+
+def upstream_csv(days: int) -> str:
+    """CSV in the upstream layout with hourly prices for the given number of days"""
+    lines = ["Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh"]
+    first_day = date(2023, 1, 1)
+    for offset in range(days):
+        day = (first_day + timedelta(days=offset)).strftime("%d.%m.%Y")
+        for hour in range(24):
+            price = f"{(offset * 7 + hour * 13) % 400 / 10 - 5:.3f}".replace(".", ",")
+            lines.append(f"{day};{hour:02d}:00;UTC;{(hour + 1) % 24:02d}:00;UTC;{price}")
+    return "\n".join(lines) + "\n"
+
+
+def legacy_parse_csv(csv_content: str) -> List[MarketDataItem]:
+    """The former csv_handler.parse_csv without its error logging"""
+    reader = csv.reader(io.StringIO(csv_content), delimiter=';')
+    headers = next(reader)
+    date_idx = headers.index("Datum")
+    hour_from_idx = headers.index("von")
+    price_idx = headers.index("Spotmarktpreis in ct/kWh")
+
+    result = []
+    for row in reader:
+        if not row:
+            continue
+        try:
+            date_str = row[date_idx].strip()
+            try:
+                day = datetime.strptime(date_str, "%d.%m.%Y")
+            except ValueError:
+                day = datetime.strptime(date_str, "%Y-%m-%d")
+            price_ct_kwh = float(row[price_idx].strip().replace(',', '.'))
+            result.append(MarketDataItem(
+                date=day,
+                hour=int(row[hour_from_idx].strip().split(':')[0]),
+                price_ct_kwh=price_ct_kwh,
+                price_eur=price_ct_kwh / 100.0
+            ))
+        except Exception:
+            continue
+    return result
+
+
+def with_engine(engine: str) -> Callable[[str], MarketData]:
+    def parse(csv_content: str) -> MarketData:
+        settings.CSV_INGEST_ENGINE = engine
+        return parse_csv(csv_content)
+    return parse
+
+
+def measure(function: Callable[[str], object], content: str, repeat: int) -> float:
+    """Best time of repeat runs in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(content)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    content = upstream_csv(args.days)
+    paths = {"legacy parse_csv": legacy_parse_csv}
+    for engine in CSV_INGEST_ENGINES:
+        paths[f"{engine} engine"] = with_engine(engine)
+
+    expected = [(item.date.date(), item.hour, item.price_ct_kwh) for item in legacy_parse_csv(content)]
+    for name, function in paths.items():
+        if function is not legacy_parse_csv:
+            records = function(content).to_records()
+            assert [(datetime.strptime(r["date"], "%d.%m.%Y").date(), r["hour"], r["price_ct_kwh"]) for r in records] == expected, name
+
+    rows = len(expected)
+    timings = {name: measure(function, content, args.repeat) for name, function in paths.items()}
+    legacy = timings["legacy parse_csv"]
+    print(f"{'path':<20}{'rows':>10}{'time':>12}{'rows/s':>14}{'speedup':>10}")
+    for name, elapsed in timings.items():
+        print(f"{name:<20}{rows:>10}{elapsed * 1000:>10.1f}ms{rows / elapsed:>14,.0f}{legacy / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: JSON serialization of one-year API responses.
+
+Compares the former path (json.dumps with the encode_default fallback, json.loads, then
+JSONResponse encoding the dictionary again) with the single-pass ORJSONResponse.
+
+Usage:
+    python -m benchmarks.bench_serialization [--days 365] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+
+from app.api.responses import ORJSONResponse, encode_default
+from app.core.logging_config import logger
+from app.services.market_data import MarketDataService
+from app.services.optimizer import OptimizerService
+
+
+def legacy_response(content) -> bytes:
+    data = json.loads(json.dumps(content, default=encode_default))
+    return JSONResponse(content=data).body
+
+
+def orjson_response(content) -> bytes:
+    return ORJSONResponse(content=content).body
+
+
+def measure(function, content, repeat: int) -> float:
+    """Best time of repeat runs in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(content)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    start_date = datetime(2023, 1, 1)
+    end_date = start_date + timedelta(days=args.days - 1)
+    market_data = asyncio.run(MarketDataService(cache=None).generate_test_data(start_date, end_date))
+
+    optimizer = OptimizerService()
+    cycles = optimizer.to_optimization_response(optimizer.process_data(market_data, max_cycles_per_day=3))
+
+    payloads = {
+        "market data": {"data": market_data.to_records(), "is_test_data": True, "message": "benchmark"},
+        "optimization": {"cycles": cycles, "is_test_data": True, "message": "benchmark"},
+    }
+
+    print(f"{'payload':<14}{'size':>12}{'legacy':>12}{'orjson':>12}{'speedup':>10}")
+    for name, content in payloads.items():
+        assert json.loads(legacy_response(content)) == json.loads(orjson_response(content))
+        legacy = measure(legacy_response, content, args.repeat)
+        fast = measure(orjson_response, content, args.repeat)
+        size = len(orjson_response(content))
+        print(f"{name:<14}{size:>10} B{legacy * 1000:>10.1f}ms{fast * 1000:>10.1f}ms{legacy / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
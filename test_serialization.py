@@ -1,5 +1,5 @@
 from app.schemas.optimization import OptimizationCycle
-from app.api.endpoints.optimization import CustomJSONEncoder
+from app.api.responses import encode_default
 import json
 
 # Создаем тестовый экземпляр OptimizationCycle
@@ -17,7 +17,7 @@ test_cycle = OptimizationCycle(
 
 # Пробуем сериализовать в JSON
 try:
-    json_data = json.dumps(test_cycle, cls=CustomJSONEncoder, indent=2)
+    json_data = json.dumps(test_cycle, default=encode_default, indent=2)
     print("Сериализация успешна:")
     print(json_data)
 except Exception as e:
@@ -26,7 +26,7 @@ except Exception as e:
 # Проверяем сериализацию списка объектов
 try:
     cycles_list = [test_cycle, test_cycle]  # Два одинаковых объекта для примера
-    json_list = json.dumps({"cycles": cycles_list}, cls=CustomJSONEncoder, indent=2)
+    json_list = json.dumps({"cycles": cycles_list}, default=encode_default, indent=2)
     print("\nСериализация списка успешна:")
     print(json_list)
 except Exception as e:
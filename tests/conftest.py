@@ -1,11 +1,31 @@
+import os
+import tempfile
+
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, time
 
+# Сервис рыночных данных создает кэш при импорте приложения: кэш тестов не должен попадать в рабочую копию
+_market_cache_dir = tempfile.TemporaryDirectory(prefix="market_cache_")
+os.environ["MARKET_CACHE_PATH"] = os.path.join(_market_cache_dir.name, "market_cache.sqlite3")
+
 from app.main import app
+from app.services.market_data import market_service
 from app.schemas.market_data import MarketDataItem
 from app.services.optimizer import OptimizerService
 
+@pytest.fixture(autouse=True)
+def isolated_market_cache(tmp_path, monkeypatch):
+    """Отдельный пустой кэш рыночных данных для каждого теста"""
+    cache = market_service.cache
+    if cache is None:
+        yield
+        return
+    cache.close()
+    monkeypatch.setattr(cache, "path", tmp_path / "market_cache.sqlite3")
+    yield
+    cache.close()
+
 @pytest.fixture
 def client():
     """Фикстура для создания тестового клиента FastAPI"""
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, AsyncMock
 from fastapi.testclient import TestClient
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
 from app.main import app
@@ -141,3 +141,293 @@ def test_optimize_cycles_csv(mock_optimize_cycles, mock_get_market_data):
     content = response.content.decode('utf-8')
     assert "Cycle;Date;Charge_Start" in content
     assert "1;01.01.2023;01:00" in content
+
+def test_orjson_response_payload():
+    """Однопроходный ORJSON ответ совпадает с прежней сериализацией через CustomJSONEncoder"""
+    import numpy as np
+    from app.api.responses import ORJSONResponse
+    from app.schemas.optimization import OptimizationCycle
+    
+    cycle = OptimizationCycle(
+        cycle=1, date="01.01.2023", charge_start="3:00", charge_end="4:00",
+        discharge_start="8:00", discharge_end="9:00", charge_price=0.125,
+        discharge_price=0.28, profit=15.5, profit_after_losses=13.175
+    )
+    content = {
+        "cycles": [cycle, cycle],
+        "generated": datetime(2023, 1, 1, 12, 30, 15),
+        "total_profit": np.float64(31.0),
+        "message": "Daten über die Netztransparenz API",
+        "is_test_data": False
+    }
+    
+    response = ORJSONResponse(content=content)
+    
+    # Payload of the former json.dumps(content, cls=CustomJSONEncoder)
+    expected_cycle = {
+        "cycle": 1, "date": "01.01.2023", "charge_hour": 3, "discharge_hour": 8,
+        "charge_start": "3:00", "charge_end": "4:00", "discharge_start": "8:00", "discharge_end": "9:00",
+        "charge_price": 0.125, "discharge_price": 0.28, "profit": 15.5, "profit_after_losses": 13.175
+    }
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {
+        "cycles": [expected_cycle, expected_cycle],
+        "generated": "2023-01-01T12:30:15",
+        "total_profit": 31.0,
+        "message": "Daten über die Netztransparenz API",
+        "is_test_data": False
+    }
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    """Каждый тест начинается с пустого кеша результатов оптимизации"""
+    from app.services.result_cache import result_cache
+    result_cache.clear()
+    yield
+    result_cache.clear()
+
+async def _deterministic_prices(start_date, end_date):
+    """Детерминированные почасовые цены за период"""
+    import numpy as np
+    from app.schemas.market_frame import MarketData
+    first_day = start_date.date().toordinal()
+    days = np.repeat(np.arange(first_day, end_date.date().toordinal() + 1), 24)
+    hours = np.tile(np.arange(24), len(days) // 24)
+    prices = 5.0 + (days * 7 + hours * hours * 3) % 23 + 0.25 * (hours % 4)
+    return MarketData(days, hours, prices)
+
+@pytest.fixture
+def deterministic_test_data(monkeypatch):
+    """Подменяет генератор тестовых данных детерминированными ценами"""
+    from app.services.market_data import market_service
+    monkeypatch.setattr(market_service, "generate_test_data", _deterministic_prices)
+
+@pytest.fixture
+def deterministic_api_data(monkeypatch):
+    """Подменяет загрузку из API детерминированными ценами, опубликованными до published_until"""
+    from app.services.market_data import market_service
+    published = {"until": datetime(2100, 1, 1)}
+    
+    async def get_market_data(start_date, end_date):
+        return await _deterministic_prices(start_date, min(end_date, published["until"]))
+    
+    monkeypatch.setattr(market_service, "get_market_data", get_market_data)
+    return published
+
+def test_optimize_stream_matches_buffered_endpoints(deterministic_test_data):
+    """Потоковые NDJSON/CSV ответы совпадают с /optimize и /optimize-csv"""
+    query = "start_date=2023-01-01T00:00:00&end_date=2023-03-15T00:00:00&use_test_data=true&max_cycles_per_day=2"
+    
+    ndjson = client.post(f"/api/v1/optimization/optimize-stream?{query}")
+    buffered = client.post(f"/api/v1/optimization/optimize?{query}")
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert ndjson.headers["x-test-data"] == "true"
+    cycles = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert len(cycles) > 74
+    assert cycles == buffered.json()["cycles"]
+    
+    csv_stream = client.post(f"/api/v1/optimization/optimize-stream?{query}&format=csv")
+    csv_buffered = client.post(f"/api/v1/optimization/optimize-csv?{query}")
+    assert csv_stream.headers["content-type"].startswith("text/csv")
+    assert csv_stream.text == csv_buffered.text
+
+def test_market_data_stream(deterministic_test_data):
+    """Потоковая выгрузка рыночных данных в NDJSON и CSV"""
+    query = "start_date=2023-01-01T00:00:00&end_date=2023-01-03T00:00:00&use_test_data=true"
+    
+    ndjson = client.get(f"/api/v1/market-data/stream?{query}")
+    records = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert records == client.get(f"/api/v1/market-data/?{query}").json()["data"]
+    
+    lines = client.get(f"/api/v1/market-data/stream?{query}&format=csv").text.splitlines()
+    assert lines[0] == "Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh"
+    assert len(lines) == 1 + 3 * 24
+    assert lines[1] == f"01.01.2023;00:00;;01:00;;{str(records[0]['price_ct_kwh']).replace('.', ',')}"
+
+def test_upload_csv_streamed_with_limits(monkeypatch):
+    """Загруженный CSV оптимизируется по дням; слишком большой файл отклоняется с 413"""
+    from app.core.config import settings
+    from app.services.market_data import market_service
+    from app.services.optimizer import OptimizerService
+    lines = ["Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh"]
+    for day in range(1, 4):
+        lines += [f"0{day}.01.2023;{hour}:00;CET;{hour + 1}:00;CET;{(day + hour * 5) % 17},5" for hour in range(24)]
+    content = "\n".join(lines)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_BYTES", 100)
+    
+    response = client.post("/api/v1/optimization/upload-csv-download", files={"file": ("prices.csv", content)}, data={"max_cycles_per_day": "2"})
+    assert response.status_code == 200
+    expected = OptimizerService().process_data(market_service.parse_csv_data(content), max_cycles_per_day=2)
+    assert response.text == OptimizerService().to_csv(expected)
+    
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", len(content) - 1)
+    response = client.post("/api/v1/optimization/upload-csv", files={"file": ("prices.csv", content)})
+    assert response.status_code == 413
+    
+    response = client.post("/api/v1/optimization/upload-csv", files={"file": ("empty.csv", "Datum;von\n")})
+    assert response.status_code == 400
+
+def test_optimization_results_cached(deterministic_api_data):
+    """Повторный запрос (с любым порогом) отдается из кеша результатов до изменения цен его дней"""
+    from app.services.result_cache import result_cache
+    query = "start_date=2023-01-01T00:00:00&end_date=2023-01-31T00:00:00&use_test_data=false"
+    
+    first = client.post(f"/api/v1/optimization/optimize?{query}")
+    second = client.post(f"/api/v1/optimization/optimize?{query}")
+    csv_response = client.post(f"/api/v1/optimization/optimize-csv?{query}")
+    other_threshold = client.post(f"/api/v1/optimization/optimize?{query}&threshold=5")
+    
+    assert [first.headers["x-cache"], second.headers["x-cache"]] == ["MISS", "HIT"]
+    assert second.json() == first.json()
+    assert csv_response.headers["x-cache"] == "HIT"
+    # The cached cycle index answers every threshold
+    assert other_threshold.headers["x-cache"] == "HIT"
+    assert other_threshold.json()["cycles"] == [
+        dict(cycle, cycle=number)
+        for number, cycle in enumerate((cycle for cycle in first.json()["cycles"] if cycle["profit"] > 5), start=1)
+    ]
+    
+    result_cache.invalidate_days([datetime(2023, 1, 15).toordinal()])
+    assert client.post(f"/api/v1/optimization/optimize?{query}").headers["x-cache"] == "MISS"
+
+def test_optimization_results_not_cached_for_test_or_incomplete_data(deterministic_test_data, deterministic_api_data):
+    """Результаты по тестовым данным и по периодам с еще не опубликованными днями не кешируются"""
+    test_query = "start_date=2023-01-01T00:00:00&end_date=2023-01-31T00:00:00&use_test_data=true"
+    assert [client.post(f"/api/v1/optimization/optimize?{test_query}").headers["x-cache"] for _ in range(2)] == ["MISS", "MISS"]
+    
+    deterministic_api_data["until"] = datetime(2023, 1, 20)
+    api_query = "start_date=2023-01-01T00:00:00&end_date=2023-01-31T00:00:00&use_test_data=false"
+    assert [client.post(f"/api/v1/optimization/optimize?{api_query}").headers["x-cache"] for _ in range(2)] == ["MISS", "MISS"]
+
+def test_threshold_sweep(deterministic_test_data):
+    """Число циклов и суммарная прибыль для нескольких порогов совпадают с /optimize"""
+    query = "start_date=2023-01-01T00:00:00&end_date=2023-01-31T00:00:00&use_test_data=true"
+    
+    response = client.post(f"/api/v1/optimization/threshold-sweep?{query}&thresholds=0&thresholds=5&thresholds=1000")
+    
+    assert response.status_code == 200
+    summaries = response.json()["thresholds"]
+    assert [summary["threshold"] for summary in summaries] == [0, 5, 1000]
+    for summary in summaries:
+        cycles = client.post(f"/api/v1/optimization/optimize?{query}&threshold={summary['threshold']}").json()["cycles"]
+        assert summary["cycles"] == len(cycles)
+        assert summary["total_profit"] == pytest.approx(sum(cycle["profit"] for cycle in cycles))
+    assert summaries[-1]["cycles"] == 0
+
+def test_rolling_window_refresh_and_delta(deterministic_api_data, monkeypatch):
+    """Обновление скользящего окна и запрос изменений с версии"""
+    from app.api.endpoints import optimization
+    from app.services.rolling import RollingOptimizer
+    monkeypatch.setattr(optimization, "rolling_optimizer", RollingOptimizer(window_days=7))
+    
+    refreshed = client.post("/api/v1/optimization/rolling/refresh?use_test_data=false").json()
+    unchanged = client.post("/api/v1/optimization/rolling/refresh?use_test_data=false").json()
+    delta = client.get("/api/v1/optimization/rolling/delta?since=0").json()
+    
+    assert (refreshed["version"], refreshed["changed_days"], refreshed["summary"]["days"]) == (1, 7, 7)
+    assert (unchanged["version"], unchanged["changed_days"]) == (1, 0)
+    assert len(delta["days"]) == 7
+    assert delta["summary"]["cycles"] == sum(len(day["cycles"]) for day in delta["days"])
+    # Cycles in the format of /optimize
+    start_date, end_date = optimization.rolling_window_range()
+    query = f"start_date={start_date.isoformat()}&end_date={end_date.isoformat()}&use_test_data=false"
+    cycles = client.post(f"/api/v1/optimization/optimize?{query}").json()["cycles"]
+    window_cycles = [cycle for day in delta["days"] for cycle in day["cycles"]]
+    assert [dict(cycle, cycle=None) for cycle in window_cycles] == [dict(cycle, cycle=None) for cycle in cycles]
+    assert client.get("/api/v1/optimization/rolling/delta?since=1").json()["days"] == []
+    assert client.get("/api/v1/optimization/rolling/delta?since=5").status_code == 400
+    
+    sweep = client.get("/api/v1/optimization/rolling/threshold-sweep?thresholds=0&thresholds=1000").json()
+    assert sweep["version"] == 1
+    assert [summary["cycles"] for summary in sweep["thresholds"]] == [delta["summary"]["cycles"], 0]
+
+def test_rolling_window_refresh_rejects_test_data(deterministic_api_data, monkeypatch):
+    """Тестовые данные не попадают в общее скользящее окно"""
+    from app.api.endpoints import optimization
+    from app.services.rolling import RollingOptimizer
+    monkeypatch.setattr(optimization, "rolling_optimizer", RollingOptimizer(window_days=7))
+    client.post("/api/v1/optimization/rolling/refresh?use_test_data=false")
+    before = client.get("/api/v1/optimization/rolling/delta?since=0").json()
+    
+    response = client.post("/api/v1/optimization/rolling/refresh?use_test_data=true")
+    
+    assert response.status_code == 400
+    assert optimization.rolling_optimizer.version == 1
+    assert client.get("/api/v1/optimization/rolling/delta?since=0").json() == before
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_caches(monkeypatch):
+    """Фоновая загрузка кеширует окно до завтрашнего дня и индексы циклов"""
+    from app.api.endpoints import optimization
+    from app.services.market_data import market_service
+    from app.services.result_cache import result_cache
+    from app.services.rolling import RollingOptimizer
+    monkeypatch.setattr(optimization, "rolling_optimizer", RollingOptimizer(window_days=7))
+    requested = []
+    
+    async def get_market_data(start_date, end_date):
+        requested.append((start_date, end_date))
+        return await market_service.generate_test_data(start_date, end_date)
+    
+    monkeypatch.setattr(market_service, "get_market_data", get_market_data)
+    await optimization.prefetch_day_ahead()
+    
+    start_date, end_date = requested[0]
+    assert end_date.date() == datetime.now().date() + timedelta(days=1)
+    assert len(optimization.rolling_optimizer) == 7
+    assert result_cache.get(result_cache.make_key(start_date.date(), end_date.date(), 1)) is not None
+
+def test_market_data_fallback_reason_from_error_type(monkeypatch):
+    """Причина перехода на тестовые данные берется из типа ошибки API"""
+    from app.services.market_data import market_service
+    from app.services.upstream import CircuitOpenError
+    
+    async def get_market_data(start_date, end_date):
+        raise CircuitOpenError("The upstream API is unavailable")
+    
+    monkeypatch.setattr(market_service, "get_market_data", get_market_data)
+    response = client.get("/api/v1/market-data/?start_date=2023-01-01T00:00:00&end_date=2023-01-02T00:00:00")
+    
+    assert response.status_code == 200
+    assert response.headers["x-test-reason"] == "circuit_open"
+    assert response.json()["is_test_data"] is True
+
+def test_open_circuit_serves_cached_days(monkeypatch):
+    """При открытой цепи закешированные дни сохраняются, тестовые данные только для недостающих"""
+    import asyncio
+    from app.services.market_data import PartialMarketDataError, market_service
+    
+    async def get_market_data(start_date, end_date):
+        cached = await _deterministic_prices(start_date, datetime(2023, 1, 2))
+        raise PartialMarketDataError("The upstream API is unavailable", cached, [datetime(2023, 1, 3).date()])
+    
+    monkeypatch.setattr(market_service, "get_market_data", get_market_data)
+    query = "start_date=2023-01-01T00:00:00&end_date=2023-01-03T00:00:00&use_test_data=false"
+    market_data = client.get(f"/api/v1/market-data/?{query}")
+    optimized = client.post(f"/api/v1/optimization/optimize?{query}")
+    
+    assert market_data.headers["x-test-data"] == "true"
+    assert market_data.headers["x-test-reason"] == "circuit_open"
+    records = market_data.json()["data"]
+    cached = asyncio.run(_deterministic_prices(datetime(2023, 1, 1), datetime(2023, 1, 2)))
+    assert len(records) == 3 * 24
+    assert records[:48] == json.loads(json.dumps(cached.to_records(), default=str))
+    assert optimized.headers["x-test-data"] == "true"
+    assert optimized.headers["x-cache"] == "MISS"
+    assert [cycle["date"] for cycle in optimized.json()["cycles"]][:2] == ["01.01.2023", "02.01.2023"]
+
+def test_saturated_worker_pool_returns_429(deterministic_test_data, monkeypatch):
+    """Перегруженный пул вычислений отвечает 429, метрики доступны"""
+    from app.services.workers import WorkerPoolBusyError, worker_pool
+    
+    async def busy(func, *args, **kwargs):
+        raise WorkerPoolBusyError("All workers are busy")
+    
+    monkeypatch.setattr(worker_pool, "run", busy)
+    response = client.post("/api/v1/optimization/optimize?start_date=2023-01-01T00:00:00&end_date=2023-01-31T00:00:00&use_test_data=true")
+    
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    metrics = client.get("/api/v1/system/metrics").json()
+    assert set(metrics) == {"event_loop_lag", "worker_pool", "result_cache", "upstream"}
@@ -0,0 +1,83 @@
+import pytest
+
+from app.schemas.optimization import BatteryParameters
+from app.services.dispatch import DispatchService
+
+@pytest.fixture
+def dispatch_service():
+    """Фикстура для создания сервиса диспетчеризации"""
+    return DispatchService()
+
+def _day(date, prices):
+    return [
+        {"date": date, "hour": hour, "price_ct_kwh": price * 100, "price_eur": price}
+        for hour, price in enumerate(prices)
+    ]
+
+def test_dispatch_respects_power_limit(dispatch_service):
+    """Заряд ограничен мощностью, разряд — емкостью накопителя"""
+    battery = BatteryParameters(capacity_kwh=100, charge_power_kw=50, discharge_power_kw=100, round_trip_efficiency=1.0)
+    
+    days = dispatch_service.process_data(_day("01.01.2023", [0.10, 0.30, 0.05, 0.40]), battery, include_schedule=True)
+    
+    assert len(days) == 1
+    day = days[0]
+    assert [slot["grid_kwh"] for slot in day["schedule"]] == [50.0, 0.0, 50.0, -100.0]
+    assert day["profit"] == pytest.approx(0.40 * 100 - 0.10 * 50 - 0.05 * 50)
+    assert day["equivalent_cycles"] == pytest.approx(1.0)
+
+def test_dispatch_efficiency_and_degradation(dispatch_service):
+    """Потери КПД и стоимость деградации уменьшают прибыль"""
+    battery = BatteryParameters(
+        capacity_kwh=100, charge_power_kw=200, discharge_power_kw=100,
+        round_trip_efficiency=0.81, degradation_cost_per_cycle=2.0
+    )
+    
+    day = dispatch_service.process_data(_day("01.01.2023", [0.10, 0.30]), battery)[0]
+    
+    assert day["charged_kwh"] == pytest.approx(100 / 0.9)
+    assert day["discharged_kwh"] == pytest.approx(90.0)
+    assert day["profit"] == pytest.approx(0.30 * 90 - 0.10 * 100 / 0.9 - 2.0)
+
+def test_continuous_mode_carries_energy_over_days(dispatch_service):
+    """В непрерывном режиме энергия переносится через границу суток"""
+    battery = BatteryParameters(capacity_kwh=100, charge_power_kw=100, discharge_power_kw=100, round_trip_efficiency=1.0)
+    data = _day("01.01.2023", [0.30, 0.05]) + _day("02.01.2023", [0.40, 0.35])
+    
+    daily = dispatch_service.process_data(data, battery, mode="daily")
+    continuous = dispatch_service.process_data(data, battery, mode="continuous")
+    
+    assert sum(day["profit"] for day in daily) == pytest.approx(0.0)
+    assert sum(day["profit"] for day in continuous) == pytest.approx(35.0)
+
+def test_continuous_mode_follows_date_order(dispatch_service):
+    """Непрерывный режим не зависит от порядка дней во входных данных"""
+    battery = BatteryParameters(capacity_kwh=100, charge_power_kw=100, discharge_power_kw=100, round_trip_efficiency=1.0)
+    first = _day("01.01.2023", [0.30, 0.05])
+    second = _day("02.01.2023", [0.40, 0.35])
+    
+    ordered = dispatch_service.process_data(first + second, battery, mode="continuous")
+    shuffled = dispatch_service.process_data(second + first, battery, mode="continuous")
+    
+    assert [day["date"] for day in shuffled] == ["01.01.2023", "02.01.2023"]
+    assert shuffled == ordered
+    assert sum(day["profit"] for day in shuffled) == pytest.approx(35.0)
+
+def test_dispatch_unknown_mode(dispatch_service):
+    """Неизвестный режим приводит к ошибке"""
+    with pytest.raises(ValueError):
+        dispatch_service.process_data(_day("01.01.2023", [0.1, 0.2]), mode="weekly")
+
+def test_quarter_hour_slots_limit_energy_per_slot(dispatch_service):
+    """Для 15-минутных цен мощность ограничивает энергию за слот четвертью часа"""
+    battery = BatteryParameters(capacity_kwh=100, charge_power_kw=100, discharge_power_kw=100, round_trip_efficiency=1.0)
+    data = [
+        {"date": "01.03.2023", "hour": slot // 4, "minute": slot % 4 * 15, "price_eur": price}
+        for slot, price in enumerate([0.10] * 4 + [0.30] * 4)
+    ]
+    
+    day = dispatch_service.process_data(data, battery, include_schedule=True)[0]
+    
+    assert [slot["grid_kwh"] for slot in day["schedule"]] == [25.0] * 4 + [-25.0] * 4
+    assert [(slot["hour"], slot["minute"]) for slot in day["schedule"][:2]] == [(0, 0), (0, 15)]
+    assert day["profit"] == pytest.approx(20.0)
@@ -1,10 +1,12 @@
 import pytest
 from unittest.mock import patch, AsyncMock
 from datetime import datetime
+import io
 import httpx
 
 from app.services.market_data import MarketDataService
 from app.schemas.market_data import MarketDataItem
+from app.schemas.market_frame import MarketData
 
 # Тестовые CSV данные
 TEST_CSV_CONTENT = """Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh
@@ -111,3 +113,490 @@ async def test_get_market_data_error(mock_get, market_data_service):
     
     # Проверяем текст исключения
     assert "Ошибка получения данных рынка" in str(excinfo.value)
+
+
+# Локальный сервер, имитирующий identity-сервер и API Netztransparenz
+import asyncio
+import pytest_asyncio
+from datetime import timedelta
+from aiohttp import web
+
+from app.core.config import settings
+
+class FakeUpstream:
+    """Отдает токен и почасовые цены за запрошенный период, считает запросы и соединения"""
+    
+    def __init__(self):
+        self.token_requests = 0
+        self.data_requests = []
+        self.connections = set()
+        self.fail_statuses = []
+        self.token_fail_statuses = []
+        self.delay = 0.0
+    
+    def _track(self, request):
+        self.connections.add(request.transport.get_extra_info("peername"))
+    
+    async def token(self, request):
+        self._track(request)
+        self.token_requests += 1
+        if self.token_fail_statuses:
+            return web.Response(status=self.token_fail_statuses.pop(0), text="Token error")
+        return web.json_response({"access_token": f"token-{self.token_requests}", "expires_in": 3600})
+    
+    async def data(self, request):
+        self._track(request)
+        start = datetime.strptime(request.match_info["start"], settings.API_DATETIME_FORMAT)
+        end = datetime.strptime(request.match_info["end"], settings.API_DATETIME_FORMAT)
+        self.data_requests.append((start.date(), end.date()))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail_statuses:
+            return web.Response(status=self.fail_statuses.pop(0), text="Upstream error")
+        
+        lines = ["Datum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh"]
+        day = start.date()
+        while day <= end.date():
+            for hour in range(24):
+                price = f"{day.day + hour / 10:.1f}".replace(".", ",")
+                lines.append(f"{day.strftime('%d.%m.%Y')};{hour:02d}:00;UTC;{(hour + 1) % 24:02d}:00;UTC;{price}")
+            day += timedelta(days=1)
+        return web.Response(text="\n".join(lines))
+
+@pytest_asyncio.fixture
+async def fake_upstream(monkeypatch):
+    """Запускает локальный сервер и направляет на него настройки API"""
+    upstream = FakeUpstream()
+    app = web.Application()
+    app.router.add_post("/token", upstream.token)
+    app.router.add_get("/data/{start}/{end}", upstream.data)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    
+    monkeypatch.setattr(settings, "TOKEN_URL", f"http://127.0.0.1:{port}/token")
+    monkeypatch.setattr(settings, "MARKET_API_URL", f"http://127.0.0.1:{port}/data")
+    monkeypatch.setattr(settings, "MARKET_CACHE_ENABLED", False)
+    yield upstream
+    await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_session_is_reused_between_requests(fake_upstream):
+    """Токен и данные запрашиваются через одно keep-alive соединение"""
+    service = MarketDataService()
+    try:
+        first = await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 2))
+        second = await service.get_market_data(datetime(2023, 1, 3), datetime(2023, 1, 3))
+    finally:
+        await service.close()
+    
+    assert len(first) == 48
+    assert len(second) == 24
+    assert fake_upstream.token_requests == 1
+    assert len(fake_upstream.data_requests) == 2
+    assert len(fake_upstream.connections) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_token_refresh(fake_upstream):
+    """Одновременные запросы с истекшим токеном вызывают одно обновление"""
+    import asyncio
+    service = MarketDataService()
+    try:
+        tokens = await asyncio.gather(*(service._get_token() for _ in range(10)))
+    finally:
+        await service.close()
+    
+    assert set(tokens) == {"token-1"}
+    assert fake_upstream.token_requests == 1
+
+@pytest.mark.asyncio
+async def test_token_refreshed_ahead_of_expiry(fake_upstream):
+    """Токен, истекающий в пределах запаса, обновляется в фоне без ожидания"""
+    import asyncio
+    import time
+    service = MarketDataService()
+    service._token = "old-token"
+    service._token_expiry = time.time() + settings.TOKEN_REFRESH_MARGIN / 2
+    try:
+        assert await service._get_token() == "old-token"
+        await service._token_task
+        assert await service._get_token() == "token-1"
+    finally:
+        await service.close()
+    
+    assert fake_upstream.token_requests == 1
+
+@pytest.mark.asyncio
+async def test_background_token_refresh_backs_off_and_stops(fake_upstream, monkeypatch):
+    """Фоновое обновление не запускается без учетных данных, повторяется с паузой и останавливается при отказе"""
+    monkeypatch.setattr(settings, "TOKEN_REFRESH_RETRY_DELAY", 0)
+    service = MarketDataService()
+    try:
+        monkeypatch.setattr(settings, "CLIENT_SECRET", "")
+        await service.start()
+        assert service._token_refresher is None
+        
+        monkeypatch.setattr(settings, "CLIENT_SECRET", "secret")
+        fake_upstream.token_fail_statuses = [503, 401]
+        await service.start()
+        await asyncio.wait_for(service._token_refresher, 1.0)
+    finally:
+        await service.close()
+    
+    assert fake_upstream.token_requests == 2
+    assert service._token is None
+
+@pytest.mark.asyncio
+async def test_cache_fetches_only_missing_days(fake_upstream, tmp_path):
+    """Кешированные дни не запрашиваются повторно, пропуски объединяются в диапазоны"""
+    from datetime import date
+    from app.services.market_cache import MarketDataCache
+    service = MarketDataService(cache=MarketDataCache(str(tmp_path / "cache.sqlite3")))
+    try:
+        await service.get_market_data(datetime(2023, 1, 3), datetime(2023, 1, 4))
+        await service.get_market_data(datetime(2023, 1, 7), datetime(2023, 1, 7))
+        result = (await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 8))).to_records()
+        repeated = (await service.get_market_data(datetime(2023, 1, 2), datetime(2023, 1, 7))).to_records()
+    finally:
+        await service.close()
+    
+    assert fake_upstream.data_requests == [
+        (date(2023, 1, 3), date(2023, 1, 4)),
+        (date(2023, 1, 7), date(2023, 1, 7)),
+        (date(2023, 1, 1), date(2023, 1, 2)),
+        (date(2023, 1, 5), date(2023, 1, 6)),
+        (date(2023, 1, 8), date(2023, 1, 8)),
+    ]
+    assert len(result) == 8 * 24
+    assert [item["date"] for item in result[::24]] == [f"0{day}.01.2023" for day in range(1, 9)]
+    assert result[24] == {"date": "02.01.2023", "hour": 0, "price_ct_kwh": 2.0, "price_eur": 0.02}
+    assert repeated == result[24:7 * 24]
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_fetches(fake_upstream):
+    """Одновременные запросы пересекающихся периодов ждут уже идущую загрузку, а не повторяют ее"""
+    import asyncio
+    from datetime import date
+    service = MarketDataService()
+    try:
+        results = await asyncio.gather(
+            service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 4)),
+            service.get_market_data(datetime(2023, 1, 3), datetime(2023, 1, 6)),
+            service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 4))
+        )
+    finally:
+        await service.close()
+    
+    assert fake_upstream.data_requests == [(date(2023, 1, 1), date(2023, 1, 4)), (date(2023, 1, 5), date(2023, 1, 6))]
+    assert results[2].to_records() == results[0].to_records()
+    assert [item["date"] for item in results[1].to_records()[::24]] == [f"0{day}.01.2023" for day in range(3, 7)]
+    assert service.fetch_stats == {"upstream_fetches": 2, "coalesced_fetches": 2, "coalesced_days": 6}
+    assert service._inflight == {}
+
+@pytest.mark.asyncio
+async def test_stream_shares_fetches_with_concurrent_requests(fake_upstream):
+    """Потоковая загрузка присоединяется к идущим загрузкам, а ее загрузки - к другим запросам"""
+    from datetime import date
+    fake_upstream.delay = 0.1
+    service = MarketDataService()
+    
+    async def stream(first, last):
+        return MarketData.concat([day_data async for day_data in service.stream_market_data(first, last)])
+    
+    try:
+        first, streamed, last = await asyncio.gather(
+            service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 4)),
+            stream(datetime(2023, 1, 3), datetime(2023, 1, 6)),
+            service.get_market_data(datetime(2023, 1, 5), datetime(2023, 1, 6))
+        )
+    finally:
+        await service.close()
+    
+    assert fake_upstream.data_requests == [(date(2023, 1, 1), date(2023, 1, 4)), (date(2023, 1, 5), date(2023, 1, 6))]
+    assert streamed.to_records() == first.to_records()[2 * 24:] + last.to_records()
+    assert service.fetch_stats == {"upstream_fetches": 2, "coalesced_fetches": 2, "coalesced_days": 4}
+    assert service._inflight == {}
+
+@pytest.mark.asyncio
+async def test_long_range_fetched_in_chunks_with_retries(fake_upstream, monkeypatch):
+    """Длинный период загружается окнами параллельно, неудачное окно повторяется"""
+    from datetime import date
+    monkeypatch.setattr(settings, "MARKET_FETCH_CHUNK_DAYS", 3)
+    monkeypatch.setattr(settings, "MARKET_FETCH_RETRY_DELAY", 0.0)
+    fake_upstream.fail_statuses = [503]
+    service = MarketDataService()
+    try:
+        result = (await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 8))).to_records()
+    finally:
+        await service.close()
+    
+    assert sorted(fake_upstream.data_requests[1:]) == [
+        (date(2023, 1, 1), date(2023, 1, 3)),
+        (date(2023, 1, 4), date(2023, 1, 6)),
+        (date(2023, 1, 7), date(2023, 1, 8)),
+    ]
+    assert len(fake_upstream.data_requests) == 4
+    assert len(result) == 8 * 24
+    assert [item["date"] for item in result[::24]] == [f"0{day}.01.2023" for day in range(1, 9)]
+
+@pytest.mark.asyncio
+async def test_upstream_failures_are_typed_and_open_the_circuit(fake_upstream, monkeypatch):
+    """Ошибки API типизированы, 404 не повторяется, после серии сбоев API не вызывается"""
+    from app.services.upstream import CircuitOpenError, UpstreamStatusError, UpstreamTimeoutError
+    monkeypatch.setattr(settings, "MARKET_FETCH_RETRY_DELAY", 0.0)
+    monkeypatch.setattr(settings, "UPSTREAM_ATTEMPT_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 3)
+    service = MarketDataService()
+    try:
+        fake_upstream.fail_statuses = [404]
+        with pytest.raises(UpstreamStatusError) as not_found:
+            await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 1))
+        assert (not_found.value.reason, len(fake_upstream.data_requests)) == ("api_not_found", 1)
+        
+        fake_upstream.delay = 1.0
+        with pytest.raises(UpstreamTimeoutError):
+            await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 1))
+        assert len(fake_upstream.data_requests) == 4
+        assert service.breaker.state == "open"
+        
+        with pytest.raises(CircuitOpenError):
+            await service.get_market_data(datetime(2023, 1, 2), datetime(2023, 1, 2))
+        assert len(fake_upstream.data_requests) == 4
+    finally:
+        await service.close()
+
+@pytest.mark.asyncio
+async def test_open_circuit_keeps_cached_days(fake_upstream, monkeypatch, tmp_path):
+    """При открытой цепи закешированные дни возвращаются вместе со списком недостающих"""
+    from datetime import date
+    from app.services.market_cache import MarketDataCache
+    from app.services.market_data import PartialMarketDataError
+    from app.services.upstream import CircuitOpenError, UpstreamTimeoutError
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 1)
+    service = MarketDataService(cache=MarketDataCache(str(tmp_path / "cache.sqlite3")))
+    try:
+        cached = await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 1))
+        service.breaker.record_failure(UpstreamTimeoutError("The upstream API does not answer"))
+        assert service.breaker.state == "open"
+        requests = len(fake_upstream.data_requests)
+        
+        with pytest.raises(PartialMarketDataError) as partial:
+            await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 3))
+        with pytest.raises(CircuitOpenError) as nothing_cached:
+            await service.get_market_data(datetime(2023, 1, 2), datetime(2023, 1, 2))
+        completed = await service.complete_with_test_data(partial.value.data, partial.value.missing_days)
+    finally:
+        await service.close()
+    
+    assert len(fake_upstream.data_requests) == requests
+    assert partial.value.data.to_records() == cached.to_records()
+    assert partial.value.missing_days == [date(2023, 1, 2), date(2023, 1, 3)]
+    assert not isinstance(nothing_cached.value, PartialMarketDataError)
+    assert completed.n_days == 3
+    assert completed.take(slice(0, 24)).to_records() == cached.to_records()
+
+@pytest.mark.asyncio
+async def test_stream_failures_are_retried_and_open_the_circuit(fake_upstream, monkeypatch):
+    """Потоковая загрузка повторяет окна с ограничением времени попытки и открывает цепь после серии сбоев"""
+    from app.services.upstream import CircuitOpenError, UpstreamTimeoutError
+    monkeypatch.setattr(settings, "MARKET_FETCH_RETRY_DELAY", 0.0)
+    monkeypatch.setattr(settings, "UPSTREAM_ATTEMPT_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 3)
+    service = MarketDataService()
+    try:
+        fake_upstream.fail_statuses = [503]
+        days = [day_data async for day_data in service.stream_market_data(datetime(2023, 1, 1), datetime(2023, 1, 2))]
+        assert [len(day_data) for day_data in days] == [24, 24]
+        assert len(fake_upstream.data_requests) == 2
+        
+        fake_upstream.delay = 1.0
+        with pytest.raises(UpstreamTimeoutError):
+            [day_data async for day_data in service.stream_market_data(datetime(2023, 1, 3), datetime(2023, 1, 3))]
+        assert len(fake_upstream.data_requests) == 5
+        assert service.breaker.state == "open"
+        
+        with pytest.raises(CircuitOpenError):
+            [day_data async for day_data in service.stream_market_data(datetime(2023, 1, 4), datetime(2023, 1, 4))]
+        assert len(fake_upstream.data_requests) == 5
+    finally:
+        await service.close()
+
+@pytest.mark.asyncio
+async def test_stream_market_data_matches_get_market_data(fake_upstream, monkeypatch, tmp_path):
+    """Потоковая загрузка отдает те же записи по порядку и кеширует дни"""
+    from app.services.market_cache import MarketDataCache
+    from app.services.optimizer import OptimizerService
+    monkeypatch.setattr(settings, "MARKET_FETCH_CHUNK_DAYS", 2)
+    monkeypatch.setattr(settings, "CSV_INGEST_CHUNK_BYTES", 100)
+    service = MarketDataService(cache=MarketDataCache(str(tmp_path / "cache.sqlite3")))
+    optimizer = OptimizerService()
+    try:
+        await service.get_market_data(datetime(2023, 1, 3), datetime(2023, 1, 3))
+        days = [day_data async for day_data in service.stream_market_data(datetime(2023, 1, 1), datetime(2023, 1, 5))]
+        requests_after_stream = len(fake_upstream.data_requests)
+        expected = await service.get_market_data(datetime(2023, 1, 1), datetime(2023, 1, 5))
+        cycles = [cycle async for cycle in optimizer.process_stream(service.stream_market_data(datetime(2023, 1, 1), datetime(2023, 1, 5)))]
+    finally:
+        await service.close()
+    
+    assert [len(day_data) for day_data in days] == [24] * 5
+    assert MarketData.concat(days).to_records() == expected.to_records()
+    assert requests_after_stream == len(fake_upstream.data_requests) == 3
+    assert cycles == optimizer.process_data(expected)
+
+def test_market_data_columns_round_trip():
+    """Колоночное представление сохраняет записи и принимает разные форматы дат"""
+    import numpy as np
+    records = [
+        {"date": "01.01.2023", "hour": 0, "price_ct_kwh": 20.0},
+        {"date": "2023-01-01", "hour": 1, "price_ct_kwh": 18.5},
+        {"date": datetime(2023, 1, 2, 5), "hour": 0, "price_eur": 0.125},
+        {"date": "not a date", "hour": 3, "price_ct_kwh": 1.0},
+    ]
+    data = MarketData.from_records(records)
+    
+    assert len(data) == 3
+    assert data.day.dtype == np.int32 and data.hour.dtype == np.int8 and data.price_ct_kwh.dtype == np.float64
+    assert [day for day, _ in data.iter_days()] == [datetime(2023, 1, 1).toordinal(), datetime(2023, 1, 2).toordinal()]
+    assert data.to_records() == [
+        {"date": "01.01.2023", "hour": 0, "price_ct_kwh": 20.0, "price_eur": 0.2},
+        {"date": "01.01.2023", "hour": 1, "price_ct_kwh": 18.5, "price_eur": 0.185},
+        {"date": "02.01.2023", "hour": 0, "price_ct_kwh": 12.5, "price_eur": 0.125},
+    ]
+
+class _ChunkedUpload:
+    """Имитация UploadFile: отдает содержимое порциями фиксированного размера"""
+    
+    def __init__(self, content: bytes):
+        self.stream = io.BytesIO(content)
+    
+    async def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+def _upload_csv(days: int) -> str:
+    lines = ["\ufeffDatum;von;Zeitzone von;bis;Zeitzone bis;Spotmarktpreis in ct/kWh (Börse)"]
+    for day in range(1, days + 1):
+        for hour in range(24):
+            lines.append(f"{day:02d}.03.2023;{hour:02d}:00;CET;{hour + 1:02d}:00;CET;{(day * 7 + hour * hour) % 23},{hour % 10}")
+    return "\r\n".join(lines) + "\r\n"
+
+@pytest.mark.asyncio
+async def test_csv_upload_parsed_in_chunks(market_data_service):
+    """Загрузка разбирается порциями (в т.ч. разрезанными посреди строки и символа) так же, как целиком"""
+    from app.services.optimizer import OptimizerService
+    content = _upload_csv(5)
+    expected = market_data_service.parse_csv_data(content.lstrip("\ufeff"))
+    
+    chunks = [chunk async for chunk in market_data_service.iter_csv_upload(_ChunkedUpload(content.encode("utf-8")), chunk_size=7)]
+    
+    assert len(chunks) > 5
+    assert MarketData.concat(chunks).to_records() == expected.to_records()
+    
+    optimizer = OptimizerService()
+    
+    async def replay():
+        for chunk in chunks:
+            yield chunk
+    
+    streamed = [cycle async for cycle in optimizer.process_stream(replay(), max_cycles_per_day=2)]
+    assert streamed == optimizer.process_data(expected, max_cycles_per_day=2)
+
+@pytest.mark.asyncio
+async def test_csv_upload_limits(market_data_service):
+    """Превышение лимита строк или размера прерывает разбор"""
+    from app.services.market_data import UploadTooLargeError
+    content = _upload_csv(2).encode("utf-8")
+    
+    with pytest.raises(UploadTooLargeError):
+        [chunk async for chunk in market_data_service.iter_csv_upload(_ChunkedUpload(content), max_rows=47)]
+    with pytest.raises(UploadTooLargeError):
+        [chunk async for chunk in market_data_service.iter_csv_upload(_ChunkedUpload(content), max_bytes=len(content) - 1)]
+    
+    chunks = [chunk async for chunk in market_data_service.iter_csv_upload(_ChunkedUpload(content), max_rows=48, max_bytes=len(content))]
+    assert sum(len(chunk) for chunk in chunks) == 48
+
+_INVALID_ROWS = (
+    "01.01.2023;0;CET;1;CET;20,5\n"
+    "\n"
+    "2023-01-01;01:00;CET;02:00;CET;-3,25\n"
+    "31.02.2023;2;CET;3;CET;1,0\n"
+    "01.01.2023;x;CET;4;CET;1,0\n"
+    "01.01.2023;4;CET;5;CET;n/a\n"
+    "01.01.2023;24:00;CET;24:15;CET;1,0\n"
+    "02.01.2023;0;CET;1;CET;1.000,5\n"
+    "02.01.2023;1;CET;2;CET;12\n"
+)
+
+@pytest.mark.parametrize("rows, expected_count", [
+    (_upload_csv(3).split("\r\n", 1)[1], 72),
+    (_INVALID_ROWS, 3),
+    # Строки с разным числом колонок разбираются построчно
+    (_INVALID_ROWS + "01.01.2023;5;CET\n01.01.2023;6;CET;7;CET;7,5;extra", 4),
+])
+def test_csv_ingest_engines_agree(rows, expected_count):
+    """Оба движка разбора CSV дают одинаковый результат и пропускают некорректные строки"""
+    from app.utils.csv_ingest import parse_price_rows
+    python_result = parse_price_rows(rows, engine="python")
+    pandas_result = parse_price_rows(rows, engine="pandas")
+    
+    assert pandas_result.to_records() == python_result.to_records()
+    assert len(python_result) == expected_count
+    with pytest.raises(ValueError):
+        parse_price_rows(rows, engine="unknown")
+
+@pytest.mark.parametrize("engine", ["python", "pandas"])
+def test_csv_columns_resolved_from_header(engine, monkeypatch):
+    """Колонки определяются по заголовку, все точки входа разбирают CSV одинаково"""
+    from app.utils.csv_handler import parse_csv
+    monkeypatch.setattr(settings, "CSV_INGEST_ENGINE", engine)
+    reordered = (
+        "Spotmarktpreis in ct/kWh (Börse);Zeitzone von;von;Datum\n"
+        "20,0;CET;00:00;01.01.2023\n"
+        "18,5;CET;01:00;2023-01-01\n"
+        "oops;CET;02:00;01.01.2023\n"
+    )
+    expected = [
+        {"date": "01.01.2023", "hour": 0, "price_ct_kwh": 20.0, "price_eur": 0.2},
+        {"date": "01.01.2023", "hour": 1, "price_ct_kwh": 18.5, "price_eur": 0.185},
+    ]
+    service = MarketDataService(cache=None)
+    
+    assert parse_csv(reordered).to_records() == expected
+    assert service.parse_csv_data(reordered).to_records() == expected
+    assert service._parse_csv_response(reordered).to_records() == expected
+    # Без заголовка с нужными колонками используется порядок колонок внешнего API
+    assert service.parse_csv_data(TEST_CSV_CONTENT.replace("Datum", "Date")).to_records()[:2] == [
+        {"date": "01.01.2023", "hour": 0, "price_ct_kwh": 20.0, "price_eur": 0.2},
+        {"date": "01.01.2023", "hour": 1, "price_ct_kwh": 18.5, "price_eur": 0.185},
+    ]
+    with pytest.raises(ValueError):
+        parse_csv(TEST_CSV_CONTENT.replace("Datum", "Date"))
+    with pytest.raises(ValueError):
+        parse_csv(TEST_CSV_CONTENT.split("\n")[0])
+
+@pytest.mark.parametrize("engine", ["python", "pandas"])
+def test_quarter_hour_prices_round_trip(engine, monkeypatch, tmp_path):
+    """15-минутные цены сохраняют минуты при разборе, выводе в CSV и в кеше"""
+    from app.services.market_cache import MarketDataCache
+    from app.utils.csv_handler import MARKET_DATA_CSV_HEADER, format_market_data_csv_rows
+    monkeypatch.setattr(settings, "CSV_INGEST_ENGINE", engine)
+    lines = [MARKET_DATA_CSV_HEADER.strip()]
+    for slot in range(96):
+        start, end = slot * 15, slot * 15 + 15
+        lines.append(f"02.01.2023;{start // 60:02d}:{start % 60:02d};CET;{end // 60:02d}:{end % 60:02d};CET;{slot % 7},25")
+    content = "\n".join(lines) + "\n"
+    
+    data = MarketDataService(cache=None).parse_csv_data(content)
+    
+    assert len(data) == 96 and not data.is_hourly
+    assert data.slot.tolist() == list(range(0, 1440, 15))
+    assert data.day_slot_minutes() == {datetime(2023, 1, 2).toordinal(): 15}
+    assert data.to_records()[5] == {"date": "02.01.2023", "hour": 1, "minute": 15, "price_ct_kwh": 5.25, "price_eur": 0.0525}
+    assert MARKET_DATA_CSV_HEADER + format_market_data_csv_rows(data) == content.replace("CET", "")
+    
+    cache = MarketDataCache(str(tmp_path / "cache.sqlite3"))
+    cache.put_days(data)
+    assert cache.get_days(datetime(2023, 1, 2).date(), datetime(2023, 1, 2).date()).to_records() == data.to_records()
+    cache.close()
@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.services.optimizer import OptimizerService
 
@@ -85,3 +85,170 @@ def test_find_alternate_cycle(optimizer_service, sample_market_data):
     assert min_item.price_eur == 0.125
     assert max_item.price_eur == 0.28
     assert min_item.hour < max_item.hour
+
+def _random_market_data(days=20, seed=1):
+    """Random hourly records in shuffled order with mixed date representations"""
+    import random
+    rng = random.Random(seed)
+    records = []
+    for day in range(days):
+        date = datetime(2023, 1, 1) + timedelta(days=day)
+        for hour in range(24):
+            price = round(rng.uniform(1.0, 30.0), 2)
+            records.append({
+                "date": date if hour % 2 else date.strftime("%Y-%m-%d"),
+                "hour": hour,
+                "price_ct_kwh": price,
+                "price_eur": price / 100.0
+            })
+    rng.shuffle(records)
+    return records
+
+@pytest.mark.parametrize("max_cycles", [1, 3])
+@pytest.mark.parametrize("threshold", [-5.0, 0.0, 5.0])
+def test_numpy_engine_matches_python_engine(optimizer_service, threshold, max_cycles):
+    """Пакетный NumPy-движок возвращает те же циклы, что и построчный"""
+    data = _random_market_data()
+    
+    expected = optimizer_service.process_data(data, threshold, engine="python", max_cycles_per_day=max_cycles)
+    result = optimizer_service.process_data(data, threshold, engine="numpy", max_cycles_per_day=max_cycles)
+    
+    assert result == expected
+
+def test_process_data_unknown_engine(optimizer_service):
+    """Неизвестный движок приводит к ошибке"""
+    with pytest.raises(ValueError):
+        optimizer_service.process_data(_random_market_data(days=1), engine="fortran")
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_max_spread_cycle_when_global_max_precedes_min(optimizer_service, engine):
+    """Цикл находится, даже если глобальный максимум дня раньше минимума"""
+    prices = [0.30, 0.10, 0.20, 0.05, 0.15, 0.02]
+    data = [
+        {"date": "01.01.2023", "hour": hour, "price_ct_kwh": price * 100, "price_eur": price}
+        for hour, price in enumerate(prices)
+    ]
+    
+    cycles = optimizer_service.process_data(data, engine=engine)
+    
+    assert len(cycles) == 1
+    assert cycles[0]["charge_start"] == "1:00"
+    assert cycles[0]["discharge_start"] == "2:00"
+    assert cycles[0]["profit"] == pytest.approx(10.0)
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_multiple_cycles_per_day(optimizer_service, engine):
+    """Находятся несколько непересекающихся циклов в течение дня"""
+    prices = [0.10, 0.30, 0.05, 0.25, 0.20, 0.40]
+    data = [
+        {"date": "01.01.2023", "hour": hour, "price_ct_kwh": price * 100, "price_eur": price}
+        for hour, price in enumerate(prices)
+    ]
+    
+    cycles = optimizer_service.process_data(data, engine=engine, max_cycles_per_day=2)
+    
+    assert [(c["charge_start"], c["discharge_start"]) for c in cycles] == [("0:00", "1:00"), ("2:00", "5:00")]
+    assert [c["cycle"] for c in cycles] == [1, 2]
+    assert sum(c["profit"] for c in cycles) == pytest.approx(55.0)
+
+def test_csv_format_is_stable(optimizer_service):
+    """CSV: разделитель ';', десятичная запятая и округление как у str(round(...))"""
+    import io
+    from app.utils.csv_handler import write_cycles_csv
+    cycles = [
+        {"cycle": 1, "date": datetime(2023, 1, 1), "charge_start": "3:00", "charge_end": "4:00",
+         "discharge_start": "8:00", "discharge_end": "9:00",
+         "charge_price": 0.12345, "discharge_price": 2.675, "profit": 256.255},
+        {"cycle": 2, "date": "02.01.2023", "charge_start": "1:00", "charge_end": "2:00",
+         "discharge_start": "18:00", "discharge_end": "19:00",
+         "charge_price": -0.00001, "discharge_price": 5, "profit": 1e-07},
+    ]
+    
+    csv_content = optimizer_service.to_csv(cycles)
+    
+    assert csv_content == (
+        "Cycle;Date;Charge_Start;Charge_End;Discharge_Start;Discharge_End;Charge_Price;Discharge_Price;Profit (EUR)\n"
+        "1;01.01.2023;3:00;4:00;8:00;9:00;0,1235;2,675;256,25\n"
+        "2;02.01.2023;1:00;2:00;18:00;19:00;-0,0;5;0,0\n"
+    )
+    out = io.StringIO()
+    assert write_cycles_csv(iter(cycles), out) == 2
+    assert out.getvalue() == csv_content
+    assert optimizer_service.to_csv([]).endswith(";Profit\n")
+
+def test_dates_normalized_once_per_distinct_value(optimizer_service):
+    """Даты разбираются один раз на каждое значение и выводятся в формате DD.MM.YYYY"""
+    from app.utils.dates import format_day_ordinal, parse_day_ordinal
+    parse_day_ordinal.cache_clear()
+    format_day_ordinal.cache_clear()
+    cycle = {
+        "cycle": 1, "charge_start": "1:00", "charge_end": "2:00", "discharge_start": "5:00", "discharge_end": "6:00",
+        "charge_price": 0.1, "discharge_price": 0.2, "profit": 10.0, "profit_after_losses": 8.5
+    }
+    dates = ["2023-01-02", datetime(2023, 1, 2, 5), "02.01.2023", "2023-01-02"] * 24
+    
+    response = optimizer_service.to_optimization_response([dict(cycle, date=value) for value in dates])
+    
+    assert {item.date for item in response} == {"02.01.2023"}
+    assert parse_day_ordinal.cache_info().misses == 2
+    assert format_day_ordinal.cache_info().misses == 1
+    assert optimizer_service.to_optimization_response([dict(cycle, date="2023-01-02T00:00:00")])[0].date == "2023-01-02T00:00:00"
+
+def _quarter_hour_market_data(days=5, seed=2):
+    """Random 15-minute records (96 slots per day) in shuffled order"""
+    import random
+    rng = random.Random(seed)
+    records = []
+    for day in range(days):
+        date = (datetime(2023, 3, 1) + timedelta(days=day)).strftime("%d.%m.%Y")
+        for slot in range(96):
+            price = round(rng.uniform(1.0, 30.0), 2)
+            records.append({"date": date, "hour": slot // 4, "minute": slot % 4 * 15, "price_ct_kwh": price})
+    rng.shuffle(records)
+    return records
+
+@pytest.mark.parametrize("max_cycles", [1, 3])
+def test_quarter_hour_cycles(optimizer_service, max_cycles):
+    """Циклы на 15-минутных данных: оба движка совпадают, интервалы по 15 минут"""
+    data = _quarter_hour_market_data()
+    
+    expected = optimizer_service.process_data(data, engine="python", max_cycles_per_day=max_cycles)
+    result = optimizer_service.process_data(data, engine="numpy", max_cycles_per_day=max_cycles)
+    
+    assert result == expected
+    assert len(result) >= 5
+    for cycle in result:
+        hour, minute = map(int, cycle["charge_start"].split(":"))
+        end_hour, end_minute = map(int, cycle["charge_end"].split(":"))
+        assert minute in (0, 15, 30, 45)
+        assert end_hour * 60 + end_minute == hour * 60 + minute + 15
+
+def test_quarter_hour_last_slot_ends_at_midnight(optimizer_service):
+    """Последний 15-минутный слот дня заканчивается в 24:00"""
+    prices = {(0, 0): 0.05, (12, 30): 0.20, (23, 45): 0.40}
+    data = [
+        {"date": "01.03.2023", "hour": hour, "minute": minute, "price_ct_kwh": prices.get((hour, minute), 0.10) * 100}
+        for hour in range(24) for minute in (0, 15, 30, 45)
+    ]
+    
+    cycle = optimizer_service.process_data(data)[0]
+    
+    assert (cycle["charge_start"], cycle["charge_end"]) == ("0:00", "0:15")
+    assert (cycle["discharge_start"], cycle["discharge_end"]) == ("23:45", "24:00")
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+@pytest.mark.parametrize("max_cycles", [1, 3])
+def test_cycle_index_matches_threshold_runs(optimizer_service, engine, max_cycles):
+    """Индекс циклов без порога отвечает на любой порог так же, как отдельный запуск"""
+    data = _quarter_hour_market_data()
+    thresholds = [-100.0, 0.0, 5.0, 12.5, 20.0, 1000.0]
+    
+    index = optimizer_service.build_cycle_index(data, engine=engine, max_cycles_per_day=max_cycles)
+    summaries = index.summarize(thresholds)
+    
+    for threshold, summary in zip(thresholds, summaries):
+        expected = optimizer_service.process_data(data, threshold, engine=engine, max_cycles_per_day=max_cycles)
+        assert index.cycles(threshold) == expected
+        assert index.count(threshold) == summary["cycles"] == len(expected)
+        assert summary["total_profit"] == pytest.approx(sum(cycle["profit"] for cycle in expected))
+        assert summary["total_profit_after_losses"] == pytest.approx(sum(cycle["profit_after_losses"] for cycle in expected))
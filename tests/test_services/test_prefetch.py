@@ -0,0 +1,60 @@
+import pytest
+from datetime import datetime
+
+import app.services.prefetch as prefetch_module
+from app.services.prefetch import PrefetchScheduler
+
+async def _noop():
+    pass
+
+def test_next_run_time():
+    """Следующий запуск: сегодня до времени запуска, иначе завтра или сразу при догоняющем запуске"""
+    scheduler = PrefetchScheduler(_noop, 13 * 60 + 30)
+    
+    assert scheduler.next_run(datetime(2023, 3, 1, 9, 0)) == datetime(2023, 3, 1, 13, 30)
+    assert scheduler.next_run(datetime(2023, 3, 1, 13, 30)) == datetime(2023, 3, 2, 13, 30)
+    assert scheduler.next_run(datetime(2023, 3, 1, 20, 0), catch_up=True) == datetime(2023, 3, 1, 20, 0)
+    assert scheduler.next_run(datetime(2023, 3, 1, 9, 0), catch_up=True) == datetime(2023, 3, 1, 13, 30)
+
+@pytest.mark.asyncio
+async def test_run_retries_with_backoff(monkeypatch):
+    """Неудачная загрузка повторяется с удваивающейся паузой"""
+    delays = []
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(prefetch_module.asyncio, "sleep", sleep)
+    
+    attempts = []
+    async def job():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Exception("Prices are not published yet")
+    
+    scheduler = PrefetchScheduler(job, 0, retries=3, retry_delay=10.0)
+    assert await scheduler.run()
+    assert delays == [10.0, 20.0]
+    assert scheduler.status()["last_error"] is None
+    
+    attempts.clear()
+    delays.clear()
+    scheduler.retries = 1
+    assert not await scheduler.run()
+    assert delays == [10.0]
+    assert scheduler.status()["runs"] == 2
+    assert scheduler.status()["failures"] == 1
+    assert scheduler.status()["last_error"] == "Prices are not published yet"
+
+@pytest.mark.asyncio
+async def test_catch_up_skipped_when_current():
+    """Догоняющий запуск после перезапуска пропускается, если данные уже загружены"""
+    async def current():
+        return True
+    async def missing():
+        return False
+    async def failing():
+        raise Exception("Cache is not available")
+    
+    assert not await PrefetchScheduler(_noop, 0, is_current=current)._needs_catch_up()
+    assert await PrefetchScheduler(_noop, 0, is_current=missing)._needs_catch_up()
+    assert await PrefetchScheduler(_noop, 0, is_current=failing)._needs_catch_up()
+    assert await PrefetchScheduler(_noop, 0)._needs_catch_up()
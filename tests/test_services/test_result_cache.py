@@ -0,0 +1,58 @@
+import pytest
+from datetime import date
+
+from app.schemas.market_frame import MarketData
+from app.services.cycle_index import CycleIndex
+from app.services.market_cache import MarketDataCache
+from app.services.result_cache import OptimizationResultCache
+
+def _put(cache, first_day, last_day, max_cycles_per_day=1):
+    key = cache.make_key(first_day, last_day, max_cycles_per_day)
+    cache.put(key, first_day, last_day, CycleIndex([]), "test", cache.generation)
+    return key
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    """Вытесняется давно не использованный результат, устаревший результат не возвращается"""
+    import app.services.result_cache as result_cache_module
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "monotonic", lambda: now[0])
+    cache = OptimizationResultCache(max_entries=2, ttl_seconds=60)
+    
+    first = _put(cache, date(2023, 1, 1), date(2023, 1, 31))
+    second = _put(cache, date(2023, 2, 1), date(2023, 2, 28))
+    assert cache.get(first) is not None
+    third = _put(cache, date(2023, 3, 1), date(2023, 3, 31))
+    
+    assert cache.get(second) is None
+    assert cache.get(first).message == "test"
+    now[0] += 61
+    assert cache.get(third) is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 2, "evictions": 1, "invalidations": 0}
+
+def test_key_normalizes_parameters():
+    """Ключ не зависит от типа параметров, но различает число циклов в день"""
+    make_key = OptimizationResultCache.make_key
+    assert make_key(date(2023, 1, 1), date(2023, 1, 2), 1) == make_key(date(2023, 1, 1), date(2023, 1, 2), 1.0)
+    assert make_key(date(2023, 1, 1), date(2023, 1, 2), 1) != make_key(date(2023, 1, 1), date(2023, 1, 2), 2)
+
+def test_changed_market_data_invalidates_results(tmp_path):
+    """Изменение цен дня в кеше рыночных данных сбрасывает результаты, включающие этот день"""
+    cache = OptimizationResultCache(max_entries=10, ttl_seconds=60)
+    market_cache = MarketDataCache(str(tmp_path / "cache.sqlite3"))
+    market_cache.add_listener(cache.invalidate_days)
+    january = _put(cache, date(2023, 1, 1), date(2023, 1, 31))
+    february = _put(cache, date(2023, 2, 1), date(2023, 2, 28))
+    
+    generation = cache.generation
+    market_cache.put_days(MarketData([date(2023, 2, 10).toordinal()] * 2, [0, 1], [1.0, 2.0]))
+    
+    assert cache.get(january) is not None
+    assert cache.get(february) is None
+    # A result computed from the data before the change is not stored
+    key = cache.make_key(date(2023, 2, 1), date(2023, 2, 28), 1)
+    cache.put(key, date(2023, 2, 1), date(2023, 2, 28), CycleIndex([]), "stale", generation)
+    assert cache.get(key) is None
+    
+    market_cache.clear()
+    assert len(cache) == 0
+    market_cache.close()
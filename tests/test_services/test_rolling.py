@@ -0,0 +1,126 @@
+import math
+import pytest
+import numpy as np
+
+from app.schemas.market_frame import MarketData
+from app.services.cycle_index import CycleIndex
+from app.services.optimizer import OptimizerService
+from app.services.rolling import RollingOptimizer
+
+FIRST_DAY = 738521  # 01.01.2023
+
+def _days(first, count, shift=0.0):
+    """Hourly prices of count days starting at day first (offset from FIRST_DAY)"""
+    days = np.repeat(np.arange(FIRST_DAY + first, FIRST_DAY + first + count), 24)
+    hours = np.tile(np.arange(24), count)
+    prices = 5.0 + (days * 7 + hours * hours * 3) % 23 + shift
+    return MarketData(days, hours, prices)
+
+@pytest.fixture
+def rolling():
+    return RollingOptimizer(window_days=10, max_cycles_per_day=2, history_size=3)
+
+def test_incremental_updates_match_full_run(rolling):
+    """Окно, собранное по дням, совпадает с полным расчетом по последним дням"""
+    optimized_days = []
+    cycles_by_day = rolling.optimizer.cycles_by_day
+    def counting(data, *args, **kwargs):
+        optimized_days.append(data.n_days)
+        return cycles_by_day(data, *args, **kwargs)
+    rolling.optimizer.cycles_by_day = counting
+    
+    rolling.update(_days(0, 8))
+    for day in range(8, 14):
+        rolling.update(MarketData.concat([_days(day - 3, 3), _days(day, 1)]))
+    
+    # Only the new day is optimized, repeated days with the same prices are skipped
+    assert optimized_days == [8] + [1] * 6
+    expected = OptimizerService().process_data(_days(4, 10), max_cycles_per_day=2)
+    window_cycles = [cycle for day in rolling.delta(0)["days"] for cycle in day["cycles"]]
+    assert [dict(cycle, cycle=number) for number, cycle in enumerate(window_cycles, start=1)] == expected
+    summary = rolling.summary()
+    assert (summary["days"], summary["first_day"], summary["last_day"]) == (10, "05.01.2023", "14.01.2023")
+    assert summary["cycles"] == len(expected)
+    assert summary["total_profit"] == pytest.approx(sum(cycle["profit"] for cycle in expected))
+    assert rolling.summarize([0.0, 5.0]) == [
+        pytest.approx(summary) for summary in CycleIndex(expected).summarize([0.0, 5.0])
+    ]
+
+def test_summarize_negative_thresholds_match_period_index():
+    """Суммы окна для отрицательных порогов совпадают с индексом циклов того же периода"""
+    rolling = RollingOptimizer(window_days=10)
+    # Falling prices: the best cycle of the last day loses money
+    falling = MarketData(np.full(24, FIRST_DAY + 5), np.arange(24), 30.0 - np.arange(24.0))
+    data = MarketData.concat([_days(0, 5), falling])
+    rolling.update(data)
+    
+    thresholds = [-100.0, -5.0, 0.0, 5.0]
+    expected = OptimizerService().build_cycle_index(data).summarize(thresholds)
+    summaries = rolling.summarize(thresholds)
+    assert summaries == [pytest.approx(summary) for summary in expected]
+    assert summaries[0]["cycles"] > summaries[2]["cycles"]
+    # The cycles of the window keep the threshold of the optimizer
+    assert rolling.summary()["cycles"] == summaries[2]["cycles"]
+
+@pytest.mark.asyncio
+async def test_update_async_optimizes_again_in_executor(rolling):
+    """Если окно изменилось во время расчета, дни пересчитываются в исполнителе, а не в вызывающем потоке"""
+    rolling.update(_days(0, 5))
+    optimize = rolling.optimizer.cycles_by_day
+    def inline(*args, **kwargs):
+        raise AssertionError("Days optimized in the calling thread")
+    rolling.optimizer.cycles_by_day = inline
+    
+    async def run(func, *args, **kwargs):
+        return optimize(*args, **kwargs)
+    
+    optimized_days = []
+    async def executor(func, *args, **kwargs):
+        optimized_days.append(args[0].n_days)
+        if len(optimized_days) == 1:
+            # Another refresh changes the window while the days are optimized
+            await rolling.update_async(_days(4, 1, shift=1.0), run)
+        return optimize(*args, **kwargs)
+    
+    changed = await rolling.update_async(MarketData.concat([_days(4, 1, shift=2.0), _days(5, 1)]), executor)
+    
+    assert optimized_days == [2, 2]
+    assert changed == {FIRST_DAY + 4, FIRST_DAY + 5}
+    assert rolling.version == 3
+    days = {day["date"]: day["cycles"] for day in rolling.delta(2)["days"]}
+    assert days["05.01.2023"] == optimize(_days(4, 1, shift=2.0), max_cycles_per_day=2)[0][1]
+
+def test_delta_since_version(rolling):
+    """Изменения с версии: новые и измененные дни, вытесненные дни, полный снимок для старой версии"""
+    rolling.update(_days(0, 10))
+    assert rolling.update(_days(5, 1)) == set()
+    assert rolling.version == 1
+    
+    rolling.update(MarketData.concat([_days(5, 1, shift=1.0), _days(10, 1)]))
+    delta = rolling.delta(1)
+    
+    assert (delta["version"], delta["full"]) == (2, False)
+    assert [day["date"] for day in delta["days"]] == ["06.01.2023", "11.01.2023"]
+    assert delta["days"][0]["cycles"] == OptimizerService().cycles_by_day(_days(5, 1, shift=1.0), max_cycles_per_day=2)[0][1]
+    assert delta["removed_days"] == ["01.01.2023"]
+    assert rolling.delta(2)["days"] == []
+    
+    for day in range(11, 14):
+        rolling.update(_days(day, 1))
+    assert rolling.delta(0)["full"]
+    assert len(rolling.delta(0)["days"]) == 10
+    assert not rolling.delta(3)["full"]
+    with pytest.raises(ValueError):
+        rolling.delta(rolling.version + 1)
+
+def test_totals_do_not_drift_after_evictions():
+    """Суммы окна после многих вытеснений равны пересчету по оставшимся дням"""
+    rolling = RollingOptimizer(window_days=3)
+    for day in range(60):
+        rolling.update(_days(day, 1, shift=day * 0.1))
+    
+    expected = OptimizerService().process_data(MarketData.concat(_days(day, 1, shift=day * 0.1) for day in range(57, 60)))
+    summary = rolling.summary()
+    assert summary["cycles"] == len(expected)
+    assert summary["total_profit"] == math.fsum(cycle["profit"] for cycle in expected)
+    assert summary["total_profit_after_losses"] == math.fsum(cycle["profit_after_losses"] for cycle in expected)
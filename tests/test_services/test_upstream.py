@@ -0,0 +1,39 @@
+import pytest
+
+import app.services.upstream as upstream_module
+from app.services.upstream import CircuitBreaker, CircuitOpenError, UpstreamStatusError, UpstreamTimeoutError, UpstreamTokenError
+
+def test_error_reasons():
+    """Причина и возможность повтора определяются типом ошибки и статусом"""
+    assert (UpstreamStatusError("", 404).reason, UpstreamStatusError("", 404).retryable) == ("api_not_found", False)
+    assert UpstreamStatusError("", 403).reason == "api_auth_error"
+    assert UpstreamStatusError("", 503).retryable
+    assert UpstreamTimeoutError("").reason == "api_timeout"
+    assert not UpstreamTokenError("", 401).retryable
+    assert UpstreamTokenError("").retryable
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    """Цепь размыкается после серии сбоев и замыкается после успешной пробной попытки"""
+    now = [100.0]
+    monkeypatch.setattr(upstream_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    
+    breaker.record_failure(UpstreamStatusError("", 404))
+    breaker.record_failure(UpstreamTimeoutError(""))
+    assert breaker.state == "closed"
+    breaker.record_failure(UpstreamTimeoutError(""))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    
+    now[0] += 30
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_failure(UpstreamTimeoutError(""))
+    assert breaker.state == "open"
+    
+    now[0] += 30
+    breaker.check()
+    breaker.record_success()
+    assert breaker.status() == {"state": "closed", "failures": 0, "rejected": 2}
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.optimizer import OptimizerService
+from app.services.workers import EventLoopLagMonitor, WorkerPool, WorkerPoolBusyError
+
+@pytest.mark.asyncio
+async def test_worker_pool_rejects_when_saturated():
+    """Работа выполняется вне цикла событий, сверх лимита очереди задачи отклоняются"""
+    pool = WorkerPool(max_workers=1, max_queued=1)
+    release = threading.Event()
+    try:
+        running = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(WorkerPoolBusyError):
+            await pool.run(threading.get_ident)
+        
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert await pool.run(threading.get_ident) != threading.get_ident()
+    finally:
+        release.set()
+        pool.shutdown()
+    
+    assert pool.stats() == {"kind": "thread", "workers": 1, "queue_limit": 1, "pending": 0, "completed": 3, "rejected": 1}
+
+@pytest.mark.asyncio
+async def test_cancelled_job_counted_until_finished():
+    """Отмена запроса не освобождает место в пуле, пока задача еще выполняется"""
+    pool = WorkerPool(max_workers=1, max_queued=0)
+    release = threading.Event()
+    try:
+        job = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        
+        assert pool.stats()["pending"] == 1
+        with pytest.raises(WorkerPoolBusyError):
+            await pool.run(threading.get_ident)
+        
+        release.set()
+        for _ in range(100):
+            if pool.stats()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.stats()["pending"] == 0
+        assert pool.stats()["completed"] == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_process_pool_runs_optimization():
+    """Оптимизация в пуле процессов дает тот же результат"""
+    data = [
+        {"date": "01.01.2023", "hour": hour, "price_ct_kwh": price}
+        for hour, price in enumerate([10.0, 30.0, 5.0, 25.0, 20.0, 40.0])
+    ]
+    optimizer = OptimizerService()
+    pool = WorkerPool(max_workers=1, max_queued=0, kind="process")
+    try:
+        index = await pool.run(optimizer.build_cycle_index, data, max_cycles_per_day=2)
+    finally:
+        pool.shutdown()
+    
+    assert index.cycles(0.0) == optimizer.process_data(data, max_cycles_per_day=2)
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_measured():
+    """Блокировка цикла событий видна в задержке"""
+    monitor = EventLoopLagMonitor(interval=0.01)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+    finally:
+        await monitor.stop()
+    
+    stats = monitor.stats()
+    assert stats["samples"] >= 2
+    assert stats["max_ms"] >= 50